@@ -1,15 +1,39 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response
 import re
+import codecs
+import mmap
+import multiprocessing
 import datetime
 import os
 import json
+import csv
 import sqlparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
 import html
 import tempfile
 import sqlite3
+import time
+import hashlib
+import random
+import uuid
+import math
+import unicodedata
+from collections import OrderedDict, Counter
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, Future, FIRST_COMPLETED, wait, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from werkzeug.utils import secure_filename
 
+# Dépendances optionnelles pour l'inférence locale (pip install torch transformers sentencepiece)
+try:
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+except ImportError:
+    torch = None
+
 app = Flask(__name__)
 app.secret_key = 'sql_bot_secret_key'  # Clé secrète pour les sessions
 
@@ -24,9 +48,29 @@ if not os.path.exists(UPLOAD_FOLDER):
         print(f"Avertissement: Impossible de définir les permissions du dossier uploads: {str(e)}")
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # 32 MB max (augmenté)
+app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024 * 1024  # 1 Go max (exports SQL volumineux)
 ALLOWED_EXTENSIONS = {'sql', 'json', 'txt', 'csv'}  # Ajout de formats supplémentaires
 
+# Lecture en flux des fichiers SQL (mémoire bornée quelle que soit la taille du fichier)
+SQL_PARSE_CHUNK_SIZE = 1024 * 1024  # Octets lus à chaque bloc
+SQL_STATEMENT_MAX_CHARS = 64 * 1024  # Au-delà, seul le début d'une instruction est conservé (gros INSERT)
+SQL_PARALLEL_PARSE_MIN_SIZE = 64 * 1024 * 1024  # Taille à partir de laquelle le fichier est découpé en plages
+SQL_PARSE_MIN_SHARD_SIZE = 4 * 1024 * 1024  # Taille minimale d'une plage analysée par un processus
+SQL_PARSE_WORKERS = os.cpu_count() or 1  # Processus d'analyse (1 = analyse séquentielle uniquement)
+
+# Lecture en flux des fichiers JSON
+JSON_PARSE_CHUNK_SIZE = 1024 * 1024  # Caractères lus à chaque bloc
+JSON_SAMPLE_SIZE = 1000  # Enregistrements conservés par table (échantillon de réservoir) pour affiner les types
+JSON_MAX_RELATIONS = 10000  # Relations explicites conservées au plus (clé "relations")
+JSON_REPAIR_MAX_SIZE = 1024 * 1024  # Taille maximale d'un fichier invalide que l'on tente de réparer en mémoire
+
+# Lecture en flux des fichiers CSV
+CSV_SNIFF_SIZE = 64 * 1024  # Caractères lus au début du fichier pour détecter le séparateur et l'en-tête
+CSV_DELIMITERS = ',;\t|'  # Séparateurs candidats
+CSV_SAMPLE_SIZE = 1000  # Lignes conservées (échantillon de réservoir) pour déterminer les types
+CSV_TYPE_CONFIDENCE = 0.95  # Part minimale des valeurs non vides compatibles avec un type pour le retenir
+CSV_PROGRESS_INTERVAL = 10000  # Lignes entre deux appels de on_progress
+
 # Configuration des modèles pré-entraînés
 MODEL_PATHS = {
     "text-to-sql": "juierror/text-to-sql-with-table-schema",  # T5 pour texte → SQL
@@ -41,6 +85,83 @@ pipelines = {}
 # Clé API HuggingFace (à remplacer par votre propre clé si nécessaire)
 HUGGINGFACE_API_KEY = None  # Mettre votre clé API ici si vous en avez une
 
+# Adresse de l'API d'inférence; HF_API_BASE_URL permet d'utiliser un serveur local (mock_hf_server.py)
+HUGGINGFACE_PUBLIC_API_BASE_URL = "https://api-inference.huggingface.co"
+HUGGINGFACE_API_BASE_URL = os.environ.get('HF_API_BASE_URL', HUGGINGFACE_PUBLIC_API_BASE_URL).rstrip('/')
+
+# Configuration du client HTTP partagé (connexions keep-alive réutilisées entre les appels)
+HUGGINGFACE_API_HOST = urlsplit(HUGGINGFACE_API_BASE_URL).netloc
+HTTP_POOL_SIZES = {
+    HUGGINGFACE_API_HOST: 10  # Nombre maximal de connexions gardées ouvertes par hôte de modèles
+}
+HTTP_DEFAULT_POOL_SIZE = 4
+HTTP_CONNECT_TIMEOUT = 3.05  # Secondes pour établir la connexion TCP+TLS
+HTTP_READ_TIMEOUT = 60  # Secondes d'attente de la réponse du modèle
+
+# Politique de nouvelles tentatives pour les appels aux modèles (partagée par toutes les étapes)
+HF_RETRY_POLICY = {
+    'max_attempts': 4,  # Nombre maximal d'appels pour une même entrée
+    'base_delay': 0.5,  # Délai avant la deuxième tentative (secondes), doublé à chaque échec
+    'max_delay': 8.0,  # Délai maximal entre deux tentatives (secondes)
+    'jitter': 0.5,  # Part aléatoire du délai pour éviter les tentatives synchronisées
+    'retry_statuses': (429, 500, 502, 503, 504)
+}
+PIPELINE_DEADLINE = 45  # Budget total (secondes) d'une requête /process, toutes étapes confondues
+
+# Disjoncteur par modèle: après plusieurs échecs, les appels passent directement aux solutions de secours
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3  # Échecs consécutifs avant l'ouverture du circuit
+CIRCUIT_BREAKER_RESET_TIMEOUT = 30  # Secondes avant de laisser passer un appel d'essai
+
+# Configuration du cache local des réponses des modèles (mémoire LRU + disque SQLite)
+CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+HF_CACHE_DB_PATH = os.path.join(CACHE_FOLDER, 'hf_responses.sqlite3')
+HF_CACHE_MAX_ENTRIES = 1024  # Nombre maximal de réponses gardées en mémoire
+HF_CACHE_TTL = 24 * 3600  # Durée de vie d'une réponse en mémoire (secondes)
+HF_CACHE_DISK_TTL = 7 * 24 * 3600  # Durée de vie d'une réponse sur disque (secondes)
+
+# Registre des schémas importés, côté serveur (la session ne contient que l'identifiant du schéma)
+SCHEMA_STORE_PATH = os.path.join(CACHE_FOLDER, 'schemas.sqlite3')
+SCHEMA_MEMORY_CACHE_SIZE = 32  # Schémas gardés en mémoire par processus
+
+# Exécution des requêtes générées sur une base SQLite construite à partir du schéma importé
+SANDBOX_FOLDER = os.path.join(CACHE_FOLDER, 'sandboxes')
+SANDBOX_LOAD_BATCH_ROWS = 5000  # Lignes insérées par appel à executemany
+SANDBOX_COMMIT_ROWS = 200000  # Lignes par transaction lors du chargement
+SQL_TUPLE_MAX_CHARS = 16 * 1024 * 1024  # Au-delà, un tuple VALUES incomplet est considéré comme invalide
+INGESTION_WORKERS = 2  # Chargements de données exécutés en parallèle
+UPLOAD_WORKERS = 2  # Analyses de fichiers importés exécutées en parallèle
+BACKGROUND_JOBS_MAX = 200  # Tâches terminées conservées dans le registre pour le suivi
+BACKGROUND_JOB_WRITE_INTERVAL = 0.25  # Intervalle minimal entre deux écritures de la progression (secondes)
+EXECUTE_MAX_ROWS = 1000  # Lignes retournées au plus par /execute
+EXECUTE_TIME_BUDGET = 2.0  # Durée maximale d'exécution d'une requête (secondes)
+EXECUTE_PROGRESS_STEPS = 10000  # Instructions SQLite entre deux vérifications du budget de temps
+
+# Liaison au schéma: seules les tables pertinentes pour la question sont envoyées dans les prompts
+SCHEMA_LINK_TOP_K = 5  # Tables les mieux notées retenues
+SCHEMA_LINK_MAX_TABLES = 12  # Tables au plus dans le prompt, voisins par clé étrangère compris
+SCHEMA_LINK_MAX_COLUMNS = 30  # Colonnes au plus par table (les colonnes citées et les clés sont prioritaires)
+SCHEMA_LINK_TABLE_NAME_WEIGHT = 3.0  # Poids d'un mot du nom de la table par rapport à un mot de colonne
+SCHEMA_LINK_MIN_RELATIVE_SCORE = 0.2  # Tables notées sous cette part du meilleur score écartées (hors voisines)
+
+# Génération de plusieurs requêtes candidates (N meilleures) départagées par validation et EXPLAIN
+SQL_CANDIDATES_DEFAULT = 1  # Candidates demandées par défaut (1 = génération simple; N-best sur demande, champ candidates)
+SQL_CANDIDATES_MAX = 8  # Valeur maximale acceptée par requête
+SQL_CANDIDATE_BUDGET_MS = 500  # Temps maximal de vérification des candidates (millisecondes)
+SQL_CANDIDATE_BUDGET_MAX_MS = 5000  # Budget maximal accepté par requête
+SQL_EXPLAIN_CACHE_SIZE = 8  # Bases SQLite vides (une par schéma) gardées par thread pour EXPLAIN
+# Coût estimé de chaque ligne du plan d'exécution (EXPLAIN QUERY PLAN), selon son opération
+SQL_PLAN_COSTS = {
+    'SCAN': 10,  # Parcours complet d'une table
+    'SEARCH': 1,  # Accès par index ou par rowid
+    'TEMP B-TREE': 3,  # Tri ou regroupement dans une table temporaire
+    'CORRELATED': 5,  # Sous-requête réévaluée pour chaque ligne
+}
+
+# Traitement par lots (/process_batch et process_batch.py)
+BATCH_MAX_ITEMS = 1000  # Descriptions acceptées au plus par lot
+BATCH_CONCURRENCY = 4  # Descriptions traitées en même temps par défaut dans un lot
+BATCH_MAX_WORKERS = 8  # Descriptions traitées en même temps au plus, tous lots confondus
+
 # Modèles pré-entraînés
 TRANSLATION_MODEL = "Helsinki-NLP/opus-mt-fr-en"
 UNDERSTANDING_MODEL = "facebook/bart-large-mnli"  # Modèle pour la compréhension des intentions
@@ -48,395 +169,1056 @@ REFORMULATION_MODEL = "facebook/bart-large-cnn"   # Modèle pour la reformulatio
 SCHEMA_EXTRACTION_MODEL = "google/flan-t5-large"  # Modèle pour l'extraction de schéma
 LANGUAGE_UNDERSTANDING_MODEL = "google/flan-t5-xl"  # Modèle pour la compréhension du langage naturel
 
+# Regroupement des appels concurrents vers un même modèle (micro-batching)
+MICRO_BATCH_MODELS = {TRANSLATION_MODEL, MODEL_PATHS["text-to-sql"]}
+MICRO_BATCH_MAX_WAIT_MS = 10  # Attente maximale d'autres entrées après la première (millisecondes)
+MICRO_BATCH_MAX_SIZE = 8  # Nombre maximal d'entrées envoyées dans un même appel
+MICRO_BATCH_MAX_QUEUE_DEPTH = 256  # Au-delà, les entrées sont envoyées directement sans regroupement
+MICRO_BATCH_DISPATCH_WORKERS = 8  # Lots envoyés en même temps, tous modèles confondus
+# Attente maximale d'une réponse groupée sans échéance de requête: toutes les tentatives et leurs délais
+MICRO_BATCH_RESULT_TIMEOUT = HF_RETRY_POLICY['max_attempts'] * (HTTP_READ_TIMEOUT + HF_RETRY_POLICY['max_delay'])
+
+# Configuration de l'inférence locale (sans appel réseau quand les modèles sont présents sur disque)
+# Chaque modèle est cherché dans LOCAL_MODELS_DIR/<chemin HuggingFace>, ex: local_models/Helsinki-NLP/opus-mt-fr-en
+LOCAL_MODELS_DIR = os.environ.get('SQL_BOT_LOCAL_MODELS_DIR',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'local_models'))
+LOCAL_MODEL_PATHS = dict(MODEL_PATHS, translation=TRANSLATION_MODEL)
+LOCAL_MODEL_QUANTIZE = True  # Quantification dynamique int8 des couches linéaires (CPU)
+LOCAL_MODEL_THREADS = None  # Nombre de threads torch (None = valeur par défaut de torch)
+LOCAL_MAX_INPUT_TOKENS = 512
+LOCAL_MAX_NEW_TOKENS = 128
+
 # Fonction pour vérifier si un fichier a une extension autorisée
 def allowed_file(filename):
     """Vérifie si le fichier a une extension autorisée"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Fonction pour analyser un fichier SQL et extraire le schéma
-def extract_schema_from_sql_file(file_path):
-    """Analyse un fichier SQL et extrait le schéma de la base de données"""
-    try:
-        # Lire le contenu du fichier SQL
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            sql_content = f.read()
-
-        # Analyser le contenu SQL
-        tables = {}
-        relations = []
-
-        # Méthode 1: Extraire les CREATE TABLE standards
-        create_table_pattern = r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?[`"\[]?(\w+)[`"\]]?\s*\((.*?)\);'
-        create_table_matches = re.findall(create_table_pattern, sql_content, re.IGNORECASE | re.DOTALL)
-
-        for table_name, table_content in create_table_matches:
-            # Extraire les colonnes
-            columns = []
-            # Pattern plus flexible pour les définitions de colonnes
-            column_pattern = r'[`"\[]?(\w+)[`"\]]?\s+([A-Za-z0-9_\(\)]+)'
-            column_matches = re.findall(column_pattern, table_content)
-
-            for column_name, _ in column_matches:  # Ignorer le type pour l'instant
-                if column_name.lower() not in ['primary', 'foreign', 'key', 'constraint', 'check', 'unique', 'index']:
-                    columns.append(column_name.lower())
-
-            tables[table_name.lower()] = columns
-
-            # Extraire les clés étrangères
-            fk_pattern = r'FOREIGN\s+KEY\s*\(\s*[`"\[]?(\w+)[`"\]]?\s*\)\s*REFERENCES\s+[`"\[]?(\w+)[`"\]]?\s*\(\s*[`"\[]?(\w+)[`"\]]?\s*\)'
-            fk_matches = re.findall(fk_pattern, table_content, re.IGNORECASE)
-
-            for fk_column, ref_table, ref_column in fk_matches:
-                relations.append({
-                    'table1': table_name.lower(),
-                    'column1': fk_column.lower(),
-                    'table2': ref_table.lower(),
-                    'column2': ref_column.lower()
-                })
-
-        # Méthode 2: Si aucune table n'est trouvée, essayer un autre pattern (format phpMyAdmin)
-        if not tables:
-            # Pattern pour les exports phpMyAdmin
-            create_table_pattern2 = r'CREATE TABLE `(\w+)`\s*\(([\s\S]*?)\)\s*ENGINE'
-            create_table_matches2 = re.findall(create_table_pattern2, sql_content)
-
-            for table_name, table_content in create_table_matches2:
-                columns = []
-                # Pattern pour les colonnes dans les exports phpMyAdmin
-                column_pattern2 = r'`(\w+)`\s+([^,\n]+)'
-                column_matches2 = re.findall(column_pattern2, table_content)
-
-                for column_name, _ in column_matches2:
-                    columns.append(column_name.lower())
-
-                tables[table_name.lower()] = columns
-
-                # Extraire les clés étrangères
-                fk_pattern2 = r'CONSTRAINT\s+`[^`]+`\s+FOREIGN\s+KEY\s*\(`(\w+)`\)\s*REFERENCES\s+`(\w+)`\s*\(`(\w+)`\)'
-                fk_matches2 = re.findall(fk_pattern2, table_content, re.IGNORECASE)
-
-                for fk_column, ref_table, ref_column in fk_matches2:
-                    relations.append({
-                        'table1': table_name.lower(),
-                        'column1': fk_column.lower(),
-                        'table2': ref_table.lower(),
-                        'column2': ref_column.lower()
-                    })
+# Texte d'une instruction SQL jusqu'au prochain point-virgule hors chaîne/commentaire. Chaque jeton exige
+# le caractère qui le suit: un jeton coupé en fin de bloc (chaîne, commentaire, "''", "\x") n'est pas consommé.
+SQL_STATEMENT_PATTERN = re.compile(r"""
+    (?:
+        [^;'"`\#/\-]+
+      | '[^'\\]*(?:(?:\\[\s\S]|'')[^'\\]*)*'(?=[^'])
+      | "[^"\\]*(?:(?:\\[\s\S]|"")[^"\\]*)*"(?=[^"])
+      | `[^`]*(?:``[^`]*)*`(?=[^`])
+      | (?:--|\#)[^\n]*\n
+      | /\*[\s\S]*?\*/
+      | -(?=[^-])
+      | /(?=[^*])
+    )*""", re.VERBOSE)
+# Commentaires d'une instruction isolée (les chaînes sont reconnues pour ne pas y chercher de commentaire)
+SQL_COMMENT_PATTERN = re.compile(r"""
+    ( '[^'\\]*(?:(?:\\[\s\S]|'')[^'\\]*)*(?:'|\Z)
+    | "[^"\\]*(?:(?:\\[\s\S]|"")[^"\\]*)*(?:"|\Z)
+    | `[^`]*(?:``[^`]*)*(?:`|\Z) )
+  | (?:--|\#)[^\n]*
+  | /\*[\s\S]*?(?:\*/|\Z)""", re.VERBOSE)
+# Commentaire placé avant le premier mot-clé d'une instruction (en-têtes des exports)
+SQL_LEADING_COMMENT_PATTERN = re.compile(r'\s*(?:(?:--|#)([^\n]*)|/\*[\s\S]*?(?:\*/|\Z))')
+
+# Fonction pour retirer les commentaires d'une instruction SQL
+def strip_sql_comments(statement, on_comment=None):
+    """Retire les commentaires de tête (transmis à on_comment), puis ceux du corps des CREATE et ALTER.
+
+    Le corps des autres instructions (gros INSERT notamment) n'est pas réécrit: seul leur en-tête est analysé.
+    """
+    pos = 0
+    while True:
+        match = SQL_LEADING_COMMENT_PATTERN.match(statement, pos)
+        if not match:
+            break
+        if match.group(1) is not None and on_comment:
+            on_comment(match.group(1))
+        pos = match.end()
+
+    statement = statement[pos:].strip()
+
+    if statement[:6].upper() in ('CREATE', 'ALTER ') and ('--' in statement or '#' in statement
+                                                         or '/*' in statement):
+        statement = SQL_COMMENT_PATTERN.sub(lambda m: m.group(1) if m.group(1) is not None else ' ', statement)
+
+    return statement
+
+# Fonction pour découper un flux SQL en instructions
+def iter_sql_statements(stream, chunk_size=SQL_PARSE_CHUNK_SIZE, max_statement_chars=SQL_STATEMENT_MAX_CHARS,
+                        on_comment=None, on_progress=None, on_unterminated=None):
+    """Lit un flux binaire par blocs et produit chaque instruction SQL (voir strip_sql_comments).
+
+    Les points-virgules dans les chaînes, identifiants et commentaires sont ignorés. Seuls les
+    max_statement_chars premiers caractères d'une instruction sont conservés (le début d'un gros
+    INSERT suffit pour en extraire la structure): la mémoire reste bornée par la taille d'un bloc.
+    on_unterminated est appelé avec la dernière instruction si le flux se termine avant son point-virgule.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    buffer = ''
+    bytes_read = 0
+    eof = False
+    parts = []
+    size = 0
+
+    while True:
+        raw = stream.read(chunk_size)
+        if raw:
+            bytes_read += len(raw)
+            buffer += decoder.decode(raw)
+        else:
+            eof = True
+            # Le saut de ligne final termine un éventuel commentaire et sert de caractère suivant au dernier jeton
+            buffer += decoder.decode(b'', final=True) + '\n'
+        if on_progress:
+            on_progress(bytes_read)
+
+        pos = 0
+        while True:
+            end = SQL_STATEMENT_PATTERN.match(buffer, pos).end()
+            if size < max_statement_chars:
+                parts.append(buffer[pos:min(end, pos + max_statement_chars - size)])
+                size += len(parts[-1])
+
+            if end < len(buffer) and buffer[end] == ';':
+                statement = strip_sql_comments(''.join(parts), on_comment).strip()
+                if statement:
+                    yield statement
+                parts = []
+                size = 0
+                pos = end + 1
+            else:
+                # Fin du bloc ou jeton incomplet: la suite est reprise avec le bloc suivant
+                pos = end
+                break
+
+        buffer = buffer[pos:]
+
+        if eof:
+            break
+
+    # Dernière instruction sans point-virgule final (ou chaîne jamais refermée)
+    if size < max_statement_chars:
+        parts.append(buffer[:max_statement_chars - size])
+    statement = strip_sql_comments(''.join(parts), on_comment).strip()
+    # Le reste du tampon est un jeton jamais refermé (chaîne, commentaire): l'instruction est aussi inachevée
+    if on_unterminated and (statement or buffer.strip()):
+        on_unterminated(statement)
+    if statement:
+        yield statement
+
+# Expressions régulières pour analyser les instructions isolées par iter_sql_statements
+SQL_IDENTIFIER = r'(?:`[^`]+`|"[^"]+"|\[[^\]]+\]|\w+)'
+SQL_QUALIFIED_IDENTIFIER = SQL_IDENTIFIER + r'(?:\s*\.\s*' + SQL_IDENTIFIER + r')?'
+CREATE_TABLE_HEAD_PATTERN = re.compile(
+    r'CREATE\s+(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(' + SQL_QUALIFIED_IDENTIFIER + r')\s*\(', re.IGNORECASE)
+ALTER_TABLE_HEAD_PATTERN = re.compile(
+    r'ALTER\s+TABLE\s+(?:ONLY\s+)?(' + SQL_QUALIFIED_IDENTIFIER + r')', re.IGNORECASE)
+ALTER_ADD_COLUMN_PATTERN = re.compile(
+    r'\bADD\s+(?:COLUMN\s+)?(' + SQL_IDENTIFIER + r')\s+(\w+(?:\s*\([^)]*\))?)', re.IGNORECASE)
+INSERT_HEAD_PATTERN = re.compile(
+    r'INSERT\s+(?:IGNORE\s+)?INTO\s+(' + SQL_QUALIFIED_IDENTIFIER + r')\s*(?:\(([^)]*)\))?', re.IGNORECASE)
+FOREIGN_KEY_PATTERN = re.compile(
+    r'FOREIGN\s+KEY\s*(?:' + SQL_IDENTIFIER + r'\s*)?\(([^)]*)\)\s*REFERENCES\s+(' + SQL_QUALIFIED_IDENTIFIER +
+    r')\s*\(([^)]*)\)', re.IGNORECASE)
+INLINE_REFERENCES_PATTERN = re.compile(
+    r'\bREFERENCES\s+(' + SQL_QUALIFIED_IDENTIFIER + r')\s*\(\s*(' + SQL_IDENTIFIER + r')\s*\)', re.IGNORECASE)
+COLUMN_DEFINITION_PATTERN = re.compile(
+    r'\s*(' + SQL_IDENTIFIER + r')\s+(\w+(?:\s*\([^)]*\))?(?:\s+(?:unsigned|varying|precision|zerofill)'
+    r'(?:\s*\([^)]*\))?)*)', re.IGNORECASE)
+TABLE_MENTION_PATTERN = re.compile(
+    r'(?:Table\s+structure\s+for|Data\s+for)\s+(?:table\s+)?[`"\']?(\w+)', re.IGNORECASE)
+SQL_CONSTRAINT_KEYWORDS = {'primary', 'foreign', 'key', 'constraint', 'check', 'unique', 'index',
+                           'fulltext', 'spatial', 'exclude'}
+
+# Fonction pour normaliser un identifiant SQL
+def clean_sql_identifier(identifier):
+    """Retire les guillemets et le préfixe de base de données d'un identifiant, en minuscules"""
+    last_part = re.split(r'\s*\.\s*(?=[`"\[\w])', identifier.strip())[-1]
+    return last_part.strip('`"[] ').lower()
+
+# Fonction pour découper une liste SQL au premier niveau
+def split_sql_top_level(text):
+    """Découpe sur les virgules qui ne sont ni entre parenthèses ni dans une chaîne"""
+    items = []
+    depth = 0
+    quote = None
+    start = 0
+
+    for index, char in enumerate(text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            items.append(text[start:index])
+            start = index + 1
+
+    items.append(text[start:])
+    return [item.strip() for item in items if item.strip()]
+
+# Fonction pour trouver la parenthèse fermante correspondante
+def find_closing_parenthesis(text, open_index):
+    """Retourne l'indice de la parenthèse qui ferme celle ouverte à open_index (ou la fin du texte)"""
+    depth = 0
+    quote = None
+
+    for index in range(open_index, len(text)):
+        char = text[index]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return index
+
+    return len(text)
+
+# Fonction pour créer la structure qui accumule le schéma d'un fichier SQL
+def new_sql_schema_accumulator():
+    """Structure remplie instruction par instruction par parse_sql_statement"""
+    return {
+        'tables': {},  # table -> colonnes (CREATE TABLE / ALTER TABLE)
+        'column_types': {},  # table -> {colonne: type}
+        'relations': [],
+        'insert_columns': {},  # table -> colonnes citées dans les INSERT (si aucun CREATE TABLE)
+        'mentioned_tables': []  # tables citées dans les commentaires des exports
+    }
 
-        # Méthode 3: Rechercher les noms de tables dans les commentaires ou autres parties du fichier
-        if not tables:
-            # Chercher des mentions de tables dans les commentaires
-            table_mentions = re.findall(r'--\s*Table\s+structure\s+for\s+(?:table\s+)?[`"\']?(\w+)[`"\']?', sql_content, re.IGNORECASE)
-            table_mentions += re.findall(r'--\s*Data\s+for\s+(?:table\s+)?[`"\']?(\w+)[`"\']?', sql_content, re.IGNORECASE)
+# Fonction pour ajouter une relation sans doublon
+def add_sql_relation(accumulator, table1, column1, table2, column2):
+    """Ajoute une relation de clé étrangère si elle n'est pas déjà connue"""
+    relation = {'table1': table1, 'column1': column1, 'table2': table2, 'column2': column2}
+    if relation not in accumulator['relations']:
+        accumulator['relations'].append(relation)
+
+# Fonction pour extraire les clés étrangères d'un fragment SQL
+def add_foreign_keys(accumulator, table_name, text):
+    """Ajoute les relations des clauses FOREIGN KEY (...) REFERENCES t(...) trouvées dans le texte"""
+    for columns, ref_table, ref_columns in FOREIGN_KEY_PATTERN.findall(text):
+        for column, ref_column in zip(split_sql_top_level(columns), split_sql_top_level(ref_columns)):
+            add_sql_relation(accumulator, table_name, clean_sql_identifier(column),
+                             clean_sql_identifier(ref_table), clean_sql_identifier(ref_column))
+
+# Fonction pour analyser une instruction CREATE TABLE
+def parse_create_table(statement, head, accumulator):
+    """Extrait les colonnes, leurs types et les clés étrangères d'une instruction CREATE TABLE"""
+    table_name = clean_sql_identifier(head.group(1))
+    body_end = find_closing_parenthesis(statement, head.end() - 1)
+    body = statement[head.end():body_end]
+
+    columns = accumulator['tables'].setdefault(table_name, [])
+    column_types = accumulator['column_types'].setdefault(table_name, {})
+
+    for definition in split_sql_top_level(body):
+        first_word = definition.split(None, 1)[0].lower()
+        if first_word in SQL_CONSTRAINT_KEYWORDS:
+            add_foreign_keys(accumulator, table_name, definition)
+            continue
+
+        column_match = COLUMN_DEFINITION_PATTERN.match(definition)
+        if not column_match:
+            continue
+
+        column_name = clean_sql_identifier(column_match.group(1))
+        if column_name not in columns:
+            columns.append(column_name)
+        column_types[column_name] = re.sub(r'\s+', ' ', column_match.group(2)).upper()
+
+        # Clé étrangère déclarée directement sur la colonne
+        inline_reference = INLINE_REFERENCES_PATTERN.search(definition)
+        if inline_reference:
+            add_sql_relation(accumulator, table_name, column_name,
+                             clean_sql_identifier(inline_reference.group(1)),
+                             clean_sql_identifier(inline_reference.group(2)))
+
+# Fonction pour analyser une instruction SQL isolée
+def parse_sql_statement(statement, accumulator):
+    """Met à jour le schéma accumulé avec une instruction CREATE TABLE, ALTER TABLE ou INSERT INTO"""
+    keyword = statement[:6].upper()
+
+    if keyword == 'CREATE':
+        head = CREATE_TABLE_HEAD_PATTERN.match(statement)
+        if head:
+            parse_create_table(statement, head, accumulator)
+    elif keyword == 'ALTER ':
+        head = ALTER_TABLE_HEAD_PATTERN.match(statement)
+        if head:
+            table_name = clean_sql_identifier(head.group(1))
+            add_foreign_keys(accumulator, table_name, statement)
+
+            # Colonnes ajoutées après coup (ADD [COLUMN] nom type); le CREATE TABLE peut être dans une autre plage
+            for column, column_type in ALTER_ADD_COLUMN_PATTERN.findall(statement[head.end():]):
+                column_name = clean_sql_identifier(column)
+                if column_name in SQL_CONSTRAINT_KEYWORDS:
+                    continue
+                columns = accumulator['tables'].setdefault(table_name, [])
+                if column_name not in columns:
+                    columns.append(column_name)
+                accumulator['column_types'].setdefault(table_name, {})[column_name] = column_type.upper()
+    elif keyword == 'INSERT':
+        head = INSERT_HEAD_PATTERN.match(statement)
+        if head:
+            table_name = clean_sql_identifier(head.group(1))
+            columns = accumulator['insert_columns'].setdefault(table_name, [])
+            for column in split_sql_top_level(head.group(2) or ''):
+                column_name = clean_sql_identifier(column)
+                if column_name not in columns:
+                    columns.append(column_name)
+
+# Fonction pour relever les tables citées dans les commentaires des exports (phpMyAdmin, mysqldump)
+def collect_table_mention(comment, accumulator):
+    """Ajoute la table citée par un commentaire « Table structure for table x » ou « Data for table x »"""
+    mention = TABLE_MENTION_PATTERN.search(comment)
+    if mention and mention.group(1).lower() not in accumulator['mentioned_tables']:
+        accumulator['mentioned_tables'].append(mention.group(1).lower())
+
+# Fonction pour deviner le type d'une colonne à partir de son nom
+def guess_column_type(column):
+    """Détermine le type de données en fonction du nom de la colonne"""
+    if column.endswith("_id") or column == "id":
+        return "INTEGER"
+    elif column.endswith("_date") or column.endswith("_at") or column == "date":
+        return "TIMESTAMP"
+    elif column.endswith("_price") or column.endswith("_amount") or column.endswith("_cost"):
+        return "DECIMAL(10, 2)"
+    return "TEXT"
+
+# Fonction pour générer le schéma SQL à partir des tables et relations
+def build_schema_sql(tables, relations, column_types=None):
+    """Génère les CREATE TABLE (types connus, sinon déduits du nom) suivis des relations en commentaire"""
+    column_types = column_types or {}
+    schema_sql = "".join(build_table_sql(table, columns, column_types.get(table)) for table, columns in tables.items())
+
+    # Ajouter les contraintes de clé étrangère
+    return schema_sql + "".join(build_relation_sql(relation) for relation in relations)
+
+# Fonction pour générer le CREATE TABLE d'une table
+def build_table_sql(table, columns, column_types=None):
+    column_types = column_types or {}
+    table_sql = f"CREATE TABLE {table} (\n"
+
+    # Ajouter les colonnes
+    for i, column in enumerate(columns):
+        data_type = column_types.get(column) or guess_column_type(column)
+        primary_key = " PRIMARY KEY" if column == "id" else ""
+        comma = "," if i < len(columns) - 1 else ""
+        table_sql += f"    {column} {data_type}{primary_key}{comma}\n"
+
+    return table_sql + ");\n\n"
+
+# Fonction pour générer le commentaire SQL d'une relation
+def build_relation_sql(relation):
+    table1 = relation['table1']
+    column1 = relation['column1']
+    table2 = relation['table2']
+    column2 = relation['column2']
+
+    return (f"-- Relation: {table1}.{column1} = {table2}.{column2}\n"
+            f"-- ALTER TABLE {table1} ADD FOREIGN KEY ({column1}) REFERENCES {table2}({column2});\n\n")
+
+# Fonction pour construire le schéma final d'un fichier SQL
+def finalize_sql_schema(accumulator, file_path):
+    """Applique les solutions de repli (INSERT, commentaires, nom du fichier) et génère le schéma SQL"""
+    tables = {table: columns for table, columns in accumulator['tables'].items() if columns}
+    column_types = {table: accumulator['column_types'].get(table, {}) for table in tables}
+    relations = accumulator['relations']
+
+    # Si aucun CREATE TABLE n'est trouvé, utiliser les tables citées dans les INSERT et les commentaires
+    if not tables:
+        all_tables = list(accumulator['insert_columns']) + [
+            table for table in accumulator['mentioned_tables'] if table not in accumulator['insert_columns']]
+
+        for table_name in all_tables:
+            # Si aucune colonne n'est trouvée, ajouter des colonnes par défaut
+            tables[table_name] = accumulator['insert_columns'].get(table_name) or ['id', 'name']
+
+    # Si toujours aucune table n'est trouvée, créer une table par défaut basée sur le nom du fichier
+    if not tables:
+        file_name = os.path.basename(file_path)
+        table_name = os.path.splitext(file_name)[0].replace('-', '_').replace(' ', '_').lower()
 
-            # Chercher des INSERT INTO qui peuvent révéler des noms de tables
-            insert_mentions = re.findall(r'INSERT\s+INTO\s+[`"\']?(\w+)[`"\']?', sql_content, re.IGNORECASE)
+        # Ajouter une table par défaut
+        tables[table_name] = ['id', 'name', 'description', 'created_at']
 
-            # Combiner et dédupliquer
-            all_tables = set(table_mentions + insert_mentions)
+        print(f"Aucune table trouvée dans le fichier SQL. Création d'une table par défaut: {table_name}")
 
-            for table_name in all_tables:
-                # Pour chaque table mentionnée, essayer de trouver les colonnes dans les INSERT
-                columns = []
-                insert_columns_pattern = r'INSERT\s+INTO\s+[`"\']?' + re.escape(table_name) + r'[`"\']?\s*\(([^)]+)\)'
-                insert_columns_matches = re.findall(insert_columns_pattern, sql_content, re.IGNORECASE)
+    return {
+        'tables': tables,
+        'relations': relations,
+        'column_types': column_types,
+        'schema_sql': build_schema_sql(tables, relations, column_types)
+    }
 
-                for columns_str in insert_columns_matches:
-                    # Extraire les noms de colonnes
-                    col_names = re.findall(r'[`"\']?(\w+)[`"\']?', columns_str)
-                    columns.extend([col.lower() for col in col_names])
+# Fonction pour fusionner les schémas partiels des plages d'un fichier SQL
+def merge_sql_schema_accumulators(accumulators):
+    """Fusionne, dans l'ordre du fichier, les structures produites par parse_sql_statement"""
+    merged = new_sql_schema_accumulator()
+
+    for accumulator in accumulators:
+        for key in ('tables', 'insert_columns'):
+            for table, columns in accumulator[key].items():
+                merged_columns = merged[key].setdefault(table, [])
+                merged_columns.extend(column for column in columns if column not in merged_columns)
+        for table, types in accumulator['column_types'].items():
+            merged['column_types'].setdefault(table, {}).update(types)
+        for relation in accumulator['relations']:
+            add_sql_relation(merged, **relation)
+        for table in accumulator['mentioned_tables']:
+            if table not in merged['mentioned_tables']:
+                merged['mentioned_tables'].append(table)
+
+    return merged
+
+# Coupure candidate d'un export: ";" en fin de ligne suivi d'une instruction en début de ligne. Le motif ne voit
+# pas les chaînes: parse_sql_file_parallel écarte les coupures tombées dans une chaîne ou un commentaire
+SQL_SHARD_BOUNDARY_PATTERN = re.compile(
+    rb';[ \t\r]*\n(?=\s*(?:CREATE\s|ALTER\s|INSERT\s|DROP\s|LOCK\s|UNLOCK\s|--|/\*))')
+
+class MappedFileRange:
+    """Plage [start, end) d'un fichier projeté en mémoire, lue séquentiellement comme un fichier"""
+
+    def __init__(self, mapped, start, end):
+        self.mapped = mapped
+        self.position = start
+        self.end = end
+
+    def read(self, size):
+        chunk = self.mapped[self.position:min(self.position + size, self.end)]
+        self.position += len(chunk)
+        return chunk
+
+# Fonction pour découper un fichier SQL en plages d'instructions complètes
+def find_sql_shard_ranges(mapped, shard_size):
+    """Retourne les plages (début, fin) du fichier, coupées juste après un ";" de fin d'instruction"""
+    ranges = []
+    start = 0
+
+    while start < len(mapped):
+        boundary = SQL_SHARD_BOUNDARY_PATTERN.search(mapped, start + shard_size) \
+            if start + shard_size < len(mapped) else None
+        end = boundary.end() if boundary else len(mapped)
+        ranges.append((start, end))
+        start = end
+
+    return ranges
+
+# Fonction exécutée dans un processus d'analyse pour une plage du fichier
+def parse_sql_file_range(file_path, start, end):
+    """Analyse les instructions de la plage [start, end) et retourne (schéma partiel, plage complète).
+
+    La plage est incomplète quand elle se termine au milieu d'une instruction: sa coupure est tombée
+    dans une chaîne ou un commentaire sur plusieurs lignes.
+    """
+    accumulator = new_sql_schema_accumulator()
+    unterminated = []
+
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for statement in iter_sql_statements(
+                MappedFileRange(mapped, start, end),
+                on_comment=lambda comment: collect_table_mention(comment, accumulator),
+                on_unterminated=unterminated.append):
+            parse_sql_statement(statement, accumulator)
+
+    return accumulator, not unterminated
+
+# Pool de processus pour l'analyse des gros fichiers SQL (créé au premier besoin)
+sql_parse_pool = None
+sql_parse_pool_lock = threading.Lock()
+
+def get_sql_parse_pool():
+    """Retourne le pool de processus d'analyse SQL (démarrage « spawn », sûr avec les threads de Flask)"""
+    global sql_parse_pool
+
+    with sql_parse_pool_lock:
+        if sql_parse_pool is None:
+            sql_parse_pool = ProcessPoolExecutor(max_workers=SQL_PARSE_WORKERS,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return sql_parse_pool
+
+# Fonction pour analyser un gros fichier SQL en parallèle
+def parse_sql_file_parallel(file_path, on_progress=None, shard_size=None):
+    """Découpe le fichier projeté en mémoire en plages, les analyse dans le pool de processus et fusionne"""
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        # Environ quatre plages par processus pour équilibrer la charge
+        shard_size = shard_size or max(SQL_PARSE_MIN_SHARD_SIZE, len(mapped) // (SQL_PARSE_WORKERS * 4))
+        ranges = find_sql_shard_ranges(mapped, shard_size)
+
+    global sql_parse_pool
+
+    pool = get_sql_parse_pool()
+    results = [None] * len(ranges)
+    bytes_done = 0
 
-                # Dédupliquer les colonnes
-                columns = list(set(columns))
+    try:
+        futures = {pool.submit(parse_sql_file_range, file_path, start, end): index
+                   for index, (start, end) in enumerate(ranges)}
+
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            bytes_done += ranges[index][1] - ranges[index][0]
+            if on_progress:
+                on_progress(bytes_done)
+    except BrokenProcessPool as e:
+        # Un processus a été tué (mémoire, signal): recréer le pool au prochain appel et finir dans ce processus
+        print(f"Pool d'analyse SQL indisponible ({str(e)}), analyse dans le processus courant")
+        with sql_parse_pool_lock:
+            if sql_parse_pool is pool:
+                sql_parse_pool = None
+        for index, (start, end) in enumerate(ranges):
+            if results[index] is None:
+                results[index] = parse_sql_file_range(file_path, start, end)
+
+    # La première plage commence au début du fichier; une plage complète garantit que la suivante commence
+    # bien sur une instruction. Une plage incomplète est réanalysée avec la suivante (cas rare).
+    index = 0
+    while index < len(ranges) - 1:
+        if results[index][1]:
+            index += 1
+            continue
+        ranges[index:index + 2] = [(ranges[index][0], ranges[index + 1][1])]
+        results[index:index + 2] = [parse_sql_file_range(file_path, *ranges[index])]
+
+    return merge_sql_schema_accumulators([accumulator for accumulator, _ in results])
 
-                # Si aucune colonne n'est trouvée, ajouter des colonnes par défaut
-                if not columns:
-                    columns = ['id', 'name']
+# Fonction pour analyser un fichier SQL et extraire le schéma
+def extract_schema_from_sql_file(file_path, on_progress=None, parallel=None):
+    """Analyse un fichier SQL en flux et extrait le schéma de la base de données en un seul passage.
 
-                tables[table_name.lower()] = columns
+    Avec parallel=True (par défaut au-delà de SQL_PARALLEL_PARSE_MIN_SIZE), le fichier est projeté en
+    mémoire et découpé en plages analysées par SQL_PARSE_WORKERS processus.
+    """
+    try:
+        file_size = os.path.getsize(file_path)
+        if parallel is None:
+            parallel = file_size >= SQL_PARALLEL_PARSE_MIN_SIZE and SQL_PARSE_WORKERS > 1
 
-        # Si toujours aucune table n'est trouvée, créer une table par défaut basée sur le nom du fichier
-        if not tables:
-            file_name = os.path.basename(file_path)
-            table_name = os.path.splitext(file_name)[0].replace('-', '_').replace(' ', '_').lower()
+        if parallel and file_size:
+            accumulator = parse_sql_file_parallel(file_path, on_progress)
+        else:
+            accumulator = new_sql_schema_accumulator()
 
-            # Ajouter une table par défaut
-            tables[table_name] = ['id', 'name', 'description', 'created_at']
+            with open(file_path, 'rb') as f:
+                for statement in iter_sql_statements(
+                        f, on_comment=lambda comment: collect_table_mention(comment, accumulator),
+                        on_progress=on_progress):
+                    parse_sql_statement(statement, accumulator)
 
-            print(f"Aucune table trouvée dans le fichier SQL. Création d'une table par défaut: {table_name}")
+        return finalize_sql_schema(accumulator, file_path)
+    except Exception as e:
+        print(f"Erreur lors de l'analyse du fichier SQL: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
+            'tables': {},
+            'relations': [],
+            'schema_sql': "",
+            'error': str(e)
+        }
 
-        # Générer le schéma SQL
-        schema_sql = ""
-        for table, columns in tables.items():
-            schema_sql += f"CREATE TABLE {table} (\n"
+JSON_WHITESPACE_PATTERN = re.compile(r'\s*')
+JSON_NUMBER_TAIL_PATTERN = re.compile(r'[\d.eE+\-]*')
+# Type SQL de chaque type de valeur JSON (bool est testé avant int grâce à la correspondance exacte des types)
+JSON_VALUE_TYPES = {bool: 'BOOLEAN', int: 'INTEGER', float: 'REAL', str: 'TEXT', dict: 'JSON', list: 'JSON'}
+DATE_VALUE_PATTERN = re.compile(
+    r'\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?')
+
+class JsonStreamReader:
+    """Lecture incrémentale d'un document JSON: le tampon ne contient que la valeur en cours de décodage"""
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, stream, chunk_size=JSON_PARSE_CHUNK_SIZE, on_progress=None):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.text_decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def fill(self):
+        """Ajoute un bloc au tampon (en retirant la partie déjà lue); retourne False si rien n'a été ajouté"""
+        if self.eof:
+            return False
+
+        raw = self.stream.read(self.chunk_size)
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        size = len(self.buffer)
+
+        if raw:
+            self.bytes_read += len(raw)
+            self.buffer += self.text_decoder.decode(raw)
+        else:
+            self.eof = True
+            self.buffer += self.text_decoder.decode(b'', final=True)
+        if self.on_progress:
+            self.on_progress(self.bytes_read)
+
+        return len(self.buffer) > size or not self.eof
+
+    def peek(self):
+        """Retourne le prochain caractère significatif sans le consommer ('' en fin de fichier)"""
+        while True:
+            self.pos = JSON_WHITESPACE_PATTERN.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def consume(self, expected):
+        """Consomme le prochain caractère significatif, qui doit faire partie de expected"""
+        char = self.peek()
+        if not char or char not in expected:
+            raise ValueError(f"Caractère {char!r} inattendu après {self.bytes_read} octets lus "
+                             f"(attendu: {' ou '.join(expected)})")
+        self.pos += 1
+        return char
+
+    def read_value(self):
+        """Décode la valeur JSON suivante (objet, tableau, chaîne, nombre...) en complétant le tampon si besoin"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # Un nombre suivi uniquement de caractères numériques jusqu'à la fin du tampon peut continuer
+                # dans le bloc suivant ("1" puis ".5")
+                if self.eof or not isinstance(value, (int, float)) or \
+                        JSON_NUMBER_TAIL_PATTERN.match(self.buffer, end).end() < len(self.buffer):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+# Fonction pour parcourir les éléments d'un tableau JSON un à un
+def iter_json_array(reader, key):
+    """Produit ('record', clé, élément) pour chaque élément du tableau qui commence au curseur"""
+    reader.consume('[')
+    if reader.peek() == ']':
+        reader.consume(']')
+        return
+
+    while True:
+        yield ('record', key, reader.read_value())
+        if reader.consume(',]') == ']':
+            return
+
+# Fonction pour parcourir un document JSON sous forme d'événements
+def iter_json_events(reader):
+    """Produit les enregistrements des tableaux de premier niveau sans charger le document.
+
+    Événements: ('record', clé, élément) pour chaque élément d'un tableau à la racine (clé None) ou
+    sous une clé de l'objet racine, et ('value', clé, valeur) pour les autres valeurs de l'objet racine.
+    """
+    first = reader.peek()
+
+    if first == '[':
+        yield from iter_json_array(reader, None)
+    elif first == '{':
+        reader.consume('{')
+        if reader.peek() == '}':
+            reader.consume('}')
+            return
+
+        while True:
+            key = reader.read_value()
+            reader.consume(':')
+            if reader.peek() == '[':
+                yield from iter_json_array(reader, key)
+            else:
+                yield ('value', key, reader.read_value())
+            if reader.consume(',}') == '}':
+                return
+    elif first:
+        yield ('value', None, reader.read_value())
+
+# Fonction pour produire les mêmes événements à partir d'un document déjà chargé
+def iter_json_object_events(json_content):
+    """Équivalent de iter_json_events pour un document décodé en mémoire (fichier réparé)"""
+    if isinstance(json_content, list):
+        for item in json_content:
+            yield ('record', None, item)
+    elif isinstance(json_content, dict):
+        for key, value in json_content.items():
+            if isinstance(value, list):
+                for item in value:
+                    yield ('record', key, item)
+            else:
+                yield ('value', key, value)
+    else:
+        yield ('value', None, json_content)
 
-            # Ajouter les colonnes
-            for i, column in enumerate(columns):
-                # Déterminer le type de données en fonction du nom de la colonne
-                if column.endswith("_id") or column == "id":
-                    data_type = "INTEGER"
-                elif column.endswith("_date") or column.endswith("_at") or column == "date":
-                    data_type = "TIMESTAMP"
-                elif column.endswith("_price") or column.endswith("_amount") or column.endswith("_cost"):
-                    data_type = "DECIMAL(10, 2)"
-                else:
-                    data_type = "TEXT"
+# Fonction pour créer la structure qui accumule les statistiques d'un fichier JSON
+def new_json_schema_accumulator():
+    """Profils des tableaux d'enregistrements et valeurs de premier niveau, remplis événement par événement"""
+    return {
+        'profiles': {},  # clé du tableau (None = racine) -> {'rows', 'type_counts', 'sample'}
+        'values': {},  # clé -> valeur (objets de premier niveau)
+        'relations': []  # éléments du tableau "relations" (schéma explicite)
+    }
 
-                primary_key = " PRIMARY KEY" if column == "id" else ""
-                comma = "," if i < len(columns) - 1 else ""
-                schema_sql += f"    {column} {data_type}{primary_key}{comma}\n"
+# Fonction pour mettre à jour le profil d'un tableau avec un enregistrement
+def profile_json_record(profile, record):
+    """Compte les couples (colonne, type de valeur) de l'enregistrement et met à jour l'échantillon"""
+    profile['rows'] += 1
+    # Counter.update compte en C: les clés, les nulls (NoneType) et les types sont tous dérivés de ces couples
+    profile['type_counts'].update(zip(record, map(type, record.values())))
+
+    # Échantillon de réservoir (algorithme R): chaque enregistrement a la même probabilité d'y figurer
+    sample = profile['sample']
+    if len(sample) < JSON_SAMPLE_SIZE:
+        sample.append(record)
+    else:
+        index = random.randrange(profile['rows'])
+        if index < JSON_SAMPLE_SIZE:
+            sample[index] = record
+
+# Fonction pour traiter un événement produit par iter_json_events
+def accumulate_json_event(accumulator, event):
+    """Met à jour le profil de la table ou mémorise la valeur de premier niveau"""
+    kind, key, value = event
+
+    if kind == 'value':
+        accumulator['values'][key] = value
+        return
+
+    if key == 'relations' and isinstance(value, dict) and len(accumulator['relations']) < JSON_MAX_RELATIONS:
+        accumulator['relations'].append(value)
+
+    if isinstance(value, dict):
+        profile = accumulator['profiles'].get(key)
+        if profile is None:
+            profile = accumulator['profiles'][key] = {'rows': 0, 'type_counts': Counter(), 'sample': []}
+        profile_json_record(profile, value)
+
+# Fonction pour déterminer le type SQL d'une colonne à partir de ses statistiques
+def infer_json_column_type(column, stats, sample):
+    """Type majoritaire sur tout le fichier; les chaînes sont affinées (dates) à partir de l'échantillon"""
+    types = stats['types']
+    if not types:
+        return None  # Toujours nulle: le type sera déduit du nom de la colonne
+    if len(types) == 1:
+        column_type = next(iter(types))
+    elif set(types) <= {'INTEGER', 'REAL'}:
+        column_type = 'REAL'
+    else:
+        column_type = 'TEXT'
+
+    if column_type == 'TEXT':
+        values = [record[column] for record in sample if isinstance(record.get(column), str)]
+        if values and all(DATE_VALUE_PATTERN.fullmatch(value) for value in values):
+            column_type = 'DATE' if all(len(value) == 10 for value in values) else 'TIMESTAMP'
+
+    return column_type
+
+# Fonction pour transformer le profil d'un tableau en colonnes typées
+def build_json_table(profile):
+    """Retourne les colonnes (id en premier, puis ordre d'apparition), leurs types et leurs statistiques"""
+    column_counts = {}
+    for (column, value_type), count in profile['type_counts'].items():
+        stats = column_counts.setdefault(column, {'count': 0, 'nulls': 0, 'types': {}})
+        stats['count'] += count
+        if value_type is type(None):
+            stats['nulls'] += count
+        else:
+            sql_type = JSON_VALUE_TYPES.get(value_type, 'TEXT')
+            stats['types'][sql_type] = stats['types'].get(sql_type, 0) + count
+
+    columns = list(column_counts)
+    if 'id' in columns:
+        columns.remove('id')
+        columns.insert(0, 'id')
+
+    column_types = {}
+    column_stats = {}
+    for column in columns:
+        stats = column_counts[column]
+        column_type = infer_json_column_type(column, stats, profile['sample'])
+        if column_type:
+            column_types[column] = column_type
+        # Une clé absente d'un enregistrement compte comme une valeur nulle
+        column_stats[column] = {
+            'null_ratio': round(1 - (stats['count'] - stats['nulls']) / profile['rows'], 4),
+            'types': stats['types']
+        }
 
-            schema_sql += ");\n\n"
+    return columns, column_types, {'rows': profile['rows'], 'columns': column_stats}
 
-        # Ajouter les contraintes de clé étrangère
-        for relation in relations:
-            table1 = relation['table1']
-            column1 = relation['column1']
-            table2 = relation['table2']
-            column2 = relation['column2']
+# Fonction pour construire le schéma final d'un fichier JSON
+def finalize_json_schema(accumulator, file_path):
+    """Applique, dans l'ordre, les trois formats reconnus: schéma explicite, liste d'objets, objet de tables"""
+    values = accumulator['values']
+    profiles = accumulator['profiles']
+    file_name = os.path.basename(file_path)
+    default_table_name = os.path.splitext(file_name)[0].replace('-', '_').replace(' ', '_').lower()
 
-            schema_sql += f"-- Relation: {table1}.{column1} = {table2}.{column2}\n"
-            schema_sql += f"-- ALTER TABLE {table1} ADD FOREIGN KEY ({column1}) REFERENCES {table2}({column2});\n\n"
+    # Méthode 1: Le JSON contient un schéma de base de données explicite
+    # Format attendu: {"tables": {"table1": ["col1", "col2"], ...}, "relations": [{"table1": "t1", "column1": "c1", "table2": "t2", "column2": "c2"}, ...]}
+    if isinstance(values.get('tables'), dict):
+        tables = values['tables']
+        relations = [relation for relation in accumulator['relations']
+                     if all(relation.get(key) for key in ('table1', 'column1', 'table2', 'column2'))]
 
         return {
             'tables': tables,
             'relations': relations,
-            'schema_sql': schema_sql
-        }
-    except Exception as e:
-        print(f"Erreur lors de l'analyse du fichier SQL: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return {
-            'tables': {},
-            'relations': [],
-            'schema_sql': "",
-            'error': str(e)
+            'schema_sql': build_schema_sql(tables, relations)
         }
 
+    tables = {}
+    column_types = {}
+    column_stats = {}
+
+    # Méthode 2: Liste d'objets (données) à la racine, une table nommée d'après le fichier
+    if None in profiles:
+        tables[default_table_name], column_types[default_table_name], column_stats[default_table_name] = \
+            build_json_table(profiles[None])
+
+    # Méthode 3: Objet dont les clés de premier niveau sont des tables (listes d'enregistrements ou objets)
+    else:
+        for key, profile in profiles.items():
+            tables[key], column_types[key], column_stats[key] = build_json_table(profile)
+        for key, value in values.items():
+            if isinstance(value, dict) and key not in tables:
+                tables[key] = list(value.keys())
+
+    # Si aucun format n'est reconnu, créer une structure par défaut
+    if not tables:
+        return create_default_schema(default_table_name)
+
+    # Essayer de détecter les relations (colonne <table>_id vers <table>.id)
+    relations = []
+    for table, columns in tables.items():
+        for column in columns:
+            if column.endswith("_id") and column != "id" and column[:-3] in tables:
+                relations.append({'table1': table, 'column1': column, 'table2': column[:-3], 'column2': 'id'})
+
+    return {
+        'tables': tables,
+        'relations': relations,
+        'column_types': column_types,
+        'column_stats': column_stats,
+        'schema_sql': build_schema_sql(tables, relations, column_types)
+    }
+
 # Fonction pour analyser un fichier JSON et extraire le schéma
-def extract_schema_from_json_file(file_path):
-    """Analyse un fichier JSON et extrait le schéma de la base de données"""
+def extract_schema_from_json_file(file_path, on_progress=None):
+    """Analyse un fichier JSON en flux et extrait le schéma de la base de données (mémoire bornée)"""
+    file_name = os.path.basename(file_path)
+    table_name = os.path.splitext(file_name)[0].replace('-', '_').replace(' ', '_').lower()
+
     try:
-        # Lire le contenu du fichier JSON
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            try:
-                json_content = json.load(f)
-            except json.JSONDecodeError as e:
-                print(f"Erreur de décodage JSON: {str(e)}")
-                # Essayer de réparer le JSON
-                f.seek(0)  # Retourner au début du fichier
-                content = f.read()
+        accumulator = new_json_schema_accumulator()
+
+        try:
+            with open(file_path, 'rb') as f:
+                for event in iter_json_events(JsonStreamReader(f, on_progress=on_progress)):
+                    accumulate_json_event(accumulator, event)
+        except ValueError as e:
+            print(f"Erreur de décodage JSON: {str(e)}")
+
+            if accumulator['profiles'] or accumulator['values']:
+                # Fichier tronqué ou corrompu en cours de route: garder ce qui a été lu
+                print("Schéma déduit de la partie du fichier décodée avant l'erreur")
+            elif os.path.getsize(file_path) <= JSON_REPAIR_MAX_SIZE:
+                # Essayer de réparer le JSON (petits fichiers uniquement: la réparation travaille en mémoire)
+                with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                    content = f.read()
                 # Remplacer les caractères problématiques
                 content = content.replace("'", '"').replace('\n', ' ').replace('\r', '')
                 try:
                     json_content = json.loads(content)
-                except:
+                except ValueError:
                     # Si toujours pas possible, créer une structure par défaut
-                    file_name = os.path.basename(file_path)
-                    table_name = os.path.splitext(file_name)[0].replace('-', '_').replace(' ', '_').lower()
                     return create_default_schema(table_name)
+                for event in iter_json_object_events(json_content):
+                    accumulate_json_event(accumulator, event)
+            else:
+                return create_default_schema(table_name)
 
-        # Méthode 1: Vérifier si le JSON contient un schéma de base de données explicite
-        if isinstance(json_content, dict) and 'tables' in json_content:
-            # Format attendu: {"tables": {"table1": ["col1", "col2"], ...}, "relations": [{"table1": "t1", "column1": "c1", "table2": "t2", "column2": "c2"}, ...]}
-            tables = json_content.get('tables', {})
-            relations = json_content.get('relations', [])
+        return finalize_json_schema(accumulator, file_path)
 
-            # Générer le schéma SQL
-            schema_sql = ""
-            for table, columns in tables.items():
-                schema_sql += f"CREATE TABLE {table} (\n"
+    except Exception as e:
+        print(f"Erreur lors de l'analyse du fichier JSON: {str(e)}")
+        import traceback
+        traceback.print_exc()
 
-                # Ajouter les colonnes
-                for i, column in enumerate(columns):
-                    # Déterminer le type de données en fonction du nom de la colonne
-                    if column.endswith("_id") or column == "id":
-                        data_type = "INTEGER"
-                    elif column.endswith("_date") or column.endswith("_at") or column == "date":
-                        data_type = "TIMESTAMP"
-                    elif column.endswith("_price") or column.endswith("_amount") or column.endswith("_cost"):
-                        data_type = "DECIMAL(10, 2)"
-                    else:
-                        data_type = "TEXT"
+        # Créer une structure par défaut en cas d'erreur
+        return create_default_schema(table_name)
 
-                    primary_key = " PRIMARY KEY" if column == "id" else ""
-                    comma = "," if i < len(columns) - 1 else ""
-                    schema_sql += f"    {column} {data_type}{primary_key}{comma}\n"
+# Reconnaissance du type d'une valeur CSV (du plus spécifique au plus général)
+CSV_INTEGER_PATTERN = re.compile(r'[+-]?\d+')
+CSV_FLOAT_PATTERN = re.compile(r'[+-]?(?:\d+[.,]\d*|[.,]\d+|\d+)(?:[eE][+-]?\d+)?')
+CSV_DATE_PATTERN = re.compile(r'\d{1,2}/\d{1,2}/\d{4}(?: \d{2}:\d{2}(?::\d{2})?)?')
+CSV_BOOLEAN_VALUES = {'true', 'false', 'vrai', 'faux', 'yes', 'no', 'oui', 'non'}
+CSV_SQL_TYPES = {'int': 'INTEGER', 'float': 'REAL', 'date': 'DATE', 'bool': 'BOOLEAN', 'text': 'TEXT'}
+
+# Fonction pour déterminer les types compatibles avec une valeur CSV
+def classify_csv_value(value):
+    """Retourne les types compatibles avec la valeur (un entier est aussi un réel)"""
+    if CSV_INTEGER_PATTERN.fullmatch(value):
+        return ('int', 'float')
+    if CSV_FLOAT_PATTERN.fullmatch(value):
+        return ('float',)
+    if DATE_VALUE_PATTERN.fullmatch(value) or CSV_DATE_PATTERN.fullmatch(value):
+        return ('date',)
+    if value.lower() in CSV_BOOLEAN_VALUES:
+        return ('bool',)
+    return ()
+
+# Fonction pour déterminer le type d'une colonne CSV à partir de l'échantillon
+def infer_csv_column_type(values):
+    """Retourne (type SQL, confiance, nombre de valeurs par type) pour les valeurs échantillonnées d'une colonne.
+
+    Le type retenu est le plus spécifique compatible avec au moins CSV_TYPE_CONFIDENCE des valeurs non vides;
+    la confiance est la part de ces valeurs effectivement compatibles (pour le texte: incompatibles avec
+    tous les autres types).
+    """
+    counts = {'int': 0, 'float': 0, 'date': 0, 'bool': 0}
+    filled = 0
+    has_time = False
+
+    for value in values:
+        value = value.strip()
+        if not value:
+            continue
+        filled += 1
+        for value_type in classify_csv_value(value):
+            counts[value_type] += 1
+        if ':' in value:
+            has_time = True
+
+    if not filled:
+        return None, 0.0, {}
+
+    for value_type in ('int', 'float', 'date', 'bool'):
+        confidence = counts[value_type] / filled
+        if confidence >= CSV_TYPE_CONFIDENCE:
+            sql_type = CSV_SQL_TYPES[value_type]
+            if value_type == 'date' and has_time:
+                sql_type = 'TIMESTAMP'
+            return sql_type, round(confidence, 4), {key: count for key, count in counts.items() if count}
+
+    # Texte: la confiance est la part des valeurs qui ne correspondent à aucun autre type
+    return 'TEXT', round(1 - max(counts.values()) / filled, 4), {key: count for key, count in counts.items() if count}
+
+# Fonction pour transformer les en-têtes CSV en noms de colonnes SQL
+def normalize_csv_columns(header):
+    """Met les noms en minuscules, remplace les caractères spéciaux et rend les noms uniques"""
+    columns = []
+    for index, name in enumerate(header):
+        column = re.sub(r'\W+', '_', name.strip().lower()).strip('_') or f'column_{index + 1}'
+        if column[0].isdigit():
+            column = f'column_{column}'
+        base, suffix = column, 2
+        while column in columns:
+            column = f'{base}_{suffix}'
+            suffix += 1
+        columns.append(column)
+    return columns
+
+# Fonction pour détecter le format d'un fichier CSV
+def sniff_csv_format(head):
+    """Détecte le dialecte (séparateur, guillemets) et la présence d'une ligne d'en-tête"""
+    # Ne garder que des lignes complètes
+    if '\n' in head:
+        head = head[:head.rindex('\n') + 1]
+
+    sniffer = csv.Sniffer()
+    try:
+        dialect = sniffer.sniff(head, delimiters=CSV_DELIMITERS)
+    except csv.Error:
+        # Séparateur le plus fréquent sur la première ligne
+        first_line = head.split('\n', 1)[0]
+        dialect = csv.excel()
+        dialect.delimiter = max(CSV_DELIMITERS, key=first_line.count)
 
-                schema_sql += ");\n\n"
+    try:
+        has_header = sniffer.has_header(head)
+    except csv.Error:
+        has_header = True
 
-            # Ajouter les contraintes de clé étrangère
-            for relation in relations:
-                table1 = relation.get('table1', '')
-                column1 = relation.get('column1', '')
-                table2 = relation.get('table2', '')
-                column2 = relation.get('column2', '')
+    return dialect, has_header
 
-                if table1 and column1 and table2 and column2:
-                    schema_sql += f"-- Relation: {table1}.{column1} = {table2}.{column2}\n"
-                    schema_sql += f"-- ALTER TABLE {table1} ADD FOREIGN KEY ({column1}) REFERENCES {table2}({column2});\n\n"
+# Fonction pour analyser un fichier CSV et extraire le schéma
+def extract_schema_from_csv_file(file_path, on_progress=None):
+    """Analyse un fichier CSV en flux: une table nommée d'après le fichier, types déduits d'un échantillon"""
+    file_name = os.path.basename(file_path)
+    table_name = os.path.splitext(file_name)[0].replace('-', '_').replace(' ', '_').lower()
 
-            return {
-                'tables': tables,
-                'relations': relations,
-                'schema_sql': schema_sql
+    try:
+        with open(file_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
+            dialect, has_header = sniff_csv_format(f.read(CSV_SNIFF_SIZE))
+            f.seek(0)
+
+            reader = csv.reader(f, dialect)
+            first_row = next(reader, None)
+            if not first_row:
+                return create_default_schema(table_name)
+
+            rows = 0
+            sample = []
+            if has_header:
+                columns = normalize_csv_columns(first_row)
+            else:
+                columns = [f'column_{index + 1}' for index in range(len(first_row))]
+                rows = 1
+                sample.append(first_row)
+
+            # Échantillon de réservoir (algorithme R) sur toutes les lignes du fichier
+            for row in reader:
+                rows += 1
+                if len(sample) < CSV_SAMPLE_SIZE:
+                    sample.append(row)
+                else:
+                    index = random.randrange(rows)
+                    if index < CSV_SAMPLE_SIZE:
+                        sample[index] = row
+                if on_progress and rows % CSV_PROGRESS_INTERVAL == 0:
+                    on_progress(f.buffer.tell())
+
+            if on_progress:
+                on_progress(os.path.getsize(file_path))
+
+        column_types = {}
+        column_stats = {}
+        for index, column in enumerate(columns):
+            values = [row[index] if index < len(row) else '' for row in sample]
+            column_type, confidence, type_counts = infer_csv_column_type(values)
+            if column_type:
+                column_types[column] = column_type
+            column_stats[column] = {
+                'type': column_type,
+                'confidence': confidence,
+                'null_ratio': round(sum(1 for value in values if not value.strip()) / len(values), 4) if values else 1.0,
+                'types': type_counts
             }
 
-        # Méthode 2: Analyser une liste d'objets (données)
-        elif isinstance(json_content, list) and len(json_content) > 0:
-            # Format attendu: liste d'objets représentant des données
-            tables = {}
-
-            # Analyser le premier objet pour déterminer la structure
-            sample_object = json_content[0]
-
-            if isinstance(sample_object, dict):
-                # Créer une table pour ce type d'objet
-                file_name = os.path.basename(file_path)
-                table_name = os.path.splitext(file_name)[0].replace('-', '_').replace(' ', '_').lower()
-
-                # Analyser tous les objets pour trouver toutes les colonnes possibles
-                all_columns = set()
-                column_types = {}
-
-                for obj in json_content[:100]:  # Limiter à 100 objets pour l'analyse
-                    if isinstance(obj, dict):
-                        for key, value in obj.items():
-                            all_columns.add(key)
-
-                            # Déterminer le type de données
-                            if key not in column_types:
-                                if isinstance(value, int):
-                                    column_types[key] = "INTEGER"
-                                elif isinstance(value, float):
-                                    column_types[key] = "REAL"
-                                elif isinstance(value, bool):
-                                    column_types[key] = "BOOLEAN"
-                                elif isinstance(value, dict):
-                                    column_types[key] = "JSON"
-                                elif isinstance(value, list):
-                                    column_types[key] = "JSON"
-                                else:
-                                    column_types[key] = "TEXT"
-
-                # Convertir en liste et s'assurer que 'id' est en premier si présent
-                columns = list(all_columns)
-                if 'id' in columns:
-                    columns.remove('id')
-                    columns.insert(0, 'id')
-
-                tables[table_name] = columns
-
-                # Générer le schéma SQL
-                schema_sql = f"CREATE TABLE {table_name} (\n"
-
-                # Ajouter les colonnes
-                for i, column in enumerate(columns):
-                    # Utiliser le type détecté ou un type par défaut basé sur le nom
-                    if column in column_types:
-                        data_type = column_types[column]
-                    elif column.endswith("_id") or column == "id":
-                        data_type = "INTEGER"
-                    elif column.endswith("_date") or column.endswith("_at") or column == "date":
-                        data_type = "TIMESTAMP"
-                    elif column.endswith("_price") or column.endswith("_amount") or column.endswith("_cost"):
-                        data_type = "DECIMAL(10, 2)"
-                    else:
-                        data_type = "TEXT"
-
-                    primary_key = " PRIMARY KEY" if column == "id" else ""
-                    comma = "," if i < len(columns) - 1 else ""
-                    schema_sql += f"    {column} {data_type}{primary_key}{comma}\n"
-
-                schema_sql += ");\n\n"
-
-                return {
-                    'tables': tables,
-                    'relations': [],
-                    'schema_sql': schema_sql
-                }
-
-        # Méthode 3: Analyser un objet unique (peut-être une structure de base de données)
-        elif isinstance(json_content, dict):
-            # Essayer de détecter si c'est une structure de base de données
-            tables = {}
-            relations = []
-
-            # Vérifier si les clés de premier niveau pourraient être des noms de tables
-            for key, value in json_content.items():
-                if isinstance(value, dict):
-                    # Pourrait être une table avec des colonnes comme clés
-                    columns = list(value.keys())
-                    tables[key] = columns
-                elif isinstance(value, list) and len(value) > 0 and isinstance(value[0], dict):
-                    # Pourrait être une liste d'enregistrements
-                    columns = set()
-                    for item in value[:100]:  # Limiter à 100 items
-                        if isinstance(item, dict):
-                            columns.update(item.keys())
-                    tables[key] = list(columns)
-
-            # Si des tables ont été détectées, générer le schéma SQL
-            if tables:
-                schema_sql = ""
-                for table, columns in tables.items():
-                    schema_sql += f"CREATE TABLE {table} (\n"
-
-                    # Ajouter les colonnes
-                    for i, column in enumerate(columns):
-                        # Déterminer le type de données en fonction du nom de la colonne
-                        if column.endswith("_id") or column == "id":
-                            data_type = "INTEGER"
-                        elif column.endswith("_date") or column.endswith("_at") or column == "date":
-                            data_type = "TIMESTAMP"
-                        elif column.endswith("_price") or column.endswith("_amount") or column.endswith("_cost"):
-                            data_type = "DECIMAL(10, 2)"
-                        else:
-                            data_type = "TEXT"
-
-                        primary_key = " PRIMARY KEY" if column == "id" else ""
-                        comma = "," if i < len(columns) - 1 else ""
-                        schema_sql += f"    {column} {data_type}{primary_key}{comma}\n"
-
-                    schema_sql += ");\n\n"
-
-                # Essayer de détecter les relations
-                for table, columns in tables.items():
-                    for column in columns:
-                        if column.endswith("_id") and column != "id":
-                            # Essayer de deviner la table référencée
-                            ref_table = column[:-3]  # Enlever "_id"
-                            if ref_table in tables:
-                                relations.append({
-                                    'table1': table,
-                                    'column1': column,
-                                    'table2': ref_table,
-                                    'column2': 'id'
-                                })
-
-                                schema_sql += f"-- Relation: {table}.{column} = {ref_table}.id\n"
-                                schema_sql += f"-- ALTER TABLE {table} ADD FOREIGN KEY ({column}) REFERENCES {ref_table}(id);\n\n"
-
-                return {
-                    'tables': tables,
-                    'relations': relations,
-                    'schema_sql': schema_sql
-                }
-
-        # Si aucun format n'est reconnu, créer une structure par défaut
-        file_name = os.path.basename(file_path)
-        table_name = os.path.splitext(file_name)[0].replace('-', '_').replace(' ', '_').lower()
-        return create_default_schema(table_name)
+        tables = {table_name: columns}
+        return {
+            'tables': tables,
+            'relations': [],
+            'column_types': {table_name: column_types},
+            'column_stats': {table_name: {'rows': rows, 'sampled_rows': len(sample), 'columns': column_stats}},
+            'schema_sql': build_schema_sql(tables, [], {table_name: column_types})
+        }
 
     except Exception as e:
-        print(f"Erreur lors de l'analyse du fichier JSON: {str(e)}")
+        print(f"Erreur lors de l'analyse du fichier CSV: {str(e)}")
         import traceback
         traceback.print_exc()
 
         # Créer une structure par défaut en cas d'erreur
-        file_name = os.path.basename(file_path)
-        table_name = os.path.splitext(file_name)[0].replace('-', '_').replace(' ', '_').lower()
         return create_default_schema(table_name)
 
 # Fonction pour créer un schéma par défaut
@@ -459,6 +1241,916 @@ def create_default_schema(table_name):
         'schema_sql': schema_sql
     }
 
+# Registre des schémas: base SQLite partagée par les processus et cache mémoire propre à chaque processus
+schema_store_db = None
+schema_store_lock = threading.Lock()
+loaded_schemas = OrderedDict()  # identifiant -> schéma compilé (compile_schema)
+
+# Fonction pour calculer l'identifiant d'un schéma
+def compute_schema_id(schema_info):
+    """Calcule l'empreinte SHA-256 du contenu du schéma (deux imports identiques ont le même identifiant)"""
+    payload = json.dumps(schema_info, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# Fonction pour ouvrir la base du registre des schémas
+def get_schema_store_db():
+    """Ouvre (une seule fois) la base SQLite qui contient les schémas importés"""
+    global schema_store_db
+
+    if schema_store_db is None:
+        if not os.path.exists(CACHE_FOLDER):
+            os.makedirs(CACHE_FOLDER)
+        # Plusieurs processus serveur écrivent dans la même base: attendre le verrou plutôt qu'échouer
+        db = sqlite3.connect(SCHEMA_STORE_PATH, check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS schemas ("
+            "schema_id TEXT PRIMARY KEY, schema_json TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        # Tâches de fond: lisibles par tous les processus serveur, quel que soit celui qui exécute la tâche
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS background_jobs ("
+            "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, job_key TEXT, status TEXT NOT NULL, "
+            "job_json TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS background_jobs_key ON background_jobs (job_key, created_at)")
+        db.commit()
+        schema_store_db = db
+
+    return schema_store_db
+
+# Fonction pour garder un schéma dans le cache mémoire du processus
+def _remember_schema(schema_id, schema_info):
+    """Ajoute le schéma compilé au cache mémoire en évinçant le moins récemment utilisé (verrou déjà pris)"""
+    compiled_schema = loaded_schemas.get(schema_id)
+    if compiled_schema is None:
+        compiled_schema = compile_schema(schema_id, schema_info)
+        loaded_schemas[schema_id] = compiled_schema
+    loaded_schemas.move_to_end(schema_id)
+    while len(loaded_schemas) > SCHEMA_MEMORY_CACHE_SIZE:
+        loaded_schemas.popitem(last=False)
+    return compiled_schema
+
+# Fonction pour enregistrer un schéma dans le registre
+def register_schema(schema_info):
+    """Enregistre le schéma (s'il n'existe pas déjà) et retourne son identifiant"""
+    schema_id = compute_schema_id(schema_info)
+
+    with schema_store_lock:
+        db = get_schema_store_db()
+        db.execute(
+            "INSERT OR IGNORE INTO schemas (schema_id, schema_json, created_at) VALUES (?, ?, ?)",
+            (schema_id, json.dumps(schema_info, ensure_ascii=False), time.time())
+        )
+        db.commit()
+        _remember_schema(schema_id, schema_info)
+
+    return schema_id
+
+# Fonction pour obtenir le schéma compilé correspondant à un identifiant
+def get_compiled_schema(schema_id):
+    """Retourne le schéma compilé (chargé et compilé à la première utilisation), ou None"""
+    if not schema_id:
+        return None
+
+    with schema_store_lock:
+        if schema_id in loaded_schemas:
+            loaded_schemas.move_to_end(schema_id)
+            return loaded_schemas[schema_id]
+
+        row = get_schema_store_db().execute(
+            "SELECT schema_json FROM schemas WHERE schema_id = ?", (schema_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        return _remember_schema(schema_id, json.loads(row[0]))
+
+# Fonction pour charger un schéma depuis le registre
+def load_schema(schema_id):
+    """Retourne le schéma correspondant à l'identifiant (chargé à la première utilisation), ou None"""
+    compiled_schema = get_compiled_schema(schema_id)
+    return compiled_schema['schema'] if compiled_schema else None
+
+# Fonction pour obtenir le schéma compilé de l'utilisateur courant
+def get_active_compiled_schema():
+    """Retourne le schéma compilé référencé par la session, ou None"""
+    return get_compiled_schema(session.get('custom_schema_id'))
+
+# Fonction pour obtenir le schéma personnalisé de l'utilisateur courant
+def get_active_custom_schema():
+    """Retourne le schéma personnalisé référencé par la session, ou None"""
+    return load_schema(session.get('custom_schema_id'))
+
+# Bases d'exécution: une base SQLite par schéma importé, construite une seule fois
+sandbox_locks = {}  # identifiant du schéma -> verrou de construction
+sandbox_locks_lock = threading.Lock()
+
+# Fonction pour calculer l'empreinte d'un fichier
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    """Calcule l'empreinte SHA-256 du fichier, lu par blocs"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Fonction pour nommer un fichier importé d'après son contenu
+def build_upload_storage_name(file_hash, filename):
+    """Nom du fichier dans UPLOAD_FOLDER: préfixé par l'empreinte, deux contenus différents ne partagent jamais un fichier"""
+    return f"{file_hash[:16]}_{filename}"
+
+# Fonction pour enregistrer un fichier envoyé en calculant son empreinte
+def save_uploaded_file(file, upload_folder, filename, chunk_size=1024 * 1024):
+    """Copie le fichier par blocs dans un fichier temporaire propre à l'envoi, puis le renomme d'après son empreinte.
+    Retourne (chemin du fichier enregistré, empreinte SHA-256)"""
+    digest = hashlib.sha256()
+    temp_path = os.path.join(upload_folder, f"{uuid.uuid4().hex}.tmp")
+    try:
+        with open(temp_path, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(chunk_size), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        file_hash = digest.hexdigest()
+        # Un envoi concurrent du même nom avec un autre contenu écrit un autre fichier;
+        # avec le même contenu, le renommage atomique remplace le fichier par un fichier identique
+        file_path = os.path.join(upload_folder, build_upload_storage_name(file_hash, filename))
+        os.replace(temp_path, file_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return file_path, file_hash
+
+# Fonction pour convertir un type déclaré en type SQLite
+def sqlite_column_type(declared_type):
+    """Retire les paramètres (« INT(11) UNSIGNED » -> « INT UNSIGNED »): SQLite n'en garde que l'affinité"""
+    return re.sub(r'\s*\([^)]*\)', '', declared_type or '').strip() or guess_column_type('')
+
+# Fonction pour générer les CREATE TABLE SQLite d'un schéma
+def build_sandbox_ddl(schema_info):
+    """Retourne les instructions CREATE TABLE de la base d'exécution (identifiants entre guillemets)"""
+    column_types = schema_info.get('column_types', {})
+    statements = []
+
+    for table, columns in schema_info['tables'].items():
+        definitions = []
+        for column in columns:
+            declared_type = column_types.get(table, {}).get(column) or guess_column_type(column)
+            definitions.append(f'"{column}" {sqlite_column_type(declared_type)}')
+        statements.append(f'CREATE TABLE IF NOT EXISTS "{table}" ({", ".join(definitions)})')
+
+    return statements
+
+# Début d'un INSERT ... VALUES (les tuples qui suivent sont lus un à un par iter_insert_rows)
+SQL_INSERT_VALUES_HEAD_PATTERN = re.compile(
+    r'(?:INSERT|REPLACE)\s+(?:(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|IGNORE)\s+)*INTO\s+(' + SQL_QUALIFIED_IDENTIFIER +
+    r')\s*(?:\(([^)]*)\)\s*)?VALUES\s*', re.IGNORECASE)
+# Espaces et commentaires complets entre deux instructions
+SQL_LEADING_SKIP_PATTERN = re.compile(r'(?:\s+|(?:--|#)[^\n]*\n|/\*[\s\S]*?\*/)*')
+# Un tuple complet, suivi d'une virgule (autre tuple) ou de la fin de la liste; le caractère suivant doit
+# être présent dans le tampon pour qu'un tuple coupé en fin de bloc ne soit pas pris pour le dernier
+SQL_VALUES_TUPLE_PATTERN = re.compile(r"""
+    \s*\(
+    ( (?: [^'"()]+
+        | '[^'\\]*(?:(?:\\[\s\S]|'')[^'\\]*)*'
+        | "[^"\\]*(?:(?:\\[\s\S]|"")[^"\\]*)*"
+        | \([^()'"]*\)
+      )* )
+    \)\s*(,?)(?=\s*[^\s,])""", re.VERBOSE)
+# Jetons d'un tuple non reconnu par SQL_VALUES_TUPLE_PATTERN, pour trouver sa fin sans couper une chaîne;
+# un guillemet isolé est une chaîne coupée en fin de bloc
+SQL_TUPLE_SCAN_PATTERN = re.compile(r"""
+    [^'"();]+
+  | '[^'\\]*(?:(?:\\[\s\S]|'')[^'\\]*)*'
+  | "[^"\\]*(?:(?:\\[\s\S]|"")[^"\\]*)*"
+  | [()'";]""", re.VERBOSE)
+# Une valeur d'un tuple: chaîne, nombre, mot-clé ou autre expression (conservée telle quelle)
+SQL_VALUE_PATTERN = re.compile(r"""
+    \s*(?:
+        '([^'\\]*(?:(?:\\[\s\S]|'')[^'\\]*)*)'
+      | "([^"\\]*(?:(?:\\[\s\S]|"")[^"\\]*)*)"
+      | ([-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)(?=\s*(?:,|$))
+      | (NULL|TRUE|FALSE)(?=\s*(?:,|$))
+      | ((?:[^,'"()]|\([^()]*\)|'[^']*')+?)
+    )\s*(?:,|$)""", re.VERBOSE | re.IGNORECASE)
+SQL_STRING_ESCAPE_PATTERNS = {"'": re.compile(r"\\([\s\S])|''"), '"': re.compile(r'\\([\s\S])|""')}
+SQL_STRING_ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+SQL_KEYWORD_VALUES = {'null': None, 'true': 1, 'false': 0}
+
+# Fonction pour décoder une chaîne SQL
+def unescape_sql_string(value, quote):
+    """Interprète les échappements MySQL (\\n, \\', ...) et les guillemets doublés"""
+    if '\\' not in value and quote * 2 not in value:
+        return value
+    return SQL_STRING_ESCAPE_PATTERNS[quote].sub(
+        lambda match: quote if match.group(1) is None else SQL_STRING_ESCAPES.get(match.group(1), match.group(1)),
+        value)
+
+# Fonction pour convertir le contenu d'un tuple VALUES en valeurs Python
+def parse_sql_values(tuple_body):
+    """Retourne la liste des valeurs du tuple (chaînes, entiers, réels, None)"""
+    values = []
+    for match in SQL_VALUE_PATTERN.finditer(tuple_body):
+        kind = match.lastindex
+        value = match.group(kind)
+        if kind == 1:
+            values.append(unescape_sql_string(value, "'"))
+        elif kind == 2:
+            values.append(unescape_sql_string(value, '"'))
+        elif kind == 3:
+            values.append(float(value) if '.' in value or 'e' in value or 'E' in value else int(value))
+        elif kind == 4:
+            values.append(SQL_KEYWORD_VALUES[value.lower()])
+        else:
+            values.append(value.strip())
+    return values
+
+# Fonction pour trouver la fin d'un tuple VALUES non reconnu
+def find_sql_tuple_end(buffer, pos):
+    """Retourne (position après le tuple, True si un autre tuple suit), ou None si le tuple est incomplet.
+
+    Le tuple s'arrête à sa parenthèse fermante de premier niveau, ou au premier point-virgule hors chaîne.
+    """
+    pos = SQL_LEADING_SKIP_PATTERN.match(buffer, pos).end()
+    if pos >= len(buffer):
+        return None
+    if buffer[pos] != '(':
+        return pos, False  # Pas un tuple: la fin de l'instruction est sautée
+
+    depth = 0
+    for match in SQL_TUPLE_SCAN_PATTERN.finditer(buffer, pos):
+        token = match.group()
+        if token in '\'"':
+            return None  # Chaîne coupée: attendre le bloc suivant
+        if token == ';':
+            return match.start(), False
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+            if depth == 0:
+                # Le séparateur qui suit le tuple doit être présent dans le tampon
+                following = SQL_LEADING_SKIP_PATTERN.match(buffer, match.end()).end()
+                if following >= len(buffer):
+                    return None
+                if buffer[following] == ',':
+                    # Comme SQL_VALUES_TUPLE_PATTERN: le tuple suivant doit avoir commencé, sinon ce tuple
+                    # complet mais coupé après sa virgule serait pris pour un tuple illisible
+                    if SQL_LEADING_SKIP_PATTERN.match(buffer, following + 1).end() >= len(buffer):
+                        return None
+                    return following + 1, True
+                return match.end(), False
+    return None
+
+# Fonction pour lire les lignes des INSERT d'un flux SQL
+def iter_insert_rows(stream, chunk_size=SQL_PARSE_CHUNK_SIZE, on_progress=None, on_skip=None):
+    """Produit (table, colonnes ou None, valeurs) pour chaque tuple des INSERT ... VALUES du flux.
+
+    Les tuples sont lus un à un: un INSERT étendu de plusieurs Go n'est jamais chargé en entier.
+    Les autres instructions, et la fin des INSERT non reconnue (ON DUPLICATE KEY...), sont sautées.
+    Un tuple illisible est sauté seul, et signalé à on_skip(table).
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    buffer = ''
+    pos = 0
+    eof = False
+    bytes_read = 0
+    insert = None  # (table, colonnes) de l'INSERT en cours
+    skipping = False  # True jusqu'à la fin de l'instruction en cours
+
+    while not eof:
+        raw = stream.read(chunk_size)
+        buffer = buffer[pos:]
+        pos = 0
+        if raw:
+            bytes_read += len(raw)
+            buffer += decoder.decode(raw)
+        else:
+            eof = True
+            # Point-virgule final: termine une dernière instruction qui n'en a pas
+            buffer += decoder.decode(b'', final=True) + '\n;'
+        if on_progress:
+            on_progress(bytes_read)
+
+        while True:
+            if insert is not None:
+                match = SQL_VALUES_TUPLE_PATTERN.match(buffer, pos)
+                if match is None:
+                    # Tuple non reconnu (CONCAT('a', 'b'), parenthèses imbriquées...): sauter ce tuple seulement
+                    tuple_end = find_sql_tuple_end(buffer, pos)
+                    if tuple_end is None and not eof and len(buffer) - pos < SQL_TUPLE_MAX_CHARS:
+                        break  # Tuple coupé: attendre le bloc suivant
+                    if on_skip:
+                        on_skip(insert[0])
+                    if tuple_end is None or not tuple_end[1]:
+                        insert = None
+                        skipping = True  # Dernier tuple, ou tuple sans fin: sauter le reste de l'instruction
+                    if tuple_end is not None:
+                        pos = tuple_end[0]
+                    continue
+
+                yield insert[0], insert[1], parse_sql_values(match.group(1))
+                pos = match.end()
+                if not match.group(2):
+                    insert = None
+                    skipping = True  # Fin de la liste: sauter le reste de l'instruction
+                continue
+
+            if skipping:
+                end = SQL_STATEMENT_PATTERN.match(buffer, pos).end()
+                if end < len(buffer) and buffer[end] == ';':
+                    pos = end + 1
+                    skipping = False
+                    continue
+                pos = end
+                break
+
+            # Début d'instruction
+            pos = SQL_LEADING_SKIP_PATTERN.match(buffer, pos).end()
+            head = SQL_INSERT_VALUES_HEAD_PATTERN.match(buffer, pos)
+            if head and head.end() < len(buffer):
+                columns = None
+                if head.group(2) is not None:
+                    columns = tuple(clean_sql_identifier(column) for column in split_sql_top_level(head.group(2)))
+                insert = (clean_sql_identifier(head.group(1)), columns)
+                pos = head.end()
+            elif not eof and len(buffer) - pos < 4096:
+                break  # En-tête peut-être incomplet
+            else:
+                skipping = True
+
+# Fonction pour charger les données des INSERT du fichier importé dans la base d'exécution
+def bulk_load_sql_inserts(db, schema_info, file_path, on_progress=None):
+    """Insère les tuples des INSERT par lots (executemany) dans de grandes transactions.
+
+    Retourne les statistiques du chargement: lignes chargées et ignorées, par table, et débit.
+    """
+    tables = schema_info['tables']
+    statements = {}  # (table, colonnes) -> (requête préparée, nombre de valeurs attendu) ou None
+    batches = {}
+    stats = {'rows_loaded': 0, 'rows_skipped': 0, 'tables': {}}
+    pending_rows = 0
+    start_time = time.time()
+
+    def flush(key):
+        rows = batches.pop(key, [])
+        if not rows:
+            return
+        try:
+            db.executemany(statements[key][0], rows)
+            stats['rows_loaded'] += len(rows)
+            stats['tables'][key[0]] = stats['tables'].get(key[0], 0) + len(rows)
+        except sqlite3.Error as e:
+            print(f"Lot ignoré pour la table {key[0]}: {str(e)}")
+            stats['rows_skipped'] += len(rows)
+
+    def report(bytes_read):
+        if on_progress:
+            on_progress(bytes_read, stats)
+
+    def skip(table):
+        stats['rows_skipped'] += 1
+
+    db.execute("BEGIN")
+    with open(file_path, 'rb') as f:
+        for table, columns, values in iter_insert_rows(f, on_progress=report, on_skip=skip):
+            key = (table, columns)
+            statement = statements.get(key, False)
+            if statement is False:
+                # Préparer la requête une seule fois par (table, colonnes)
+                table_columns = tables.get(table)
+                target_columns = columns or (tuple(table_columns) if table_columns else None)
+                if not table_columns or not set(target_columns) <= set(table_columns):
+                    statement = None
+                else:
+                    column_list = ', '.join(f'"{column}"' for column in target_columns)
+                    placeholders = ', '.join('?' * len(target_columns))
+                    statement = (f'INSERT INTO "{table}" ({column_list}) VALUES ({placeholders})',
+                                 len(target_columns))
+                statements[key] = statement
+
+            if statement is None or len(values) != statement[1]:
+                stats['rows_skipped'] += 1
+                continue
+
+            batch = batches.setdefault(key, [])
+            batch.append(values)
+            if len(batch) >= SANDBOX_LOAD_BATCH_ROWS:
+                pending_rows += len(batch)
+                flush(key)
+                if pending_rows >= SANDBOX_COMMIT_ROWS:
+                    db.execute("COMMIT")
+                    db.execute("BEGIN")
+                    pending_rows = 0
+
+    for key in list(batches):
+        flush(key)
+    db.execute("COMMIT")
+
+    elapsed = time.time() - start_time
+    stats['elapsed'] = round(elapsed, 3)
+    stats['rows_per_second'] = round(stats['rows_loaded'] / elapsed) if elapsed > 0 else stats['rows_loaded']
+    return stats
+
+# Fonction pour obtenir la base d'exécution d'un schéma
+def get_sandbox_path(schema_id, schema_info, on_progress=None):
+    """Retourne le chemin de la base SQLite du schéma, construite (tables et données) au premier appel"""
+    sandbox_path = os.path.join(SANDBOX_FOLDER, f"{schema_id}.sqlite3")
+    if os.path.exists(sandbox_path):
+        return sandbox_path
+
+    with sandbox_locks_lock:
+        lock = sandbox_locks.setdefault(schema_id, threading.Lock())
+
+    with lock:
+        if os.path.exists(sandbox_path):
+            return sandbox_path
+        if not os.path.exists(SANDBOX_FOLDER):
+            os.makedirs(SANDBOX_FOLDER)
+
+        # Construire dans un fichier temporaire puis le renommer: une base visible est toujours complète
+        temp_path = f"{sandbox_path}.{os.getpid()}.tmp"
+        # isolation_level=None: les transactions du chargement sont gérées explicitement
+        db = sqlite3.connect(temp_path, isolation_level=None)
+        try:
+            # Journalisation désactivée pendant le chargement: en cas d'échec le fichier temporaire est jeté
+            db.execute("PRAGMA journal_mode = OFF")
+            db.execute("PRAGMA synchronous = OFF")
+            db.execute("PRAGMA locking_mode = EXCLUSIVE")
+            db.execute("PRAGMA temp_store = MEMORY")
+            db.execute("PRAGMA cache_size = -65536")
+            for statement in build_sandbox_ddl(schema_info):
+                db.execute(statement)
+
+            stats = {'rows_loaded': 0, 'rows_skipped': 0, 'rows_per_second': 0, 'elapsed': 0}
+            source_file = schema_info.get('source_file')
+            if source_file and source_file.lower().endswith('.sql'):
+                file_path = os.path.join(UPLOAD_FOLDER, source_file)
+                if os.path.exists(file_path):
+                    # Ne jamais charger les données d'un autre contenu que celui analysé pour ce schéma
+                    expected_hash = schema_info.get('source_sha256')
+                    if expected_hash and compute_file_hash(file_path) != expected_hash:
+                        raise ValueError(f"Le fichier {source_file} ne correspond plus au fichier importé "
+                                         f"(empreinte différente), importez-le à nouveau")
+                    stats = bulk_load_sql_inserts(db, schema_info, file_path, on_progress)
+                    if on_progress:
+                        # Dernier état: compte les lots insérés après la fin de la lecture
+                        on_progress(os.path.getsize(file_path), stats)
+        except Exception:
+            db.close()
+            os.remove(temp_path)
+            raise
+        db.close()
+        os.replace(temp_path, sandbox_path)
+
+        print(f"Base d'exécution {schema_id[:12]} créée: {stats['rows_loaded']} lignes chargées "
+              f"({stats['rows_skipped']} ignorées) en {stats['elapsed']}s, {stats['rows_per_second']} lignes/s")
+
+    return sandbox_path
+
+# Tâches de fond (import et chargement des données), suivies par /upload_status et /ingestion_status.
+# L'état est enregistré dans le registre des schémas (table background_jobs): avec plusieurs processus serveur,
+# le suivi peut être interrogé sur n'importe lequel. Chaque processus garde l'état à jour des tâches qu'il exécute.
+background_jobs = {}  # identifiant -> état des tâches en cours dans ce processus
+background_jobs_lock = threading.Lock()
+ingestion_executor = ThreadPoolExecutor(max_workers=INGESTION_WORKERS, thread_name_prefix='ingestion')
+ingestion_futures = {}  # identifiant du schéma -> (identifiant de la tâche, Future)
+
+# Statuts des tâches terminées, seules à pouvoir être oubliées
+BACKGROUND_JOB_FINISHED_STATUSES = ('completed', 'failed')
+
+# Fonction pour écrire l'état d'une tâche dans le registre
+def _write_background_job(job, job_key=None, insert=False):
+    """Enregistre l'état de la tâche dans la table background_jobs (verrou du registre pris ici)"""
+    now = time.time()
+    with schema_store_lock:
+        db = get_schema_store_db()
+        if insert:
+            db.execute(
+                "INSERT INTO background_jobs (job_id, kind, job_key, status, job_json, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job['id'], job['kind'], job_key, job['status'], json.dumps(job, ensure_ascii=False),
+                 job['created_at'], now)
+            )
+            # Oublier les plus anciennes tâches terminées; une tâche en attente ou en cours reste consultable
+            db.execute(
+                "DELETE FROM background_jobs WHERE status IN (?, ?) AND job_id NOT IN ("
+                "SELECT job_id FROM background_jobs WHERE status IN (?, ?) ORDER BY updated_at DESC LIMIT ?)",
+                BACKGROUND_JOB_FINISHED_STATUSES * 2 + (BACKGROUND_JOBS_MAX,)
+            )
+        else:
+            db.execute("UPDATE background_jobs SET status = ?, job_json = ?, updated_at = ? WHERE job_id = ?",
+                       (job['status'], json.dumps(job, ensure_ascii=False), now, job['id']))
+        db.commit()
+
+# Fonction pour créer une tâche de fond
+def create_background_job(kind, job_key=None, **fields):
+    """Enregistre une nouvelle tâche et retourne son identifiant (job_key: clé de réutilisation facultative)"""
+    job_id = uuid.uuid4().hex
+    job = dict(fields, id=job_id, kind=kind, status='pending', created_at=time.time())
+    with background_jobs_lock:
+        background_jobs[job_id] = dict(job, _written_at=time.monotonic())
+    _write_background_job(job, job_key, insert=True)
+    return job_id
+
+# Fonction pour mettre à jour l'état d'une tâche de fond
+def update_background_job(job_id, **fields):
+    """Met à jour la tâche; la progression seule est écrite au plus toutes les BACKGROUND_JOB_WRITE_INTERVAL secondes"""
+    with background_jobs_lock:
+        job = background_jobs.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        now = time.monotonic()
+        if 'status' not in fields and now - job['_written_at'] < BACKGROUND_JOB_WRITE_INTERVAL:
+            return
+        job['_written_at'] = now
+        snapshot = {key: value for key, value in job.items() if key != '_written_at'}
+        # Une tâche terminée n'est plus lue qu'à partir du registre
+        if snapshot['status'] in BACKGROUND_JOB_FINISHED_STATUSES:
+            del background_jobs[job_id]
+    _write_background_job(snapshot)
+
+# Fonction pour lire l'état d'une tâche de fond
+def get_background_job(job_id):
+    """Retourne une copie de l'état de la tâche (exécutée par ce processus ou par un autre), ou None"""
+    with background_jobs_lock:
+        job = background_jobs.get(job_id)
+        if job is not None:
+            return {key: value for key, value in job.items() if key != '_written_at'}
+
+    with schema_store_lock:
+        row = get_schema_store_db().execute(
+            "SELECT job_json FROM background_jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+# Fonction pour retrouver la dernière tâche créée avec une clé de réutilisation
+def find_background_job(job_key):
+    """Retourne l'état de la tâche la plus récente enregistrée sous cette clé, ou None"""
+    with schema_store_lock:
+        row = get_schema_store_db().execute(
+            "SELECT job_id FROM background_jobs WHERE job_key = ? ORDER BY created_at DESC LIMIT 1", (job_key,)
+        ).fetchone()
+    return get_background_job(row[0]) if row else None
+
+# Fonction exécutée par ingestion_executor
+def run_ingestion_job(job_id, schema_id, schema_info):
+    """Construit la base d'exécution du schéma en publiant la progression du chargement"""
+    start_time = time.time()
+    update_background_job(job_id, status='running', started_at=start_time)
+
+    def on_progress(bytes_read, stats):
+        elapsed = time.time() - start_time
+        update_background_job(job_id, bytes_read=bytes_read, rows_loaded=stats['rows_loaded'],
+                              rows_skipped=stats['rows_skipped'], tables=dict(stats['tables']),
+                              rows_per_second=round(stats['rows_loaded'] / elapsed) if elapsed > 0 else 0)
+
+    try:
+        get_sandbox_path(schema_id, schema_info, on_progress)
+        update_background_job(job_id, status='completed', elapsed=round(time.time() - start_time, 3))
+    except Exception as e:
+        print(f"Erreur lors du chargement des données: {str(e)}")
+        update_background_job(job_id, status='failed', error=str(e))
+        raise
+
+# Fonction pour lancer (une seule fois par schéma) le chargement des données en arrière-plan
+def start_ingestion_job(schema_id, schema_info):
+    """Retourne (identifiant de la tâche, Future) du chargement de la base d'exécution du schéma"""
+    with background_jobs_lock:
+        running = ingestion_futures.get(schema_id)
+    if running and not running[1].done():
+        return running
+
+    source_file = schema_info.get('source_file') or ''
+    file_path = os.path.join(UPLOAD_FOLDER, source_file)
+    job_id = create_background_job(
+        'ingestion', schema_id=schema_id, source_file=source_file,
+        bytes_total=os.path.getsize(file_path) if source_file and os.path.exists(file_path) else 0,
+        bytes_read=0, rows_loaded=0, rows_per_second=0)
+    future = ingestion_executor.submit(run_ingestion_job, job_id, schema_id, schema_info)
+
+    with background_jobs_lock:
+        ingestion_futures[schema_id] = (job_id, future)
+    return job_id, future
+
+# Analyse des fichiers importés en arrière-plan, suivie par /upload_status
+upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload')
+
+# Fonction pour extraire le schéma d'un fichier importé selon son type
+def extract_schema_from_uploaded_file(file_path, filename, on_progress=None):
+    """Retourne le schéma du fichier; un schéma par défaut nommé d'après le fichier si rien n'est reconnu"""
+    schema_info = None
+    try:
+        if filename.lower().endswith('.sql'):
+            schema_info = extract_schema_from_sql_file(file_path, on_progress)
+        elif filename.lower().endswith('.json'):
+            schema_info = extract_schema_from_json_file(file_path, on_progress)
+        elif filename.lower().endswith('.csv'):
+            schema_info = extract_schema_from_csv_file(file_path, on_progress)
+        elif filename.lower().endswith('.txt'):
+            # Pour les fichiers texte, essayer d'abord comme SQL puis comme JSON
+            schema_info = extract_schema_from_sql_file(file_path, on_progress)
+            if not schema_info or not schema_info.get('tables'):
+                schema_info = extract_schema_from_json_file(file_path, on_progress)
+        else:
+            # Essayer de deviner le format en fonction du contenu
+            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                content = f.read(1000)  # Lire les 1000 premiers caractères
+            if 'CREATE TABLE' in content or 'INSERT INTO' in content:
+                schema_info = extract_schema_from_sql_file(file_path, on_progress)
+            elif '{' in content or '[' in content:
+                schema_info = extract_schema_from_json_file(file_path, on_progress)
+    except Exception as e:
+        print(f"Erreur lors de l'extraction du schéma: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+    # Format non reconnu ou schéma vide: créer un schéma par défaut
+    if not schema_info or not schema_info.get('tables'):
+        table_name = os.path.splitext(filename)[0].replace('-', '_').replace(' ', '_').lower()
+        schema_info = create_default_schema(table_name)
+
+    return schema_info
+
+# Fonction exécutée par upload_executor
+def run_upload_job(job_id, file_path, filename, file_hash):
+    """Analyse le fichier importé, enregistre le schéma et lance le chargement des données"""
+    start_time = time.time()
+    update_background_job(job_id, status='running', started_at=start_time)
+
+    def on_progress(bytes_read):
+        update_background_job(job_id, bytes_read=bytes_read, elapsed=round(time.time() - start_time, 3))
+
+    try:
+        schema_info = extract_schema_from_uploaded_file(file_path, filename, on_progress)
+
+        # Fichier source enregistré (données des INSERT rejouées par /execute) et son empreinte
+        schema_info['source_file'] = os.path.basename(file_path)
+        schema_info['source_sha256'] = file_hash
+        # Le schéma est compilé à l'enregistrement (fragments des prompts, affichage, index de liaison)
+        schema_id = register_schema(schema_info)
+
+        # Charger les données des INSERT dans une seconde tâche: le schéma est utilisable sans attendre
+        ingestion_job_id = None
+        if filename.lower().endswith('.sql'):
+            ingestion_job_id, _ = start_ingestion_job(schema_id, schema_info)
+
+        update_background_job(job_id, status='completed', schema_id=schema_id,
+                              bytes_read=os.path.getsize(file_path), tables_found=len(schema_info['tables']),
+                              ingestion_job_id=ingestion_job_id, elapsed=round(time.time() - start_time, 3))
+    except Exception as e:
+        print(f"Erreur lors de l'import du fichier: {str(e)}")
+        update_background_job(job_id, status='failed', error=str(e), elapsed=round(time.time() - start_time, 3))
+        raise
+
+# Fonction pour lancer l'analyse d'un fichier importé, ou retrouver celle d'un fichier identique
+def start_upload_job(file_path, filename, file_hash):
+    """Retourne l'identifiant de la tâche d'import; un fichier déjà importé réutilise la tâche existante"""
+    # Clé de réutilisation (empreinte, nom du fichier), partagée par les processus via le registre
+    job_key = f"upload:{file_hash}:{filename}"
+    job = find_background_job(job_key)
+    # Une tâche échouée ou oubliée (BACKGROUND_JOBS_MAX) est relancée
+    if job and job['status'] != 'failed':
+        return job['id']
+
+    job_id = create_background_job('upload', job_key=job_key, filename=filename, file_hash=file_hash,
+                                   bytes_total=os.path.getsize(file_path), bytes_read=0, tables_found=0,
+                                   elapsed=0)
+    upload_executor.submit(run_upload_job, job_id, file_path, filename, file_hash)
+    return job_id
+
+# Fonction pour vérifier qu'une requête peut être exécutée dans la base d'exécution
+def validate_sandbox_query(query):
+    """Retourne la requête sans point-virgule final, ou lève ValueError si ce n'est pas un unique SELECT"""
+    statements = [statement for statement in sqlparse.parse(query) if str(statement).strip(' \n\t;')]
+    if len(statements) != 1:
+        raise ValueError("Une seule requête peut être exécutée à la fois")
+    if statements[0].get_type() != 'SELECT':
+        raise ValueError("Seules les requêtes SELECT peuvent être exécutées")
+    return str(statements[0]).strip().rstrip(';')
+
+# Fonction pour rendre une valeur SQLite sérialisable en JSON
+def sandbox_value(value):
+    """Les valeurs binaires sont retournées en hexadécimal, les autres telles quelles"""
+    return value.hex() if isinstance(value, bytes) else value
+
+# Fonction pour exécuter une requête SELECT dans la base d'exécution d'un schéma
+def execute_sandbox_query(schema_id, schema_info, query, max_rows=EXECUTE_MAX_ROWS, time_budget=EXECUTE_TIME_BUDGET):
+    """Exécute la requête en lecture seule, avec un nombre de lignes et une durée bornés"""
+    query = validate_sandbox_query(query)
+    sandbox_path = get_sandbox_path(schema_id, schema_info)
+
+    start_time = time.monotonic()
+    deadline = start_time + time_budget
+    db = sqlite3.connect(f"file:{sandbox_path}?mode=ro", uri=True)
+    try:
+        db.execute("PRAGMA query_only = ON")
+        # Le gestionnaire de progression interrompt la requête dès que le budget de temps est dépassé
+        db.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, EXECUTE_PROGRESS_STEPS)
+
+        try:
+            cursor = db.execute(query)
+            rows = cursor.fetchmany(max_rows + 1)
+        except sqlite3.OperationalError as e:
+            if str(e) == 'interrupted':
+                raise TimeoutError(f"Temps d'exécution dépassé ({time_budget:g}s)")
+            raise
+        columns = [description[0] for description in cursor.description or []]
+    finally:
+        db.close()
+
+    truncated = len(rows) > max_rows
+    rows = [[sandbox_value(value) for value in row] for row in rows[:max_rows]]
+
+    # Type de chaque colonne d'après les valeurs retournées (utilisé pour choisir les axes des graphiques)
+    column_types = []
+    for index in range(len(columns)):
+        values = [row[index] for row in rows if row[index] is not None]
+        if not values:
+            column_types.append('null')
+        elif all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            column_types.append('number')
+        else:
+            column_types.append('text')
+
+    return {
+        'columns': columns,
+        'column_types': column_types,
+        'rows': rows,
+        'row_count': len(rows),
+        'truncated': truncated,
+        'elapsed_ms': round((time.monotonic() - start_time) * 1000, 1)
+    }
+
+# Fonction pour créer le contexte de pipeline d'une requête
+def create_pipeline_context(text, compiled_schema=None, candidates=SQL_CANDIDATES_DEFAULT,
+                            candidate_budget_ms=SQL_CANDIDATE_BUDGET_MS):
+    """Crée le contexte partagé par toutes les étapes du pipeline pour une requête /process"""
+    return {
+        'text': text,
+        'custom_schema': compiled_schema['schema'] if compiled_schema else None,
+        'compiled_schema': compiled_schema,
+        'candidates': candidates,  # Requêtes candidates demandées au modèle texte → SQL
+        'candidate_budget': candidate_budget_ms / 1000,  # Temps de vérification des candidates (secondes)
+        'executor': None,  # Pool des étapes (None = pipeline_executor; les lots ont leur propre pool)
+        'cache_hits': 0,  # Réponses de modèles servies par le cache pendant cette requête
+        'cache_misses': 0,
+        'stages': {},   # Résultats mémoïsés par nom d'étape
+        'stage_futures': {},  # Étape en cours ou terminée -> (Future de son résultat, thread qui l'exécute)
+        'lock': threading.Lock(),  # Les étapes s'exécutent dans plusieurs threads de pipeline_executor
+        'timings': {},  # Durée de chaque étape en millisecondes
+        'spans': {},    # Début et fin de chaque étape (ms depuis la création du contexte)
+        'dependencies': {},  # Dépendances déclarées de chaque étape
+        'started_at': time.perf_counter(),
+        'deadline': time.monotonic() + PIPELINE_DEADLINE  # Budget partagé par tous les appels aux modèles
+    }
+
+# Pipeline en cours d'exécution dans le thread courant (pour le budget de temps des appels aux modèles)
+current_pipeline = threading.local()
+
+# Fonction pour obtenir l'échéance de la requête en cours
+def get_request_deadline():
+    """Retourne l'échéance (time.monotonic) du pipeline exécuté par ce thread, ou None"""
+    pipeline = getattr(current_pipeline, 'value', None)
+    return pipeline['deadline'] if pipeline is not None else None
+
+# Fonction pour compter une recherche en cache dans le pipeline en cours
+def record_pipeline_cache_lookup(hit):
+    """Ajoute un succès ou un échec de cache aux compteurs du pipeline exécuté par ce thread"""
+    pipeline = getattr(current_pipeline, 'value', None)
+    if pipeline is not None:
+        with pipeline['lock']:
+            pipeline['cache_hits' if hit else 'cache_misses'] += 1
+
+# Fonction pour exécuter une étape du pipeline une seule fois par requête
+def run_pipeline_stage(pipeline, stage_name, compute):
+    """Exécute une étape du pipeline et mémoïse son résultat dans le contexte de la requête.
+
+    Un thread qui demande une étape déjà en cours dans un autre thread attend son résultat au lieu de la relancer.
+    """
+    if pipeline is None:
+        return compute()
+
+    with pipeline['lock']:
+        future, thread = pipeline['stage_futures'].get(stage_name, (None, None))
+        owner = future is None
+        if owner:
+            future = Future()
+            pipeline['stage_futures'][stage_name] = (future, threading.get_ident())
+    if not owner:
+        if thread == threading.get_ident() and not future.done():
+            # Appel imbriqué de l'étape par elle-même: l'attendre bloquerait ce thread
+            return compute()
+        return future.result()
+
+    previous_pipeline = getattr(current_pipeline, 'value', None)
+    current_pipeline.value = pipeline
+    start = time.perf_counter()
+    try:
+        result = compute()
+    except BaseException as e:
+        # Étape en échec: non mémoïsée (un appel suivant la relance), les threads en attente reçoivent l'erreur
+        with pipeline['lock']:
+            del pipeline['stage_futures'][stage_name]
+        future.set_exception(e)
+        raise
+    finally:
+        current_pipeline.value = previous_pipeline
+    end = time.perf_counter()
+
+    with pipeline['lock']:
+        pipeline['stages'][stage_name] = result
+        pipeline['timings'][stage_name] = round((end - start) * 1000, 2)
+        pipeline['spans'][stage_name] = (
+            round((start - pipeline['started_at']) * 1000, 2),
+            round((end - pipeline['started_at']) * 1000, 2)
+        )
+    future.set_result(result)
+    return result
+
+# Pool de threads partagé pour exécuter les étapes indépendantes des requêtes /process et /process_stream.
+# Une étape peut attendre un modèle jusqu'à l'échéance de sa requête: le pool est dimensionné pour que
+# PIPELINE_SERVER_CONCURRENCY requêtes simultanées lancent toutes leurs étapes sans s'attendre.
+PIPELINE_SERVER_CONCURRENCY = int(os.environ.get('SQL_BOT_SERVER_CONCURRENCY', 8))  # Requêtes traitées en même temps
+PIPELINE_STAGE_WIDTH = 3  # Étapes au plus prêtes en même temps dans le graphe de build_sql_pipeline_stages
+PIPELINE_MAX_WORKERS = int(os.environ.get('SQL_BOT_PIPELINE_WORKERS',
+                                          PIPELINE_SERVER_CONCURRENCY * PIPELINE_STAGE_WIDTH))
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix='pipeline')
+
+# Fonction pour exécuter un graphe d'étapes en parallèle
+def run_pipeline_dag(pipeline, stages):
+    """Exécute les étapes {nom: (dépendances, fonction)} dès que leurs dépendances sont prêtes"""
+    for _ in iter_pipeline_dag(pipeline, stages):
+        pass
+    return pipeline['stages']
+
+# Fonction pour exécuter un graphe d'étapes en signalant chaque étape terminée
+def iter_pipeline_dag(pipeline, stages):
+    """Comme run_pipeline_dag, mais produit le nom de chaque étape dès qu'elle est terminée"""
+    pending = {}
+    for stage_name, (dependencies, compute) in stages.items():
+        pipeline['dependencies'][stage_name] = list(dependencies)
+        if stage_name not in pipeline['stages']:
+            pending[stage_name] = (dependencies, compute)
+
+    running = {}
+    executor = pipeline['executor'] or pipeline_executor
+
+    while pending or running:
+        # Lancer toutes les étapes dont les dépendances sont déjà calculées
+        for stage_name, (dependencies, compute) in list(pending.items()):
+            if all(dependency in pipeline['stages'] for dependency in dependencies):
+                del pending[stage_name]
+                future = executor.submit(run_pipeline_stage, pipeline, stage_name, compute)
+                running[future] = stage_name
+
+        if not running:
+            raise ValueError(f"Dépendances impossibles à satisfaire pour les étapes: {', '.join(pending)}")
+
+        # Attendre la fin d'au moins une étape avant de réévaluer le graphe
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            stage_name = running.pop(future)
+            future.result()  # Propager l'éventuelle exception de l'étape
+            yield stage_name
+
+    pipeline['critical_path'] = compute_critical_path(pipeline)
+
+# Fonction pour calculer le chemin critique d'un pipeline exécuté
+def compute_critical_path(pipeline):
+    """Retourne la plus longue chaîne de dépendances (en durée) parmi les étapes exécutées"""
+    longest = {}  # étape -> (durée cumulée, chaîne)
+
+    # Seules les étapes du graphe comptent (les sous-étapes imbriquées sont incluses dans leur parent)
+    timings = {stage_name: duration for stage_name, duration in pipeline['timings'].items()
+               if stage_name in pipeline['dependencies']}
+
+    def chain_to(stage_name):
+        if stage_name not in longest:
+            best_duration, best_chain = 0, []
+            for dependency in pipeline['dependencies'].get(stage_name, []):
+                if dependency in timings:
+                    duration, chain = chain_to(dependency)
+                    if duration > best_duration:
+                        best_duration, best_chain = duration, chain
+            longest[stage_name] = (best_duration + timings[stage_name], best_chain + [stage_name])
+        return longest[stage_name]
+
+    duration, chain = 0, []
+    for stage_name in timings:
+        stage_duration, stage_chain = chain_to(stage_name)
+        if stage_duration > duration:
+            duration, chain = stage_duration, stage_chain
+
+    return {
+        'stages': chain,
+        'duration_ms': round(duration, 2),
+        'sum_of_stages_ms': round(sum(timings.values()), 2),
+        'wall_ms': round(max((end for _, end in pipeline['spans'].values()), default=0), 2)
+    }
+
 # Fonction pour extraire le schéma de la base de données à partir du texte
 def extract_schema_from_text(text):
     """Extrait les informations de schéma (tables, colonnes, relations) à partir du texte"""
@@ -587,6 +2279,761 @@ def extract_schema_from_text(text):
             'schema_sql': ""
         }
 
+# Synonymes français -> mots anglais des identifiants
+SCHEMA_LINK_SYNONYMS = {
+    'utilisateur': ['user', 'account'], 'compte': ['account'], 'client': ['customer', 'client'],
+    'commande': ['order'], 'produit': ['product', 'item'], 'article': ['item', 'article', 'product'],
+    'catégorie': ['category'], 'prix': ['price', 'amount'], 'montant': ['amount', 'total', 'price'],
+    'quantité': ['quantity', 'qty'], 'nom': ['name', 'lastname'], 'prénom': ['firstname', 'first'],
+    'adresse': ['address'], 'ville': ['city'], 'pays': ['country'], 'téléphone': ['phone'],
+    'courriel': ['email', 'mail'], 'statut': ['status', 'state'], 'état': ['status', 'state'],
+    'vendeur': ['seller', 'vendor', 'salesman'], 'vente': ['sale'], 'achat': ['purchase'],
+    'fournisseur': ['supplier', 'vendor'], 'facture': ['invoice', 'bill'], 'paiement': ['payment'],
+    'livraison': ['delivery', 'shipping', 'shipment'], 'employé': ['employee', 'staff'],
+    'salaire': ['salary', 'wage'], 'département': ['department'], 'service': ['department', 'service'],
+    'magasin': ['store', 'shop'], 'boutique': ['shop', 'store'], 'stock': ['stock', 'inventory'],
+    'entrepôt': ['warehouse'], 'ligne': ['line', 'item'], 'détail': ['detail', 'item'],
+    'avis': ['review', 'rating'], 'note': ['rating', 'grade', 'note'], 'étudiant': ['student'],
+    'cours': ['course'], 'professeur': ['teacher', 'professor'], 'classe': ['class'],
+    'auteur': ['author'], 'livre': ['book'], 'emprunt': ['loan', 'borrow'], 'projet': ['project'],
+    'tâche': ['task'], 'équipe': ['team'], 'message': ['message'], 'commentaire': ['comment'],
+    'date': ['date', 'created'], 'année': ['year'], 'mois': ['month'], 'jour': ['day', 'date'],
+    'identifiant': ['id'], 'réduction': ['discount'], 'remise': ['discount'], 'taxe': ['tax'],
+    'devise': ['currency'], 'région': ['region'], 'marque': ['brand'], 'image': ['image', 'picture'],
+}
+# Mots fréquents des questions, ignorés lors de la notation
+SCHEMA_LINK_STOPWORDS = {
+    'le', 'la', 'les', 'un', 'une', 'de', 'du', 'des', 'et', 'ou', 'à', 'au', 'aux', 'en', 'dans', 'par',
+    'pour', 'avec', 'sur', 'qui', 'que', 'quel', 'quelle', 'quels', 'quelles', 'dont', 'est', 'sont',
+    'leur', 'leurs', 'son', 'sa', 'se', 'ce', 'ces', 'cette', 'tous', 'toute', 'toutes', 'plus', 'moins',
+    'afficher', 'affiche', 'lister', 'liste', 'donner', 'donne', 'montrer', 'montre', 'trouver', 'nombre',
+    'the', 'of', 'and', 'or', 'all', 'for', 'with', 'by', 'show', 'list', 'select', 'from', 'where',
+}
+IDENTIFIER_WORD_PATTERN = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+')
+QUESTION_WORD_PATTERN = re.compile(r'\w+')
+
+# Fonction pour normaliser un mot avant la recherche dans l'index
+def normalize_link_word(word):
+    """Minuscules, sans accents, sans « s » final: « Catégories » et « category » deviennent comparables"""
+    word = unicodedata.normalize('NFKD', word.lower())
+    word = ''.join(char for char in word if not unicodedata.combining(char))
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    return word
+
+# Fonction pour découper un identifiant en mots
+def split_identifier_words(identifier):
+    """« orderItems », « order_items » et « ORDER_ITEMS » donnent tous les mots order et item"""
+    return {normalize_link_word(word) for word in IDENTIFIER_WORD_PATTERN.findall(identifier)}
+
+# Synonymes et mots ignorés sous forme normalisée, comparables aux mots de l'index
+link_synonyms = {normalize_link_word(word): [normalize_link_word(synonym) for synonym in synonyms]
+                 for word, synonyms in SCHEMA_LINK_SYNONYMS.items()}
+link_stopwords = {normalize_link_word(word) for word in SCHEMA_LINK_STOPWORDS}
+
+# Fonction pour construire l'index inversé des identifiants d'un schéma
+def build_schema_link_index(schema_info):
+    """Associe chaque mot des noms de tables et de colonnes aux tables et colonnes qui le contiennent"""
+    tables = schema_info['tables']
+    table_words = {}  # mot -> {table: poids}
+    column_words = {}  # mot -> {(table, colonne)}
+    neighbours = {table: set() for table in tables}
+
+    for table, columns in tables.items():
+        for word in split_identifier_words(table):
+            table_words.setdefault(word, {})[table] = SCHEMA_LINK_TABLE_NAME_WEIGHT
+        for column in columns:
+            for word in split_identifier_words(column):
+                table_words.setdefault(word, {}).setdefault(table, 1.0)
+                column_words.setdefault(word, set()).add((table, column))
+
+    for relation in schema_info.get('relations', []):
+        table1, table2 = relation.get('table1'), relation.get('table2')
+        if table1 in neighbours and table2 in neighbours and table1 != table2:
+            neighbours[table1].add(table2)
+            neighbours[table2].add(table1)
+
+    # Un mot présent dans toutes les tables (« id ») ne distingue aucune table
+    table_count = len(tables) or 1
+    idf = {word: math.log(1 + table_count / len(matches)) for word, matches in table_words.items()}
+
+    return {'table_words': table_words, 'column_words': column_words, 'neighbours': neighbours, 'idf': idf}
+
+# Fonction pour générer les lignes « Table t: colonnes » et « t1.c1 = t2.c2 » des prompts
+def build_schema_prompt_lines(schema_info):
+    """Retourne (lignes des tables par table, lignes des relations) pour les prompts des modèles"""
+    table_lines = {table: f"Table {table}: " + (", ".join(columns) if columns else "id, name")
+                   for table, columns in schema_info['tables'].items()}
+    relation_lines = [f"{relation['table1']}.{relation['column1']} = {relation['table2']}.{relation['column2']}"
+                      for relation in schema_info['relations']]
+    return table_lines, relation_lines
+
+# Fonction pour obtenir les lignes des prompts d'un schéma
+def get_schema_prompt_lines(schema_info):
+    """Lignes précalculées (schéma compilé ou sous-schéma lié), sinon générées"""
+    if 'table_lines' in schema_info:
+        return list(schema_info['table_lines'].values()), schema_info['relation_lines']
+    table_lines, relation_lines = build_schema_prompt_lines(schema_info)
+    return list(table_lines.values()), relation_lines
+
+# Fonction pour compiler un schéma (une seule fois, à l'enregistrement ou au premier chargement)
+def compile_schema(schema_id, schema_info):
+    """Précalcule tout ce que les requêtes dérivent du schéma: fragments des prompts, affichage,
+    identifiants pour la validation, graphe des relations et index de liaison"""
+    tables = schema_info['tables']
+    relations = schema_info.get('relations', [])
+    column_types = schema_info.get('column_types') or {}
+    table_lines, relation_lines = build_schema_prompt_lines({'tables': tables, 'relations': relations})
+    link_index = build_schema_link_index(schema_info)
+    display = build_schema_display({'tables': tables, 'relations': relations})
+    column_owners = {}  # colonne en minuscules -> tables qui la contiennent
+    for table, columns in tables.items():
+        for column in columns:
+            column_owners.setdefault(column.lower(), []).append(table)
+
+    compiled_schema = {
+        'schema_id': schema_id,
+        'schema': schema_info,
+        # Fragments assemblés par link_schema sans reconstruire de texte
+        'table_sql': {table: build_table_sql(table, columns, column_types.get(table))
+                      for table, columns in tables.items()},
+        'relation_sql': [build_relation_sql(relation) for relation in relations],
+        'table_lines': table_lines,
+        'relation_lines': relation_lines,
+        'display': display,
+        # Corps complet de la réponse de /get_custom_schema
+        'display_response': json.dumps({'success': True, 'schema_info': display, 'has_schema': True},
+                                       ensure_ascii=False),
+        # Identifiants par nom en minuscules, pour la validation des requêtes générées
+        'table_names': {table.lower(): table for table in tables},
+        'column_names': {table: {column.lower(): column for column in columns} for table, columns in tables.items()},
+        'column_owners': column_owners,
+        # Arbres BK (distance d'édition) pour suggérer l'identifiant valide le plus proche
+        'table_bk_tree': build_bk_tree(table.lower() for table in tables),
+        'column_bk_tree': build_bk_tree(column_owners),
+        'relation_graph': link_index['neighbours'],
+        'link_index': link_index,
+    }
+    compiled_schema['column_count'] = sum(len(columns) for columns in tables.values())
+    compiled_schema['needs_linking'] = (len(tables) > SCHEMA_LINK_MAX_TABLES or
+                                        any(len(columns) > SCHEMA_LINK_MAX_COLUMNS for columns in tables.values()))
+    # Schéma complet, envoyé tel quel quand il est assez petit
+    compiled_schema['full_prompt_schema'] = {
+        'tables': tables,
+        'relations': relations,
+        'schema_sql': schema_info.get('schema_sql') or build_schema_sql(tables, relations, column_types),
+        'table_lines': table_lines,
+        'relation_lines': relation_lines,
+    }
+    return compiled_schema
+
+# Fonction pour extraire les mots d'une question, avec leurs synonymes anglais
+def extract_question_words(text):
+    """Retourne les mots normalisés de la question, sans les mots vides"""
+    words = set()
+    for word in QUESTION_WORD_PATTERN.findall(text):
+        for part in split_identifier_words(word) if '_' in word else (normalize_link_word(word),):
+            # Les nombres de la question sont des valeurs, pas des noms de tables ou de colonnes
+            if part not in link_stopwords and len(part) > 1 and not part.isdigit():
+                words.add(part)
+                words.update(link_synonyms.get(part, ()))
+    return words
+
+# Fonction pour réduire le schéma aux tables pertinentes pour la question
+def link_schema(text, compiled_schema):
+    """Retourne le sous-schéma (tables, relations, schema_sql, lignes des prompts) à envoyer dans les prompts.
+
+    Les tables sont notées par les mots de la question (et leurs synonymes) présents dans leurs
+    identifiants, pondérés par leur rareté. Les SCHEMA_LINK_TOP_K meilleures sont retenues, avec
+    leurs voisines par clé étrangère, dans la limite de SCHEMA_LINK_MAX_TABLES tables.
+    """
+    if not compiled_schema['needs_linking']:
+        return compiled_schema['full_prompt_schema']
+
+    tables = compiled_schema['schema']['tables']
+    relations = compiled_schema['schema'].get('relations', [])
+    index = compiled_schema['link_index']
+    words = extract_question_words(text)
+
+    table_scores = Counter()
+    matched_columns = set()
+    for word in words:
+        weight = index['idf'].get(word)
+        if weight is None:
+            continue
+        for table, table_weight in index['table_words'][word].items():
+            table_scores[table] += weight * table_weight
+        matched_columns.update(index['column_words'].get(word, ()))
+
+    neighbours = compiled_schema['relation_graph']
+    if table_scores:
+        best_score = max(table_scores.values())
+        selected = [table for table, score in table_scores.most_common(SCHEMA_LINK_TOP_K)
+                    if score >= best_score * SCHEMA_LINK_MIN_RELATIVE_SCORE]
+    else:
+        # Aucun mot reconnu: garder les tables les plus reliées, les plus probables dans une jointure
+        selected = sorted(tables, key=lambda table: -len(neighbours[table]))[:SCHEMA_LINK_TOP_K]
+
+    # Voisins par clé étrangère des tables retenues (tables de jointure), les mieux notés d'abord
+    candidates = {neighbour for table in selected for neighbour in neighbours[table]} - set(selected)
+    for neighbour in sorted(candidates, key=lambda table: (-table_scores[table], -len(neighbours[table]), table)):
+        if len(selected) >= SCHEMA_LINK_MAX_TABLES:
+            break
+        selected.append(neighbour)
+
+    selected_set = set(selected)
+    relation_indexes = [position for position, relation in enumerate(relations)
+                        if relation.get('table1') in selected_set and relation.get('table2') in selected_set]
+    linked_relations = [relations[position] for position in relation_indexes]
+
+    # Colonnes des tables larges: clés, colonnes des relations et colonnes citées d'abord
+    key_columns = {(relation['table1'], relation['column1']) for relation in linked_relations}
+    key_columns.update((relation['table2'], relation['column2']) for relation in linked_relations)
+    column_types = compiled_schema['schema'].get('column_types') or {}
+    linked_tables = {}
+    table_sql = []
+    table_lines = []
+    for table in selected:
+        columns = tables[table]
+        if len(columns) > SCHEMA_LINK_MAX_COLUMNS:
+            keep = {column for column in columns
+                    if (table, column) in key_columns or (table, column) in matched_columns or column.lower() == 'id'}
+            keep.update([column for column in columns if column not in keep][:max(0, SCHEMA_LINK_MAX_COLUMNS - len(keep))])
+            columns = [column for column in columns if column in keep]
+            # Seules les tables réduites sont régénérées, les autres réutilisent les fragments compilés
+            table_sql.append(build_table_sql(table, columns, column_types.get(table)))
+            table_lines.append(f"Table {table}: " + ", ".join(columns))
+        else:
+            table_sql.append(compiled_schema['table_sql'][table])
+            table_lines.append(compiled_schema['table_lines'][table])
+        linked_tables[table] = columns
+
+    linked_schema = {
+        'tables': linked_tables,
+        'relations': linked_relations,
+        'schema_sql': "".join(table_sql) + "".join(compiled_schema['relation_sql'][position]
+                                                   for position in relation_indexes),
+        'table_lines': dict(zip(selected, table_lines)),
+        'relation_lines': [compiled_schema['relation_lines'][position] for position in relation_indexes],
+    }
+
+    full_size = len(compiled_schema['full_prompt_schema']['schema_sql']) or 1
+    kept_columns = sum(len(columns) for columns in linked_tables.values())
+    print(f"Liaison au schéma: {len(linked_tables)}/{len(tables)} tables, "
+          f"{kept_columns}/{compiled_schema['column_count']} colonnes, "
+          f"{len(linked_schema['schema_sql'])}/{full_size} caractères "
+          f"({100 * (1 - len(linked_schema['schema_sql']) / full_size):.1f} % élagués)")
+    return linked_schema
+
+# Fonction pour choisir le schéma envoyé dans les prompts
+def select_prompt_schema(text, compiled_schema, extracted_schema_info):
+    """Sous-schéma lié à la question: schéma personnalisé s'il existe, sinon schéma extrait du texte"""
+    if compiled_schema and compiled_schema['schema'].get('tables'):
+        return link_schema(text, compiled_schema)
+    # Le schéma extrait du texte est petit: il est compilé à la volée, sans cache
+    if extracted_schema_info.get('tables'):
+        return link_schema(text, compile_schema(None, extracted_schema_info))
+    return extracted_schema_info
+
+# Validation des requêtes générées: chaque table et colonne citée doit exister dans le schéma
+SQL_VALIDATION_TOKEN_PATTERN = re.compile(r"""
+    \s+ | --[^\n]* | /\*[\s\S]*?(?:\*/|$)
+  | (?P<string>'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'?)
+  | `(?P<backquoted>[^`]*)`? | \[(?P<bracketed>[^\]]*)\]?
+  | "(?P<quoted>[^"]*)"?
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+)
+  | (?P<word>[^\W\d]\w*)
+  | (?P<punct>[.,();*])
+  | (?P<operator>[^\s\w'"`\[.,();*]+)""", re.VERBOSE)
+# Mots-clés, types et mots réservés qui ne sont jamais des identifiants
+SQL_RESERVED_WORDS = {
+    'ADD', 'ALL', 'ALTER', 'AND', 'ANY', 'AS', 'ASC', 'BETWEEN', 'BY', 'CASE', 'CAST', 'COLLATE', 'CREATE',
+    'CROSS', 'CURRENT_DATE', 'CURRENT_TIME', 'CURRENT_TIMESTAMP', 'DATABASE', 'DEFAULT', 'DELETE', 'DESC',
+    'DISTINCT', 'DROP', 'ELSE', 'END', 'ESCAPE', 'EXCEPT', 'EXISTS', 'FALSE', 'FETCH', 'FIRST', 'FOR', 'FROM',
+    'FULL', 'GROUP', 'HAVING', 'IF', 'ILIKE', 'IN', 'INDEX', 'INNER', 'INSERT', 'INTERSECT', 'INTERVAL', 'INTO',
+    'IS', 'JOIN', 'KEY', 'LAST', 'LEFT', 'LIKE', 'LIMIT', 'NATURAL', 'NEXT', 'NOT', 'NULL', 'NULLS', 'OFFSET',
+    'ON', 'ONLY', 'OR', 'ORDER', 'OUTER', 'OVER', 'PARTITION', 'PRIMARY', 'RECURSIVE', 'REFERENCES', 'REGEXP',
+    'RIGHT', 'ROWS', 'ROW', 'SELECT', 'SET', 'SOME', 'TABLE', 'THEN', 'TOP', 'TRUE', 'TRUNCATE', 'UNION',
+    'UNIQUE', 'UNKNOWN', 'UPDATE', 'USING', 'VALUES', 'VIEW', 'WHEN', 'WHERE', 'WITH', 'WITHIN',
+    # Unités de date (EXTRACT(YEAR FROM ...), INTERVAL 1 DAY)
+    'YEAR', 'QUARTER', 'MONTH', 'WEEK', 'DAY', 'HOUR', 'MINUTE', 'SECOND', 'MICROSECOND', 'EPOCH', 'DOW', 'DOY',
+    # Types (CAST(... AS INTEGER))
+    'BIGINT', 'BLOB', 'BOOL', 'BOOLEAN', 'CHAR', 'DATE', 'DATETIME', 'DECIMAL', 'DOUBLE', 'FLOAT', 'INT',
+    'INTEGER', 'NUMERIC', 'PRECISION', 'REAL', 'SIGNED', 'SMALLINT', 'TEXT', 'TIME', 'TIMESTAMP', 'UNSIGNED',
+    'VARCHAR',
+}
+# Mots après lesquels vient un nom de table
+SQL_TABLE_CONTEXT_WORDS = {'FROM', 'JOIN', 'UPDATE', 'INTO', 'TABLE'}
+# Mots qui terminent la liste des tables d'un FROM
+SQL_FROM_END_WORDS = {'WHERE', 'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'UNION', 'EXCEPT', 'INTERSECT', 'ON',
+                      'USING', 'SET', 'VALUES', 'SELECT', 'WINDOW', 'OFFSET', 'FETCH'}
+# Mots réservés suivis des arguments d'une fonction (« CAST(x AS INTEGER) »)
+SQL_FUNCTION_KEYWORDS = {'CAST', 'LEFT', 'RIGHT', 'IF', 'DATE', 'TIME', 'TIMESTAMP', 'YEAR', 'MONTH', 'DAY'}
+# Jetons après lesquels un mot isolé est un alias (« COUNT(*) total », « users u »)
+SQL_ALIAS_PRECEDING_KINDS = {'word', 'identifier', 'number', 'string', 'close'}
+
+# Fonction pour calculer la distance d'édition entre deux mots
+def levenshtein_distance(a, b, max_distance=None):
+    """Distance de Levenshtein; au-delà de max_distance, retourne max_distance + 1 dès que possible"""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+# Fonction pour construire un arbre BK
+def build_bk_tree(words):
+    """Arbre BK: chaque nœud [mot, {distance: enfant}] range ses enfants par distance d'édition au mot"""
+    root = None
+    for word in words:
+        if root is None:
+            root = [word, {}]
+            continue
+        node = root
+        while True:
+            distance = levenshtein_distance(word, node[0])
+            if distance == 0:
+                break
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [word, {}]
+                break
+            node = child
+    return root
+
+# Fonction pour calculer la distance maximale d'une suggestion
+def suggestion_max_distance(word):
+    """Une faute de frappe par mot court, une inversion (« nmae ») ou une faute par tranche de trois caractères"""
+    return 1 if len(word) <= 3 else max(2, len(word) // 3)
+
+# Fonction pour trouver le mot le plus proche dans un arbre BK
+def find_nearest_identifier(tree, word, max_distance):
+    """Retourne le mot de l'arbre le plus proche (à max_distance au plus), ou None.
+
+    L'inégalité triangulaire limite l'exploration aux enfants dont la distance est dans
+    [d - rayon, d + rayon], le rayon se réduisant au meilleur résultat trouvé.
+    """
+    best, best_distance = None, max_distance + 1
+    stack = [tree] if tree else []
+    while stack:
+        node = stack.pop()
+        distance = levenshtein_distance(word, node[0])
+        if distance < best_distance or (distance == best_distance and best is not None and node[0] < best):
+            best, best_distance = node[0], distance
+        radius = min(best_distance, max_distance)
+        stack.extend(child for child_distance, child in node[1].items()
+                     if distance - radius <= child_distance <= distance + radius)
+    return best if best_distance <= max_distance else None
+
+# Fonction pour découper une requête SQL en jetons pour la validation
+def tokenize_sql_for_validation(query):
+    """Retourne les jetons significatifs (genre, valeur); les identifiants entre délimiteurs ont le genre
+    « identifier », les chaînes entre guillemets doubles « quoted » (identifiant ou chaîne selon le dialecte)"""
+    tokens = []
+    for match in SQL_VALIDATION_TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        if kind is None:
+            continue  # Espaces et commentaires
+        value = match.group(kind)
+        if kind in ('backquoted', 'bracketed'):
+            kind = 'identifier'
+        elif kind == 'word' and value.upper() in SQL_RESERVED_WORDS:
+            kind = 'keyword'
+            value = value.upper()
+        elif kind == 'punct':
+            kind = {'(': 'open', ')': 'close'}.get(value, value)
+        tokens.append((kind, value))
+    return tokens
+
+# Fonction pour vérifier les tables et colonnes d'une requête générée
+def validate_generated_sql(query, compiled_schema):
+    """Vérifie chaque table et colonne citée par la requête avec les ensembles précalculés du schéma.
+
+    Retourne {'valid', 'errors', 'tables', 'columns', 'elapsed_us'}; chaque erreur indique l'identifiant inconnu et,
+    si elle existe, la suggestion la plus proche (distance d'édition).
+    """
+    start = time.perf_counter()
+    tokens = tokenize_sql_for_validation(query)
+    table_names = compiled_schema['table_names']
+    column_names = compiled_schema['column_names']
+    known_identifiers = set(table_names) | set(compiled_schema['column_owners'])
+
+    def is_identifier(position):
+        if position >= len(tokens):
+            return False
+        kind, value = tokens[position]
+        # Entre guillemets doubles: identifiant seulement s'il est connu, sinon chaîne (MySQL)
+        return kind in ('word', 'identifier') or (kind == 'quoted' and value.lower() in known_identifiers)
+
+    def token_kind(position):
+        return tokens[position][0] if 0 <= position < len(tokens) else None
+
+    # Première passe: tables citées, alias, tables virtuelles (CTE, sous-requêtes) et alias de résultats
+    roles = {}  # position -> rôle du jeton (table, alias)
+    aliases = {}  # alias en minuscules -> table du schéma (ou None pour une table virtuelle)
+    referenced_tables = []
+    unknown_tables = []
+    output_aliases = set()
+    has_virtual_tables = False
+    parens = []  # pour chaque parenthèse ouverte: 'function', 'derived' ou 'group'
+    from_depths = set()  # profondeurs auxquelles une liste de tables FROM est en cours
+    expect_table = False
+
+    def define_alias(position, table):
+        roles[position] = 'alias'
+        aliases[tokens[position][1].lower()] = table
+
+    position = 0
+    while position < len(tokens):
+        kind, value = tokens[position]
+        depth = len(parens)
+
+        if kind == 'keyword':
+            if value in SQL_TABLE_CONTEXT_WORDS and not (parens and parens[-1] == 'function'):
+                expect_table = True
+                if value == 'FROM':
+                    from_depths.add(depth)
+            elif value in SQL_FROM_END_WORDS:
+                from_depths.discard(depth)
+                expect_table = False
+            elif value == 'AS' and token_kind(position + 1) == 'open' and is_identifier(position - 1):
+                # « nom AS ( » dans un WITH: table virtuelle
+                roles[position - 1] = 'table'
+                aliases[tokens[position - 1][1].lower()] = None
+                has_virtual_tables = True
+            elif value == 'AS' and is_identifier(position + 1):
+                roles[position + 1] = 'alias'
+                output_aliases.add(tokens[position + 1][1].lower())
+                position += 2
+                continue
+
+        elif kind == 'open':
+            if expect_table:
+                parens.append('derived')
+                expect_table = False
+            elif token_kind(position - 1) in ('word', 'identifier') or \
+                    (token_kind(position - 1) == 'keyword' and tokens[position - 1][1] in SQL_FUNCTION_KEYWORDS):
+                parens.append('function')
+            else:
+                parens.append('group')
+
+        elif kind == 'close':
+            opened = parens.pop() if parens else 'group'
+            from_depths.discard(len(parens) + 1)
+            if opened == 'derived':
+                # Alias de la sous-requête: ses colonnes ne sont pas vérifiables
+                has_virtual_tables = True
+                alias_position = position + 2 if token_kind(position + 1) == 'keyword' and \
+                    tokens[position + 1][1] == 'AS' else position + 1
+                if is_identifier(alias_position):
+                    define_alias(alias_position, None)
+                    position = alias_position + 1
+                    continue
+
+        elif kind == ',':
+            if depth in from_depths:
+                expect_table = True
+
+        elif is_identifier(position) and position not in roles:
+            if expect_table:
+                # Nom de table, éventuellement qualifié (base.table)
+                name_position = position
+                while token_kind(name_position + 1) == '.' and is_identifier(name_position + 2):
+                    roles[name_position] = 'qualifier'
+                    name_position += 2
+                roles[name_position] = 'table'
+                name = tokens[name_position][1]
+                table = table_names.get(name.lower())
+                if table is not None:
+                    referenced_tables.append(table)
+                elif name.lower() not in aliases:
+                    unknown_tables.append(name)
+                aliases.setdefault(name.lower(), table)
+                expect_table = False
+
+                # Alias de la table: « AS a » ou mot isolé
+                alias_position = name_position + 1
+                if token_kind(alias_position) == 'keyword' and tokens[alias_position][1] == 'AS':
+                    alias_position += 1
+                if is_identifier(alias_position) and token_kind(alias_position + 1) != 'open':
+                    define_alias(alias_position, table)
+                    position = alias_position + 1
+                    continue
+                position = name_position + 1
+                continue
+            elif (token_kind(position - 1) in SQL_ALIAS_PRECEDING_KINDS or tokens[position - 1] == ('keyword', 'END')) \
+                    and token_kind(position + 1) not in ('.', 'open'):
+                # Alias implicite d'une expression (« COUNT(*) total »)
+                roles[position] = 'alias'
+                output_aliases.add(value.lower())
+
+        position += 1
+
+    errors = []
+    for name in unknown_tables:
+        suggestion = find_nearest_identifier(compiled_schema['table_bk_tree'], name.lower(),
+                                             suggestion_max_distance(name))
+        errors.append({
+            'type': 'table',
+            'identifier': name,
+            'suggestion': table_names.get(suggestion) if suggestion else None
+        })
+
+    # Seconde passe: colonnes, qualifiées (alias.colonne) ou non
+    scope_tables = list(dict.fromkeys(referenced_tables))
+    referenced_columns = set()
+    for position, (kind, value) in enumerate(tokens):
+        if position in roles or not is_identifier(position) or token_kind(position + 1) == 'open':
+            continue
+        if token_kind(position - 1) == '.':
+            continue  # Colonne qualifiée, vérifiée avec son qualificatif
+        column_position = position + 2 if token_kind(position + 1) == '.' else None
+        if column_position is not None:
+            qualifier = value.lower()
+            if qualifier not in aliases:
+                table = table_names.get(qualifier)
+                if table is None:
+                    errors.append({
+                        'type': 'table',
+                        'identifier': value,
+                        'suggestion': (find_nearest_identifier(
+                            build_bk_tree(aliases), qualifier, suggestion_max_distance(qualifier)) if aliases else None)
+                    })
+                    continue
+            else:
+                table = aliases[qualifier]
+            if table is None or not is_identifier(column_position):
+                continue  # Table virtuelle ou « alias.* »
+            column = tokens[column_position][1]
+            if column.lower() in column_names[table]:
+                referenced_columns.add(column.lower())
+            else:
+                suggestion = min(column_names[table], default=None, key=lambda candidate: (
+                    levenshtein_distance(column.lower(), candidate), candidate))
+                if suggestion and levenshtein_distance(column.lower(), suggestion) > suggestion_max_distance(column):
+                    suggestion = None
+                errors.append({
+                    'type': 'column',
+                    'identifier': f"{value}.{column}",
+                    'table': table,
+                    'suggestion': f"{value}.{column_names[table][suggestion]}" if suggestion else None
+                })
+            continue
+
+        # Colonne non qualifiée: elle doit appartenir à une des tables de la requête
+        name = value.lower()
+        if name in output_aliases or name in aliases:
+            continue
+        owners = compiled_schema['column_owners'].get(name, ())
+        if any(owner in scope_tables for owner in owners) or (owners and not scope_tables):
+            referenced_columns.add(name)
+            continue
+        if has_virtual_tables or (kind == 'quoted' and not owners):
+            continue  # Peut venir d'une sous-requête ou d'un WITH
+        candidates = {candidate: table for table in scope_tables for candidate in column_names[table]}
+        if candidates:
+            suggestion = min(candidates, key=lambda candidate: (levenshtein_distance(name, candidate), candidate))
+            if levenshtein_distance(name, suggestion) > suggestion_max_distance(name):
+                suggestion = None
+            suggestion = column_names[candidates[suggestion]][suggestion] if suggestion else None
+        else:
+            suggestion = find_nearest_identifier(compiled_schema['column_bk_tree'], name, suggestion_max_distance(name))
+        errors.append({
+            'type': 'column',
+            'identifier': value,
+            'table': None,
+            'suggestion': suggestion,
+            # La colonne existe, mais dans une table absente de la requête
+            'found_in': owners[:3] if owners else None
+        })
+
+    return {
+        'valid': not errors,
+        'errors': errors,
+        # Identifiants valides cités (tables du schéma, colonnes en minuscules)
+        'tables': scope_tables,
+        'columns': sorted(referenced_columns),
+        'elapsed_us': round((time.perf_counter() - start) * 1e6, 1)
+    }
+
+# Fonction pour formater les erreurs de validation en commentaires SQL
+def format_validation_warnings(validation):
+    """Retourne les erreurs sous forme de commentaires à placer après la requête (chaîne vide si valide)"""
+    if not validation or validation['valid']:
+        return ""
+    lines = ["\n\n-- Attention: la requête cite des identifiants absents du schéma :"]
+    for error in validation['errors']:
+        label = 'Table inconnue' if error['type'] == 'table' else 'Colonne inconnue'
+        line = f"-- {label}: {error['identifier']}"
+        if error['suggestion']:
+            line += f" (vouliez-vous dire {error['suggestion']} ?)"
+        elif error.get('found_in'):
+            line += f" (présente dans: {', '.join(error['found_in'])})"
+        lines.append(line)
+    return "\n".join(lines)
+
+# Fonction pour lire les options de génération des candidates d'une requête
+def parse_candidate_options(data):
+    """Retourne (nombre de candidates, budget en ms) demandés par le client, bornés par les maximums"""
+    def bounded(name, default, maximum):
+        try:
+            value = int(data.get(name, default))
+        except (TypeError, ValueError):
+            value = default
+        return min(max(value, 1), maximum)
+
+    return (bounded('candidates', SQL_CANDIDATES_DEFAULT, SQL_CANDIDATES_MAX),
+            bounded('candidate_budget_ms', SQL_CANDIDATE_BUDGET_MS, SQL_CANDIDATE_BUDGET_MAX_MS))
+
+# Fonction pour extraire les requêtes générées d'une réponse du modèle texte → SQL
+def extract_generated_queries(result):
+    """Retourne les textes générés distincts, dans l'ordre du modèle (listes imbriquées acceptées)"""
+    if isinstance(result, list) and len(result) == 1 and isinstance(result[0], list):
+        result = result[0]
+    if not isinstance(result, list):
+        return [str(result)] if result else []
+
+    queries = []
+    for item in result:
+        text = item.get('generated_text', item.get('text')) if isinstance(item, dict) else item
+        if isinstance(text, str) and text.strip() and text.strip() not in queries:
+            queries.append(text.strip())
+    return queries
+
+# Bases SQLite vides propres à chaque thread, utilisées pour EXPLAIN QUERY PLAN
+explain_databases = threading.local()
+
+# Fonction pour obtenir la base vide d'un schéma dans le thread courant
+def get_explain_database(compiled_schema):
+    """Retourne une connexion SQLite en mémoire contenant les tables (vides) du schéma"""
+    ddl = build_sandbox_ddl(compiled_schema['schema'])
+    # Les schémas extraits du texte n'ont pas d'identifiant: leur DDL sert de clé
+    key = compiled_schema['schema_id'] or "\n".join(ddl)
+
+    cache = getattr(explain_databases, 'value', None)
+    if cache is None:
+        cache = explain_databases.value = OrderedDict()
+
+    db = cache.get(key)
+    if db is None:
+        db = sqlite3.connect(':memory:')
+        for statement in ddl:
+            db.execute(statement)
+        cache[key] = db
+        if len(cache) > SQL_EXPLAIN_CACHE_SIZE:
+            cache.popitem(last=False)[1].close()
+    else:
+        cache.move_to_end(key)
+    return db
+
+# Fonction pour estimer le coût d'une requête à partir de son plan d'exécution SQLite
+def explain_sql_cost(query, compiled_schema):
+    """Retourne (coût estimé, erreur) d'après EXPLAIN QUERY PLAN de la première instruction"""
+    statements = [statement.strip().rstrip(';') for statement in sqlparse.split(query)]
+    statements = [statement for statement in statements if statement]
+    if not statements:
+        return None, "Requête vide"
+
+    try:
+        plan = get_explain_database(compiled_schema).execute(f"EXPLAIN QUERY PLAN {statements[0]}").fetchall()
+    except sqlite3.Error as e:
+        return None, str(e)
+
+    cost = 0
+    for row in plan:
+        detail = row[-1].upper()
+        cost += sum(weight for operation, weight in SQL_PLAN_COSTS.items() if operation in detail)
+    return cost, None
+
+# Fonction pour mesurer la part des mots de la question couverts par une requête
+def compute_schema_coverage(question_words, validation, compiled_schema):
+    """Retourne la part des mots de la question présents dans le schéma que la requête cite (0 à 1)"""
+    schema_words = question_words & compiled_schema['link_index']['idf'].keys()
+    if not schema_words:
+        return 1.0
+
+    cited_words = set()
+    for identifier in validation['tables'] + validation['columns']:
+        cited_words.update(split_identifier_words(identifier))
+    return round(len(schema_words & cited_words) / len(schema_words), 3)
+
+# Fonction pour vérifier une requête candidate
+def check_sql_candidate(index, query, compiled_schema, question_words):
+    """Valide la candidate contre le schéma, puis l'analyse avec EXPLAIN QUERY PLAN"""
+    validation = validate_generated_sql(query, compiled_schema)
+    cost, explain_error = explain_sql_cost(query, compiled_schema)
+    return {
+        'rank': index,  # Position dans la sortie du modèle
+        'query': query,
+        'check': 'verified',  # verified, failed (erreur pendant la vérification) ou timeout (budget dépassé)
+        'valid': validation['valid'],
+        'explain_ok': explain_error is None,
+        'explain_error': explain_error,
+        'coverage': compute_schema_coverage(question_words, validation, compiled_schema),
+        'cost': cost,
+        'validation': validation
+    }
+
+# Pool de threads dédié aux vérifications (les étapes du pipeline attendent sur celui-ci)
+candidate_executor = ThreadPoolExecutor(max_workers=SQL_CANDIDATES_MAX, thread_name_prefix='candidates')
+
+# Fonction pour départager les requêtes candidates
+def rank_sql_candidates(queries, compiled_schema, question, budget):
+    """Vérifie les candidates en parallèle et les retourne de la meilleure à la moins bonne.
+
+    Ordre: valides pour le schéma et acceptées par SQLite, puis meilleure couverture de la question,
+    puis plus faible coût estimé, puis ordre du modèle. Les candidates dont la vérification a échoué
+    viennent après toutes les candidates vérifiées, puis celles non vérifiées dans le budget (en secondes).
+    """
+    question_words = extract_question_words(question)
+    futures = [candidate_executor.submit(check_sql_candidate, index, query, compiled_schema, question_words)
+               for index, query in enumerate(queries)]
+    wait(futures, timeout=budget)
+
+    checked = []
+    for index, future in enumerate(futures):
+        if future.done() and future.exception() is None:
+            checked.append(future.result())
+            continue
+
+        if future.done():
+            check, error = 'failed', f"Échec de la vérification: {future.exception()}"
+        else:
+            future.cancel()
+            check, error = 'timeout', "Non vérifiée dans le budget de temps"
+        checked.append({'rank': index, 'query': queries[index], 'check': check, 'valid': False,
+                        'explain_ok': False, 'explain_error': error, 'coverage': 0.0, 'cost': None,
+                        'validation': None})
+
+    check_order = {'verified': 0, 'failed': 1, 'timeout': 2}
+    checked.sort(key=lambda candidate: (
+        check_order[candidate['check']],
+        not (candidate['valid'] and candidate['explain_ok']),
+        not candidate['valid'],
+        -candidate['coverage'],
+        candidate['cost'] if candidate['cost'] is not None else float('inf'),
+        candidate['rank']
+    ))
+    return checked
+
+# Fonction pour résumer les candidates pour la réponse JSON
+def summarize_sql_candidates(candidates):
+    """Retourne les candidates classées sans le détail de leur validation (None si une seule candidate)"""
+    if not candidates:
+        return None
+    return [{key: value for key, value in candidate.items() if key != 'validation'} for candidate in candidates]
+
 # Fonction pour comprendre le langage naturel et extraire les intentions
 def understand_natural_language(text, schema_info=None):
     """Comprend le langage naturel et extrait les intentions précises"""
@@ -596,18 +3043,11 @@ def understand_natural_language(text, schema_info=None):
 
         # Ajouter les informations de schéma si disponibles
         if schema_info and schema_info['tables']:
-            prompt += "\n\nSchéma de la base de données:"
-            for table, columns in schema_info['tables'].items():
-                prompt += f"\nTable {table}: "
-                if columns:
-                    prompt += ", ".join(columns)
-                else:
-                    prompt += "id, name"
+            table_lines, relation_lines = get_schema_prompt_lines(schema_info)
+            prompt += "\n\nSchéma de la base de données:\n" + "\n".join(table_lines)
 
-            if schema_info['relations']:
-                prompt += "\n\nRelations:"
-                for relation in schema_info['relations']:
-                    prompt += f"\n{relation['table1']}.{relation['column1']} = {relation['table2']}.{relation['column2']}"
+            if relation_lines:
+                prompt += "\n\nRelations:\n" + "\n".join(relation_lines)
 
         # Ajouter des instructions spécifiques
         prompt += "\n\nReformule cette requête en langage SQL clair, en précisant les tables et colonnes à utiliser, les conditions de jointure, les filtres, etc."
@@ -629,69 +3069,113 @@ def understand_natural_language(text, schema_info=None):
         print(f"Erreur lors de la compréhension du langage naturel: {str(e)}")
         return text
 
+# Intentions candidates pour la classification zero-shot (une seule requête au modèle)
+INTENT_LABELS = [
+    "la sélection de données",
+    "l'insertion de données",
+    "la mise à jour de données",
+    "la suppression de données",
+    "la création de structures de données",
+    "la modification de structures de données",
+    "la suppression de structures de données",
+    "l'agrégation de données",
+    "le filtrage de données",
+    "le tri de données",
+    "la jointure de tables",
+    "des statistiques sur les données"
+]
+INTENT_HYPOTHESIS_TEMPLATE = "Cette requête concerne {}."
+INTENT_CACHE_MAX_ENTRIES = 2048
+
+# Cache des intentions détectées, par texte normalisé
+intent_cache = OrderedDict()
+intent_cache_lock = threading.Lock()
+intent_cache_stats = {'hits': 0, 'misses': 0}
+
+# Fonction pour normaliser un texte avant de l'utiliser comme clé de cache
+def normalize_intent_text(text):
+    """Normalise la casse et les espaces pour que des requêtes équivalentes partagent la même entrée"""
+    return re.sub(r'\s+', ' ', text.strip().lower())
+
+# Fonction pour détecter l'intention principale d'une requête
+def detect_user_intent(text):
+    """Détermine l'intention principale de la requête par classification zero-shot (intention, score)"""
+    cache_key = normalize_intent_text(text)
+
+    with intent_cache_lock:
+        if cache_key in intent_cache:
+            intent_cache.move_to_end(cache_key)
+            intent_cache_stats['hits'] += 1
+            record_pipeline_cache_lookup(True)
+            return intent_cache[cache_key]
+        intent_cache_stats['misses'] += 1
+        record_pipeline_cache_lookup(False)
+
+    # Un seul appel: le modèle encode la requête une fois et score toutes les intentions candidates
+    result = query_huggingface_api(UNDERSTANDING_MODEL, text, parameters={
+        "candidate_labels": INTENT_LABELS,
+        "hypothesis_template": INTENT_HYPOTHESIS_TEMPLATE,
+        "multi_label": False
+    })
+
+    # Réponse attendue: {"sequence": ..., "labels": [...], "scores": [...]} triés par score décroissant
+    if isinstance(result, list) and len(result) > 0:
+        result = result[0]
+
+    if not isinstance(result, dict) or not result.get("labels") or not result.get("scores"):
+        return None, -1
+
+    best_match = INTENT_HYPOTHESIS_TEMPLATE.format(result["labels"][0])
+    best_score = result["scores"][0]
+
+    with intent_cache_lock:
+        intent_cache[cache_key] = (best_match, best_score)
+        while len(intent_cache) > INTENT_CACHE_MAX_ENTRIES:
+            intent_cache.popitem(last=False)
+
+    return best_match, best_score
+
 # Fonction pour comprendre et reformuler les requêtes utilisateur
-def understand_user_intent(text):
+def understand_user_intent(text, pipeline=None):
     """Analyse et reformule la requête utilisateur pour mieux comprendre ses intentions"""
     try:
-        # Étape 1: Extraire les informations de schéma du texte
-        schema_info = extract_schema_from_text(text)
-        print(f"Schéma extrait: {len(schema_info['tables'])} tables, {len(schema_info['relations'])} relations")
+        # Étape 1: Extraire les informations de schéma du texte, puis ne garder que les tables liées à la question
+        extracted_schema_info = run_pipeline_stage(
+            pipeline, 'extracted_schema', lambda: extract_schema_from_text(text))
+        print(f"Schéma extrait: {len(extracted_schema_info['tables'])} tables, "
+              f"{len(extracted_schema_info['relations'])} relations")
+        compiled_schema = pipeline['compiled_schema'] if pipeline is not None else get_active_compiled_schema()
+        schema_info = run_pipeline_stage(
+            pipeline, 'linked_schema', lambda: select_prompt_schema(text, compiled_schema, extracted_schema_info))
 
         # Étape 2: Utiliser le modèle de compréhension du langage naturel avec le schéma
-        nl_understood_text = understand_natural_language(text, schema_info)
+        nl_understood_text = run_pipeline_stage(
+            pipeline, 'nl_understanding', lambda: understand_natural_language(text, schema_info))
         print(f"Texte compris par le modèle de langage: {nl_understood_text}")
 
-        # Étape 3: Utiliser le modèle de compréhension des intentions
-        # Nous envoyons la requête avec des hypothèses pour voir laquelle correspond le mieux
-        hypotheses = [
-            "Cette requête concerne la sélection de données.",
-            "Cette requête concerne l'insertion de données.",
-            "Cette requête concerne la mise à jour de données.",
-            "Cette requête concerne la suppression de données.",
-            "Cette requête concerne la création de structures de données.",
-            "Cette requête concerne la modification de structures de données.",
-            "Cette requête concerne la suppression de structures de données.",
-            "Cette requête concerne l'agrégation de données.",
-            "Cette requête concerne le filtrage de données.",
-            "Cette requête concerne le tri de données.",
-            "Cette requête concerne la jointure de tables.",
-            "Cette requête concerne des statistiques sur les données."
-        ]
-
-        # Préparer les paires pour le modèle NLI (Natural Language Inference)
-        pairs = []
-        for hypothesis in hypotheses:
-            pairs.append({"text": nl_understood_text, "hypothesis": hypothesis})
-
-        # Appeler l'API HuggingFace pour la classification
-        result = query_huggingface_api(UNDERSTANDING_MODEL, pairs)
-
-        # Analyser les résultats pour déterminer l'intention principale
-        if result:
-            # Trouver l'hypothèse avec le score d'entailment le plus élevé
-            best_match = None
-            best_score = -1
-
-            for i, item in enumerate(result):
-                if isinstance(item, dict) and "entailment" in item:
-                    entailment_score = item["entailment"]
-                    if entailment_score > best_score:
-                        best_score = entailment_score
-                        best_match = hypotheses[i]
-
-            if best_match:
-                print(f"Intention détectée: {best_match} (score: {best_score})")
-
-                # Étape 4: Reformuler la requête en fonction de l'intention détectée et du schéma
-                reformulated_text = reformulate_query_with_schema(nl_understood_text, best_match, schema_info)
-                return reformulated_text
-
-        # Si aucune intention claire n'est détectée, utiliser directement le texte compris par le modèle de langage
-        return nl_understood_text
+        # Étape 3: Utiliser le modèle de compréhension des intentions sur la requête d'origine
+        # (indépendant des étapes 1 et 2, il peut donc être calculé en parallèle)
+        intent = run_pipeline_stage(pipeline, 'intent', lambda: detect_user_intent(text))
+
+        # Étape 4: Reformuler la requête en fonction de l'intention détectée et du schéma
+        return run_pipeline_stage(
+            pipeline, 'reformulation', lambda: reformulate_understood_text(nl_understood_text, intent, schema_info))
     except Exception as e:
         print(f"Erreur lors de l'analyse des intentions: {str(e)}")
         return text
 
+# Fonction pour reformuler le texte compris selon l'intention détectée
+def reformulate_understood_text(nl_understood_text, intent, schema_info):
+    """Reformule le texte compris si une intention a été détectée, sinon le retourne tel quel"""
+    best_match, best_score = intent
+
+    if best_match:
+        print(f"Intention détectée: {best_match} (score: {best_score})")
+        return reformulate_query_with_schema(nl_understood_text, best_match, schema_info)
+
+    # Si aucune intention claire n'est détectée, utiliser directement le texte compris par le modèle de langage
+    return nl_understood_text
+
 # Fonction pour reformuler la requête en fonction de l'intention détectée et du schéma
 def reformulate_query_with_schema(text, intention, schema_info):
     """Reformule la requête en fonction de l'intention détectée et du schéma de la base de données"""
@@ -701,19 +3185,11 @@ def reformulate_query_with_schema(text, intention, schema_info):
 
         # Ajouter les informations de schéma
         if schema_info and schema_info['tables']:
-            prompt += "\nSchéma de la base de données:\n"
-            for table, columns in schema_info['tables'].items():
-                prompt += f"Table {table}: "
-                if columns:
-                    prompt += ", ".join(columns)
-                else:
-                    prompt += "id, name"
-                prompt += "\n"
+            table_lines, relation_lines = get_schema_prompt_lines(schema_info)
+            prompt += "\nSchéma de la base de données:\n" + "".join(line + "\n" for line in table_lines)
 
-            if schema_info['relations']:
-                prompt += "\nRelations:\n"
-                for relation in schema_info['relations']:
-                    prompt += f"{relation['table1']}.{relation['column1']} = {relation['table2']}.{relation['column2']}\n"
+            if relation_lines:
+                prompt += "\nRelations:\n" + "".join(line + "\n" for line in relation_lines)
 
         prompt += "\nReformulation claire et précise pour générer une requête SQL avec les tables et colonnes spécifiées:"
 
@@ -801,7 +3277,7 @@ def translate_fr_to_en(text):
     """Traduit un texte du français vers l'anglais en utilisant l'API HuggingFace"""
     try:
         # Utiliser l'API HuggingFace pour la traduction
-        result = query_huggingface_api(TRANSLATION_MODEL, text)
+        result = query_model_batched(TRANSLATION_MODEL, text)
 
         if result:
             # Extraire le texte traduit
@@ -819,182 +3295,569 @@ def translate_fr_to_en(text):
         print(f"Erreur lors de la traduction: {str(e)}")
         return fallback_translate_fr_to_en(text)
 
+# Dictionnaire de traduction de secours pour les mots-clés SQL courants
+FALLBACK_TRANSLATIONS = {
+    # Mots-clés de requête
+    "sélectionner": "select",
+    "sélectionne": "select",
+    "afficher": "select",
+    "affiche": "select",
+    "montrer": "select",
+    "montre": "select",
+    "lister": "select",
+    "liste": "select",
+    "obtenir": "select",
+    "obtiens": "select",
+    "récupérer": "select",
+    "récupère": "select",
+    "chercher": "select",
+    "cherche": "select",
+    "trouver": "select",
+    "trouve": "select",
+
+    "insérer": "insert",
+    "insère": "insert",
+    "ajouter": "insert",
+    "ajoute": "insert",
+    "créer une ligne": "insert",
+    "crée une ligne": "insert",
+
+    "mettre à jour": "update",
+    "mets à jour": "update",
+    "modifier": "update",
+    "modifie": "update",
+    "changer": "update",
+    "change": "update",
+    "actualiser": "update",
+    "actualise": "update",
+
+    "supprimer": "delete",
+    "supprime": "delete",
+    "effacer": "delete",
+    "efface": "delete",
+    "enlever": "delete",
+    "enlève": "delete",
+    "retirer": "delete",
+    "retire": "delete",
+
+    "créer": "create",
+    "crée": "create",
+    "nouvelle table": "create table",
+    "nouveau schéma": "create schema",
+
+    # Clauses SQL
+    "où": "where",
+    "quand": "when",
+    "groupe par": "group by",
+    "grouper par": "group by",
+    "ordonner par": "order by",
+    "trier par": "order by",
+    "limiter à": "limit",
+    "limite": "limit",
+    "joindre": "join",
+    "jointure": "join",
+    "distinct": "distinct",
+    "unique": "distinct",
+
+    # Tables et champs courants
+    "utilisateurs": "users",
+    "utilisateur": "user",
+    "clients": "customers",
+    "client": "customer",
+    "produits": "products",
+    "produit": "product",
+    "commandes": "orders",
+    "commande": "order",
+    "catégories": "categories",
+    "catégorie": "category",
+
+    # Champs courants
+    "identifiant": "id",
+    "nom": "name",
+    "prénom": "first_name",
+    "nom de famille": "last_name",
+    "email": "email",
+    "courriel": "email",
+    "adresse": "address",
+    "téléphone": "phone",
+    "prix": "price",
+    "quantité": "quantity",
+    "date": "date",
+    "description": "description",
+    "statut": "status",
+    "état": "status",
+
+    # Fonctions d'agrégation
+    "compter": "count",
+    "compte": "count",
+    "somme": "sum",
+    "moyenne": "avg",
+    "minimum": "min",
+    "maximum": "max",
+
+    # Opérateurs
+    "égal à": "equal to",
+    "égale à": "equal to",
+    "égal": "equal",
+    "égale": "equal",
+    "supérieur à": "greater than",
+    "supérieure à": "greater than",
+    "inférieur à": "less than",
+    "inférieure à": "less than",
+    "entre": "between",
+    "comme": "like",
+    "ressemble à": "like",
+    "dans": "in",
+    "est nul": "is null",
+    "n'est pas nul": "is not null",
+
+    # Conjonctions
+    "et": "and",
+    "ou": "or",
+    "non": "not",
+
+    # Prépositions
+    "de": "of",
+    "du": "of the",
+    "des": "of the",
+    "dans": "in",
+    "avec": "with",
+    "sans": "without",
+    "pour": "for",
+    "par": "by",
+
+    # Autres termes utiles
+    "tous": "all",
+    "toutes": "all",
+    "chaque": "each",
+    "plusieurs": "several",
+    "certains": "some",
+    "certaines": "some",
+    "aucun": "none",
+    "aucune": "none",
+    "premier": "first",
+    "première": "first",
+    "dernier": "last",
+    "dernière": "last",
+    "récent": "recent",
+    "récente": "recent",
+    "ancien": "old",
+    "ancienne": "old",
+    "actif": "active",
+    "active": "active",
+    "inactif": "inactive",
+    "inactive": "inactive"
+}
+
+# Fonction pour compiler un ensemble d'expressions en une seule expression régulière
+def build_phrase_pattern(phrases):
+    """Construit une expression régulière en forme d'arbre préfixe (trie) qui reconnaît l'expression
+    la plus longue à chaque début de mot"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = True  # Fin d'une expression
+
+    def node_to_regex(node):
+        alternatives = [re.escape(char) + node_to_regex(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ''
+        is_end = '' in node
+        if len(alternatives) == 1 and not is_end:
+            return alternatives[0]
+        group = '(?:' + '|'.join(alternatives) + ')'
+        # Le quantificateur gourmand essaie d'abord l'expression la plus longue
+        return group + '?' if is_end else group
+
+    # Chaque branche commence par un caractère littéral (le moteur saute directement aux positions
+    # candidates), puis vérifie que ce caractère n'est pas précédé d'une lettre
+    branches = [re.escape(char) + r'(?<!\w.)' + node_to_regex(child) for char, child in sorted(trie.items())]
+    # Groupe capturant: re.split intercale alors chaque expression trouvée entre les segments de texte
+    return re.compile('((?:' + '|'.join(branches) + r')(?!\w))')
+
+# Expression compilée une seule fois au chargement du module
+FALLBACK_TRANSLATION_PATTERN = build_phrase_pattern(FALLBACK_TRANSLATIONS)
+
 # Fonction de traduction de secours basée sur des règles simples
 def fallback_translate_fr_to_en(text):
     """Traduit un texte du français vers l'anglais en utilisant des règles simples"""
-    # Dictionnaire de traduction pour les mots-clés SQL courants
-    translation_dict = {
-        # Mots-clés de requête
-        "sélectionner": "select",
-        "sélectionne": "select",
-        "afficher": "select",
-        "affiche": "select",
-        "montrer": "select",
-        "montre": "select",
-        "lister": "select",
-        "liste": "select",
-        "obtenir": "select",
-        "obtiens": "select",
-        "récupérer": "select",
-        "récupère": "select",
-        "chercher": "select",
-        "cherche": "select",
-        "trouver": "select",
-        "trouve": "select",
-
-        "insérer": "insert",
-        "insère": "insert",
-        "ajouter": "insert",
-        "ajoute": "insert",
-        "créer une ligne": "insert",
-        "crée une ligne": "insert",
-
-        "mettre à jour": "update",
-        "mets à jour": "update",
-        "modifier": "update",
-        "modifie": "update",
-        "changer": "update",
-        "change": "update",
-        "actualiser": "update",
-        "actualise": "update",
-
-        "supprimer": "delete",
-        "supprime": "delete",
-        "effacer": "delete",
-        "efface": "delete",
-        "enlever": "delete",
-        "enlève": "delete",
-        "retirer": "delete",
-        "retire": "delete",
-
-        "créer": "create",
-        "crée": "create",
-        "nouvelle table": "create table",
-        "nouveau schéma": "create schema",
-
-        # Clauses SQL
-        "où": "where",
-        "quand": "when",
-        "groupe par": "group by",
-        "grouper par": "group by",
-        "ordonner par": "order by",
-        "trier par": "order by",
-        "limiter à": "limit",
-        "limite": "limit",
-        "joindre": "join",
-        "jointure": "join",
-        "distinct": "distinct",
-        "unique": "distinct",
-
-        # Tables et champs courants
-        "utilisateurs": "users",
-        "utilisateur": "user",
-        "clients": "customers",
-        "client": "customer",
-        "produits": "products",
-        "produit": "product",
-        "commandes": "orders",
-        "commande": "order",
-        "catégories": "categories",
-        "catégorie": "category",
-
-        # Champs courants
-        "identifiant": "id",
-        "nom": "name",
-        "prénom": "first_name",
-        "nom de famille": "last_name",
-        "email": "email",
-        "courriel": "email",
-        "adresse": "address",
-        "téléphone": "phone",
-        "prix": "price",
-        "quantité": "quantity",
-        "date": "date",
-        "description": "description",
-        "statut": "status",
-        "état": "status",
-
-        # Fonctions d'agrégation
-        "compter": "count",
-        "compte": "count",
-        "somme": "sum",
-        "moyenne": "avg",
-        "minimum": "min",
-        "maximum": "max",
-
-        # Opérateurs
-        "égal à": "equal to",
-        "égale à": "equal to",
-        "égal": "equal",
-        "égale": "equal",
-        "supérieur à": "greater than",
-        "supérieure à": "greater than",
-        "inférieur à": "less than",
-        "inférieure à": "less than",
-        "entre": "between",
-        "comme": "like",
-        "ressemble à": "like",
-        "dans": "in",
-        "est nul": "is null",
-        "n'est pas nul": "is not null",
-
-        # Conjonctions
-        "et": "and",
-        "ou": "or",
-        "non": "not",
-
-        # Prépositions
-        "de": "of",
-        "du": "of the",
-        "des": "of the",
-        "dans": "in",
-        "avec": "with",
-        "sans": "without",
-        "pour": "for",
-        "par": "by",
-
-        # Autres termes utiles
-        "tous": "all",
-        "toutes": "all",
-        "chaque": "each",
-        "plusieurs": "several",
-        "certains": "some",
-        "certaines": "some",
-        "aucun": "none",
-        "aucune": "none",
-        "premier": "first",
-        "première": "first",
-        "dernier": "last",
-        "dernière": "last",
-        "récent": "recent",
-        "récente": "recent",
-        "ancien": "old",
-        "ancienne": "old",
-        "actif": "active",
-        "active": "active",
-        "inactif": "inactive",
-        "inactive": "inactive"
-    }
-
-    # Remplacer les mots-clés français par leurs équivalents anglais
-    translated_text = text.lower()
-    for fr_word, en_word in translation_dict.items():
-        translated_text = translated_text.replace(fr_word, en_word)
+    # Remplacer les mots-clés français par leurs équivalents anglais en un seul passage:
+    # les indices impairs de re.split sont les expressions trouvées, traduites sans rappel Python
+    parts = FALLBACK_TRANSLATION_PATTERN.split(text.lower())
+    parts[1::2] = map(FALLBACK_TRANSLATIONS.__getitem__, parts[1::2])
+    translated_text = ''.join(parts)
 
     # Ajouter un préfixe pour indiquer au modèle qu'il s'agit d'une requête SQL
     translated_text = "Generate SQL query: " + translated_text
 
     return translated_text
 
+# Verrous de l'inférence locale (un chargement à la fois, une génération à la fois par modèle)
+local_models_lock = threading.Lock()
+local_generation_locks = {}
+
+# Fonction pour trouver le dossier local d'un modèle
+def find_local_model_dir(model_path):
+    """Retourne le dossier contenant le modèle (config.json) dans LOCAL_MODELS_DIR, ou None"""
+    candidates = [
+        os.path.join(LOCAL_MODELS_DIR, model_path),
+        os.path.join(LOCAL_MODELS_DIR, model_path.replace('/', '--'))
+    ]
+    for candidate in candidates:
+        if os.path.isfile(os.path.join(candidate, 'config.json')):
+            return candidate
+    return None
+
+# Fonction pour charger un modèle local
 def load_model(model_type):
-    """Vérifie si un modèle est disponible (fonction de compatibilité)"""
-    print(f"Les modèles locaux ne sont pas disponibles. Utilisation de l'API HuggingFace pour {model_type}.")
+    """Charge un modèle seq2seq local sur CPU (quantifié en int8 si configuré), ou None s'il est indisponible"""
+    if model_type in models:
+        return models[model_type]
+
+    if torch is None:
+        print(f"torch/transformers ne sont pas installés. Utilisation de l'API HuggingFace pour {model_type}.")
+        return None
+
+    model_path = LOCAL_MODEL_PATHS.get(model_type)
+    model_dir = find_local_model_dir(model_path) if model_path else None
+    if model_dir is None:
+        print(f"Aucun modèle local trouvé pour {model_type}. Utilisation de l'API HuggingFace.")
+        return None
+
+    with local_models_lock:
+        if model_type in models:
+            return models[model_type]
+
+        try:
+            if LOCAL_MODEL_THREADS:
+                torch.set_num_threads(LOCAL_MODEL_THREADS)
+
+            tokenizer = AutoTokenizer.from_pretrained(model_dir)
+            model = AutoModelForSeq2SeqLM.from_pretrained(model_dir)
+            model.eval()
+
+            if LOCAL_MODEL_QUANTIZE:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+            tokenizers[model_type] = tokenizer
+            models[model_type] = model
+            local_generation_locks[model_type] = threading.Lock()
+
+            # query_huggingface_api consulte ce dictionnaire pour router vers le modèle local
+            pipelines[model_path] = lambda inputs, parameters=None: local_generate(model_type, inputs, parameters)
+
+            print(f"Modèle local chargé pour {model_type} depuis {model_dir}")
+            return model
+        except Exception as e:
+            print(f"Erreur lors du chargement du modèle local {model_type}: {str(e)}")
+            return None
+
+# Fonction pour générer du texte avec un modèle local
+def local_generate(model_type, inputs, parameters=None):
+    """Génère les sorties d'un lot d'entrées en un seul appel à generate (même format que l'API)"""
+    model = models[model_type]
+    tokenizer = tokenizers[model_type]
+    parameters = parameters or {}
+
+    texts = inputs if isinstance(inputs, list) else [inputs]
+
+    generation_options = {
+        'max_new_tokens': parameters.get('max_new_tokens', LOCAL_MAX_NEW_TOKENS)
+    }
+    num_return_sequences = parameters.get('num_return_sequences', 1)
+    if num_return_sequences > 1:
+        generation_options['num_return_sequences'] = num_return_sequences
+        generation_options['num_beams'] = max(parameters.get('num_beams', num_return_sequences), num_return_sequences)
+
+    encoded = tokenizer(texts, return_tensors='pt', padding=True, truncation=True,
+                        max_length=LOCAL_MAX_INPUT_TOKENS)
+
+    with local_generation_locks[model_type], torch.inference_mode():
+        outputs = model.generate(**encoded, **generation_options)
+
+    decoded = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    # L'API retourne "translation_text" pour la traduction et "generated_text" pour les autres modèles
+    output_key = 'translation_text' if model_type == 'translation' else 'generated_text'
+    results = [{output_key: text} for text in decoded]
+
+    if num_return_sequences > 1:
+        # Regrouper les séquences par entrée
+        grouped = [results[i:i + num_return_sequences] for i in range(0, len(results), num_return_sequences)]
+        return grouped if isinstance(inputs, list) else grouped[0]
+
+    return results
+
+# Client HTTP partagé, créé à la première utilisation
+http_client = None
+http_client_lock = threading.Lock()
+
+# Fonction pour obtenir le client HTTP avec pool de connexions
+def get_http_client():
+    """Retourne la session HTTP partagée avec un pool de connexions keep-alive par hôte"""
+    global http_client
+
+    if http_client is None:
+        with http_client_lock:
+            if http_client is None:
+                client = requests.Session()
+
+                # Pool par défaut pour les hôtes non configurés
+                client.mount("https://", HTTPAdapter(pool_maxsize=HTTP_DEFAULT_POOL_SIZE))
+                client.mount("http://", HTTPAdapter(pool_maxsize=HTTP_DEFAULT_POOL_SIZE))
+
+                # Un adaptateur dédié par hôte de modèles, avec sa propre taille de pool
+                for host, pool_size in HTTP_POOL_SIZES.items():
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                    client.mount(f"https://{host}/", adapter)
+                    client.mount(f"http://{host}/", adapter)
+
+                http_client = client
+
+    return http_client
+
+# Fonction pour obtenir les statistiques du pool de connexions
+def get_http_pool_stats():
+    """Retourne, par hôte, le nombre de connexions ouvertes et réutilisées par le client HTTP"""
+    stats = {}
+
+    if http_client is None:
+        return stats
+
+    # Le même adaptateur peut être monté sur plusieurs préfixes
+    adapters = {id(adapter): adapter for adapter in http_client.adapters.values()}
+
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            host_stats = stats.setdefault(host, {
+                'requests': 0,
+                'connections_opened': 0,
+                'connections_reused': 0,
+                'pool_size': pool.pool.maxsize if pool.pool is not None else 0
+            })
+            host_stats['requests'] += pool.num_requests
+            host_stats['connections_opened'] += pool.num_connections
+            host_stats['connections_reused'] += max(pool.num_requests - pool.num_connections, 0)
+
+    return stats
+
+# Cache des réponses: niveau mémoire (LRU) et niveau disque (SQLite, survit aux redémarrages)
+response_cache = OrderedDict()  # clé -> (horodatage, réponse)
+response_cache_lock = threading.Lock()
+response_cache_db = threading.local()  # une connexion SQLite par thread
+response_cache_stats = {
+    'memory_hits': 0,
+    'disk_hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'expirations': 0,
+    'disk_errors': 0
+}
+
+# Fonction pour calculer la clé de cache d'un appel de modèle
+def make_cache_key(model_path, inputs, parameters=None, base_url=None):
+    """Calcule une empreinte SHA-256 du modèle et des entrées envoyées"""
+    key = [model_path, inputs, parameters]
+    # Les réponses d'un autre serveur que l'API publique (serveur local de test) ont leurs propres entrées
+    base_url = (base_url or HUGGINGFACE_API_BASE_URL).rstrip('/')
+    if base_url != HUGGINGFACE_PUBLIC_API_BASE_URL:
+        key.append(base_url)
+    payload = json.dumps(key, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+# Fonction pour ouvrir la base SQLite du cache disque
+def get_response_cache_db():
+    """Ouvre (une fois par thread) la base SQLite qui stocke les réponses sur disque"""
+    db = getattr(response_cache_db, 'db', None)
+    if db is None or getattr(response_cache_db, 'path', None) != HF_CACHE_DB_PATH:
+        if not os.path.exists(CACHE_FOLDER):
+            os.makedirs(CACHE_FOLDER, exist_ok=True)
+        # Connexion propre au thread: en mode WAL les lectures ne se bloquent pas entre elles
+        db = sqlite3.connect(HF_CACHE_DB_PATH, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS hf_responses ("
+            "cache_key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        db.commit()
+        response_cache_db.db = db
+        response_cache_db.path = HF_CACHE_DB_PATH
+
+    return db
+
+# Fonction pour incrémenter un compteur du cache
+def _count_cache_event(name):
+    """Incrémente un compteur de response_cache_stats sous le verrou du cache"""
+    with response_cache_lock:
+        response_cache_stats[name] += 1
+
+# Fonction pour lire une réponse dans le cache
+def get_cached_response(cache_key):
+    """Cherche une réponse en mémoire puis sur disque (None si absente ou expirée)"""
+    now = time.time()
+
+    # Le verrou ne protège que le cache mémoire: la lecture disque se fait sans le tenir
+    with response_cache_lock:
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            created_at, response = entry
+            if now - created_at <= HF_CACHE_TTL:
+                response_cache.move_to_end(cache_key)
+                response_cache_stats['memory_hits'] += 1
+                record_pipeline_cache_lookup(True)
+                return response
+            del response_cache[cache_key]
+            response_cache_stats['expirations'] += 1
+
+    try:
+        db = get_response_cache_db()
+        row = db.execute(
+            "SELECT response, created_at FROM hf_responses WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        if row is not None:
+            if now - row[1] <= HF_CACHE_DISK_TTL:
+                response = json.loads(row[0])
+                with response_cache_lock:
+                    _remember_response(cache_key, response, now)
+                    response_cache_stats['disk_hits'] += 1
+                record_pipeline_cache_lookup(True)
+                return response
+            db.execute(
+                "DELETE FROM hf_responses WHERE cache_key = ? AND created_at = ?", (cache_key, row[1])
+            )
+            db.commit()
+            _count_cache_event('expirations')
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Erreur de lecture du cache disque: {str(e)}")
+        _count_cache_event('disk_errors')
+
+    _count_cache_event('misses')
+    record_pipeline_cache_lookup(False)
     return None
 
+# Fonction pour enregistrer une réponse dans le cache
+def store_cached_response(cache_key, response):
+    """Enregistre une réponse dans les deux niveaux du cache"""
+    now = time.time()
+
+    with response_cache_lock:
+        _remember_response(cache_key, response, now)
+
+    try:
+        db = get_response_cache_db()
+        db.execute(
+            "INSERT OR REPLACE INTO hf_responses (cache_key, response, created_at) VALUES (?, ?, ?)",
+            (cache_key, json.dumps(response, ensure_ascii=False), now)
+        )
+        db.commit()
+    except (sqlite3.Error, OSError) as e:
+        print(f"Erreur d'écriture du cache disque: {str(e)}")
+        _count_cache_event('disk_errors')
+
+def _remember_response(cache_key, response, created_at):
+    """Ajoute une réponse au cache mémoire en évinçant les plus anciennes (verrou déjà pris)"""
+    response_cache[cache_key] = (created_at, response)
+    response_cache.move_to_end(cache_key)
+    while len(response_cache) > HF_CACHE_MAX_ENTRIES:
+        response_cache.popitem(last=False)
+        response_cache_stats['evictions'] += 1
+
+# Fonction pour obtenir les statistiques du cache
+def get_response_cache_stats():
+    """Retourne les compteurs du cache (succès, échecs, évictions) et sa taille en mémoire"""
+    with response_cache_lock:
+        stats = dict(response_cache_stats)
+        stats['memory_entries'] = len(response_cache)
+    return stats
+
+# État du disjoncteur de chaque modèle
+circuit_breakers = {}  # modèle -> {'state', 'failures', 'opened_at', 'trips'}
+circuit_breakers_lock = threading.Lock()
+
+# Fonction pour vérifier si le disjoncteur d'un modèle laisse passer un appel
+def circuit_allows_call(model_path):
+    """Retourne False si le circuit du modèle est ouvert (les appelants utilisent alors leur secours)"""
+    with circuit_breakers_lock:
+        breaker = circuit_breakers.get(model_path)
+        if breaker is None or breaker['state'] == 'closed':
+            return True
+
+        # Laisser passer un seul appel d'essai; si son résultat n'est jamais enregistré (appelant
+        # interrompu), un nouvel essai est permis après un nouveau délai
+        if time.monotonic() - breaker['opened_at'] >= CIRCUIT_BREAKER_RESET_TIMEOUT:
+            breaker['state'] = 'half_open'
+            breaker['opened_at'] = time.monotonic()
+            return True
+
+        return False
+
+# Fonction pour enregistrer le résultat d'un appel dans le disjoncteur
+def record_circuit_result(model_path, success):
+    """Referme le circuit après un succès, l'ouvre après trop d'échecs consécutifs"""
+    with circuit_breakers_lock:
+        breaker = circuit_breakers.setdefault(model_path, {
+            'state': 'closed', 'failures': 0, 'opened_at': 0, 'trips': 0
+        })
+
+        if success:
+            breaker['state'] = 'closed'
+            breaker['failures'] = 0
+            return
+
+        breaker['failures'] += 1
+        if breaker['state'] == 'half_open' or breaker['failures'] >= CIRCUIT_BREAKER_FAILURE_THRESHOLD:
+            if breaker['state'] != 'open':
+                breaker['trips'] += 1
+                print(f"Disjoncteur ouvert pour {model_path} après {breaker['failures']} échecs")
+            breaker['state'] = 'open'
+            breaker['opened_at'] = time.monotonic()
+
+# Fonction pour obtenir l'état des disjoncteurs
+def get_circuit_breaker_stats():
+    """Retourne l'état, le nombre d'échecs consécutifs et d'ouvertures de chaque disjoncteur"""
+    with circuit_breakers_lock:
+        return {model_path: {
+            'state': breaker['state'],
+            'failures': breaker['failures'],
+            'trips': breaker['trips']
+        } for model_path, breaker in circuit_breakers.items()}
+
+# Fonction pour calculer le délai avant une nouvelle tentative
+def compute_retry_delay(attempt, policy=None):
+    """Délai exponentiel avec une part aléatoire pour la tentative numéro attempt (0 = première)"""
+    policy = policy or HF_RETRY_POLICY
+    delay = min(policy['max_delay'], policy['base_delay'] * (2 ** attempt))
+    return delay * (1 - policy['jitter'] * random.random())
+
 # Fonction pour utiliser l'API HuggingFace si le modèle local n'est pas disponible
-def query_huggingface_api(model_path, inputs, api_key=None):
-    """Interroge l'API HuggingFace pour obtenir des prédictions"""
-    api_url = f"https://api-inference.huggingface.co/models/{model_path}"
+def query_huggingface_api(model_path, inputs, api_key=None, parameters=None, use_local_cache=True, base_url=None):
+    """Interroge l'API HuggingFace pour obtenir des prédictions (base_url remplace HUGGINGFACE_API_BASE_URL)"""
+    # Une requête identique déjà servie ne repasse pas par le réseau
+    cache_key = make_cache_key(model_path, inputs, parameters, base_url)
+    if use_local_cache:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            return cached
+
+    # Modèle chargé localement: pas d'aller-retour réseau
+    if model_path in pipelines:
+        try:
+            result = pipelines[model_path](inputs, parameters)
+            if use_local_cache:
+                store_cached_response(cache_key, result)
+            return result
+        except Exception as e:
+            print(f"Erreur de l'inférence locale pour {model_path}, utilisation de l'API: {str(e)}")
+
+    api_url = f"{(base_url or HUGGINGFACE_API_BASE_URL).rstrip('/')}/models/{model_path}"
 
     headers = {
         "Content-Type": "application/json"
@@ -1015,48 +3878,361 @@ def query_huggingface_api(model_path, inputs, api_key=None):
         }
     }
 
-    try:
-        response = requests.post(api_url, headers=headers, json=data)
+    if parameters:
+        data["parameters"] = parameters
+
+    # Circuit ouvert: ne pas attendre un modèle qui échoue, l'appelant utilise sa solution de secours
+    if not circuit_allows_call(model_path):
+        print(f"Disjoncteur ouvert pour {model_path}, utilisation de la solution de secours")
+        return None
+
+    policy = HF_RETRY_POLICY
+    deadline = get_request_deadline()
+    # Seules les vraies défaillances du modèle (erreur réseau, statut à réessayer) comptent pour le disjoncteur;
+    # un budget de temps épuisé par la requête appelante n'en est pas une
+    model_failed = False
+
+    for attempt in range(policy['max_attempts']):
+        # Ne jamais dépasser le budget de temps de la requête en cours
+        read_timeout = HTTP_READ_TIMEOUT
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Budget de temps épuisé avant l'appel à {model_path}")
+                break
+            read_timeout = min(read_timeout, remaining)
+
+        retry_after = None
+        try:
+            response = get_http_client().post(
+                api_url, headers=headers, json=data,
+                timeout=(HTTP_CONNECT_TIMEOUT, read_timeout)
+            )
+
+            if response.status_code == 200:
+                result = response.json()
+                record_circuit_result(model_path, True)
+                if use_local_cache:
+                    store_cached_response(cache_key, result)
+                return result
 
-        if response.status_code == 200:
-            return response.json()
-        else:
             print(f"Erreur API HuggingFace: {response.status_code}, {response.text}")
 
-            # Si l'erreur est due à un modèle en cours de chargement, attendre et réessayer
+            # Les erreurs de la requête elle-même (400, 401, 404...) ne se corrigent pas en réessayant;
+            # le modèle a répondu, le disjoncteur est donc refermé
+            if response.status_code not in policy['retry_statuses']:
+                record_circuit_result(model_path, True)
+                return None
+
+            # Si le modèle est en cours de chargement, l'API indique le temps restant estimé
             if response.status_code == 503 and "loading" in response.text.lower():
-                print("Le modèle est en cours de chargement, attente de 10 secondes...")
-                import time
-                time.sleep(10)
-                return query_huggingface_api(model_path, inputs, api_key)
+                try:
+                    retry_after = float(response.json().get("estimated_time", 0))
+                except (ValueError, AttributeError):
+                    retry_after = None
+            model_failed = True
+        except requests.Timeout as e:
+            print(f"Délai dépassé pour l'API HuggingFace: {str(e)}")
+            # Délai réduit au budget restant de la requête: le modèle n'est pas en cause
+            if isinstance(e, requests.ConnectTimeout) or read_timeout >= HTTP_READ_TIMEOUT:
+                model_failed = True
+        except (requests.RequestException, ValueError) as e:
+            print(f"Erreur lors de la requête à l'API HuggingFace: {str(e)}")
+            model_failed = True
+
+        if attempt + 1 >= policy['max_attempts']:
+            break
+
+        delay = compute_retry_delay(attempt, policy)
+        if retry_after:
+            delay = max(delay, min(retry_after, policy['max_delay']))
+
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            print(f"Pas de nouvelle tentative pour {model_path}: budget de temps insuffisant")
+            break
+
+        print(f"Nouvelle tentative pour {model_path} dans {delay:.1f} secondes ({attempt + 2}/{policy['max_attempts']})")
+        time.sleep(delay)
+
+    if model_failed:
+        record_circuit_result(model_path, False)
+    return None
 
-            return None
-    except Exception as e:
-        print(f"Erreur lors de la requête à l'API HuggingFace: {str(e)}")
+# Files d'attente de micro-batching, une par modèle
+micro_batchers = {}  # modèle -> {'queue', 'thread', 'stats', 'stats_lock'}
+micro_batchers_lock = threading.Lock()
+
+# Fonction pour obtenir (ou démarrer) le micro-batcher d'un modèle
+def get_micro_batcher(model_path):
+    """Retourne la file d'attente du modèle et démarre son thread de regroupement si nécessaire"""
+    with micro_batchers_lock:
+        batcher = micro_batchers.get(model_path)
+        if batcher is None:
+            batcher = {
+                'queue': queue.Queue(maxsize=MICRO_BATCH_MAX_QUEUE_DEPTH),
+                'stats': {
+                    'batches': 0,
+                    'items': 0,
+                    'largest_batch': 0,
+                    'overflows': 0,
+                    'in_flight': 0,  # Lots envoyés dont la réponse est attendue
+                    'total_wait_ms': 0.0
+                },
+                # Compteurs modifiés par les appelants, le thread de regroupement et micro_batch_executor
+                'stats_lock': threading.Lock()
+            }
+            batcher['thread'] = threading.Thread(
+                target=_run_micro_batcher, args=(model_path, batcher),
+                name=f"micro-batch-{model_path}", daemon=True
+            )
+            micro_batchers[model_path] = batcher
+            batcher['thread'].start()
+        return batcher
+
+# Fonction pour interroger un modèle en regroupant les appels concurrents
+def query_model_batched(model_path, text_input, parameters=None):
+    """Envoie une entrée au modèle via son micro-batcher et retourne la réponse propre à cette entrée
+    (les N séquences de l'entrée si parameters demande num_return_sequences)"""
+    if model_path not in MICRO_BATCH_MODELS or not isinstance(text_input, str):
+        return query_huggingface_api(model_path, text_input, parameters=parameters)
+
+    # Chaque entrée garde sa propre entrée de cache, indépendamment du lot dans lequel elle est passée
+    cache_key = make_cache_key(model_path, text_input, parameters)
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        return cached
+
+    batcher = get_micro_batcher(model_path)
+    item = {
+        'input': text_input,
+        'parameters': parameters,
+        'cache_key': cache_key,
+        'future': Future(),
+        'deadline': get_request_deadline(),
+        'enqueued_at': time.perf_counter()
+    }
+
+    try:
+        batcher['queue'].put_nowait(item)
+    except queue.Full:
+        # File pleine: ne pas ajouter d'attente, envoyer l'entrée seule
+        with batcher['stats_lock']:
+            batcher['stats']['overflows'] += 1
+        return query_huggingface_api(model_path, text_input, parameters=parameters)
+
+    # Attente bornée même hors d'un pipeline (traitement par lots): un lot perdu ne bloque jamais l'appelant
+    timeout = MICRO_BATCH_RESULT_TIMEOUT
+    if item['deadline'] is not None:
+        timeout = max(item['deadline'] - time.monotonic(), 0)
+
+    try:
+        return item['future'].result(timeout=timeout)
+    except FutureTimeoutError:
+        print(f"Budget de temps épuisé en attendant le lot de {model_path}")
         return None
 
+# Pool qui envoie les lots formés: le thread de regroupement n'attend jamais la réponse d'un modèle
+micro_batch_executor = ThreadPoolExecutor(max_workers=MICRO_BATCH_DISPATCH_WORKERS, thread_name_prefix='micro-batch-call')
+
+# Fonction exécutée par le thread de micro-batching d'un modèle
+def _run_micro_batcher(model_path, batcher):
+    """Collecte les entrées pendant MICRO_BATCH_MAX_WAIT_MS (ou jusqu'à MICRO_BATCH_MAX_SIZE) et confie chaque lot
+    à micro_batch_executor, sans attendre sa réponse avant de former le lot suivant"""
+    pending = batcher['queue']
+    stats = batcher['stats']
+
+    while True:
+        batch = [pending.get()]
+        collect_until = time.monotonic() + MICRO_BATCH_MAX_WAIT_MS / 1000
+
+        while len(batch) < MICRO_BATCH_MAX_SIZE:
+            remaining = collect_until - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        # Les entrées dont l'échéance est dépassée ne sont pas envoyées: leur appelant a déjà abandonné
+        now = time.monotonic()
+        expired = [item for item in batch if item['deadline'] is not None and item['deadline'] <= now]
+        for item in expired:
+            item['future'].set_result(None)
+
+        # Un appel n'accepte qu'un jeu de paramètres de génération: un lot par jeu de paramètres
+        groups = {}
+        for item in batch:
+            if item['deadline'] is None or item['deadline'] > now:
+                groups.setdefault(json.dumps(item['parameters'], sort_keys=True), []).append(item)
+
+        dispatched_at = time.perf_counter()
+        with batcher['stats_lock']:
+            stats['items'] += len(batch)
+            stats['total_wait_ms'] += sum((dispatched_at - item['enqueued_at']) * 1000 for item in batch)
+            for group in groups.values():
+                stats['batches'] += 1
+                stats['largest_batch'] = max(stats['largest_batch'], len(group))
+                stats['in_flight'] += 1
+        for group in groups.values():
+            try:
+                micro_batch_executor.submit(_dispatch_micro_batch, model_path, group, batcher)
+            except RuntimeError as e:
+                # Pool arrêté (fin du processus): répondre aux appelants plutôt que les laisser attendre
+                print(f"Lot non envoyé à {model_path}: {str(e)}")
+                with batcher['stats_lock']:
+                    stats['in_flight'] -= 1
+                for item in group:
+                    item['future'].set_result(None)
+
+# Fonction pour envoyer un lot d'entrées au modèle et répondre à chaque appelant
+def _dispatch_micro_batch(model_path, batch, batcher):
+    """Envoie le lot en un appel (nouvelles tentatives comprises) et résout le Future de chaque entrée"""
+    try:
+        # Les entrées identiques du lot ne sont envoyées qu'une fois
+        unique_inputs = list(dict.fromkeys(item['input'] for item in batch))
+        # Toutes les entrées du lot partagent les mêmes paramètres de génération
+        parameters = batch[0]['parameters']
+        sequences = (parameters or {}).get('num_return_sequences', 1)
+
+        # L'appel groupé dure tant qu'une requête du lot l'attend encore: échéance la plus lointaine, aucune si
+        # une entrée n'en a pas. Chaque appelant cesse d'attendre à sa propre échéance (query_model_batched)
+        deadlines = [item['deadline'] for item in batch]
+        current_pipeline.value = {'deadline': max(deadlines)} if None not in deadlines else None
+
+        try:
+            if len(unique_inputs) == 1:
+                responses = [query_huggingface_api(model_path, unique_inputs[0], parameters=parameters,
+                                                   use_local_cache=False)]
+            else:
+                result = query_huggingface_api(model_path, unique_inputs, parameters=parameters,
+                                               use_local_cache=False)
+                responses = split_batched_response(result, len(unique_inputs), sequences)
+        except Exception as e:
+            print(f"Erreur lors de l'appel groupé à {model_path}: {str(e)}")
+            responses = [None] * len(unique_inputs)
+        finally:
+            current_pipeline.value = None
+
+        # Répondre d'abord aux appelants, puis mettre les réponses en cache
+        by_input = dict(zip(unique_inputs, responses))
+        for item in batch:
+            item['future'].set_result(by_input.get(item['input']))
+        for item in batch:
+            if by_input.get(item['input']):
+                store_cached_response(item['cache_key'], by_input[item['input']])
+    except Exception as e:
+        print(f"Erreur lors de la distribution du lot de {model_path}: {str(e)}")
+    finally:
+        # Aucun appelant ne reste sans réponse, quelle que soit l'erreur rencontrée
+        for item in batch:
+            if not item['future'].done():
+                item['future'].set_result(None)
+        with batcher['stats_lock']:
+            batcher['stats']['in_flight'] -= 1
+
+# Fonction pour découper la réponse d'un appel groupé
+def split_batched_response(result, expected_count, sequences=1):
+    """Retourne une réponse par entrée, au même format qu'un appel avec une seule entrée"""
+    if not isinstance(result, list):
+        return [None] * expected_count
+    # Avec num_return_sequences, certains serveurs retournent les séquences de toutes les entrées à plat
+    if sequences > 1 and len(result) == expected_count * sequences and all(isinstance(item, dict) for item in result):
+        return [result[i:i + sequences] for i in range(0, len(result), sequences)]
+    if len(result) != expected_count:
+        return [None] * expected_count
+    return [item if isinstance(item, list) else [item] for item in result]
+
+# Fonction pour obtenir les statistiques du micro-batching
+def get_micro_batching_stats():
+    """Retourne, par modèle, la profondeur de file, le nombre de lots et leur taille moyenne"""
+    stats = {
+        'config': {
+            'max_wait_ms': MICRO_BATCH_MAX_WAIT_MS,
+            'max_batch_size': MICRO_BATCH_MAX_SIZE,
+            'max_queue_depth': MICRO_BATCH_MAX_QUEUE_DEPTH,
+            'dispatch_workers': MICRO_BATCH_DISPATCH_WORKERS
+        },
+        'models': {}
+    }
+    with micro_batchers_lock:
+        for model_path, batcher in micro_batchers.items():
+            with batcher['stats_lock']:
+                model_stats = dict(batcher['stats'])
+            model_stats['queue_depth'] = batcher['queue'].qsize()
+            batches = model_stats['batches']
+            model_stats['average_batch_size'] = round(model_stats['items'] / batches, 2) if batches else 0
+            model_stats['average_wait_ms'] = round(model_stats.pop('total_wait_ms') / model_stats['items'], 2) \
+                if model_stats['items'] else 0
+            stats['models'][model_path] = model_stats
+    return stats
+
+# Fonction pour construire le graphe des étapes du pipeline /process
+def build_sql_pipeline_stages(pipeline):
+    """Déclare chaque étape avec ses vraies dépendances de données pour run_pipeline_dag"""
+    text = pipeline['text']
+    stages = pipeline['stages']
+
+    return {
+        'extracted_schema': ([], lambda: extract_schema_from_text(text)),
+        'linked_schema': (['extracted_schema'], lambda: select_prompt_schema(
+            text, pipeline['compiled_schema'], stages['extracted_schema'])),
+        'intent': ([], lambda: detect_user_intent(text)),
+        'nl_understanding': (['linked_schema'],
+                             lambda: understand_natural_language(text, stages['linked_schema'])),
+        'reformulation': (['nl_understanding', 'intent', 'linked_schema'],
+                          lambda: reformulate_understood_text(
+                              stages['nl_understanding'], stages['intent'], stages['linked_schema'])),
+        'translation': (['reformulation'], lambda: translate_fr_to_en(stages['reformulation'])),
+        'sql': (['translation', 'linked_schema'], lambda: _generate_sql_query(text, pipeline))
+    }
+
 # Fonction pour générer une requête SQL à partir d'une description en langage naturel
-def generate_sql_query(description):
+def generate_sql_query(description, pipeline=None):
     """Génère une requête SQL à partir d'une description en langage naturel en utilisant un modèle pré-entraîné"""
-    # Vérifier si un schéma personnalisé est disponible en session
-    custom_schema = session.get('custom_schema', None)
+    # Le résultat complet est mémoïsé pour ne jamais relancer la génération dans la même requête
+    return run_pipeline_stage(pipeline, 'sql', lambda: _generate_sql_query(description, pipeline))
+
+def _generate_sql_query(description, pipeline):
+    """Enchaîne les étapes du pipeline (schéma, intention, traduction) puis appelle le modèle texte → SQL"""
+    # Vérifier si un schéma personnalisé est disponible (capturé dans le contexte ou en session)
+    if pipeline is not None:
+        compiled_schema = pipeline['compiled_schema']
+    else:
+        compiled_schema = get_active_compiled_schema()
+    custom_schema = compiled_schema['schema'] if compiled_schema else None
 
     # Extraire le schéma de la base de données à partir du texte
-    extracted_schema_info = extract_schema_from_text(description)
+    extracted_schema_info = run_pipeline_stage(
+        pipeline, 'extracted_schema', lambda: extract_schema_from_text(description))
 
     # Déterminer quel schéma utiliser (priorité: schéma personnalisé > schéma extrait > schéma par défaut)
     if custom_schema and custom_schema.get('schema_sql'):
-        schema = custom_schema['schema_sql']
-        print(f"Utilisation du schéma personnalisé importé: {len(custom_schema['tables'])} tables")
-        # Fusionner les relations extraites du texte avec le schéma personnalisé
-        if extracted_schema_info['relations']:
-            for relation in extracted_schema_info['relations']:
-                if relation not in custom_schema['relations']:
-                    custom_schema['relations'].append(relation)
-            print(f"Ajout de {len(extracted_schema_info['relations'])} relations extraites du texte")
+        # Seules les tables liées à la question (et leurs voisines par clé étrangère) vont dans le prompt
+        linked_schema_info = run_pipeline_stage(
+            pipeline, 'linked_schema',
+            lambda: select_prompt_schema(description, compiled_schema, extracted_schema_info))
+        schema = linked_schema_info['schema_sql']
+        print(f"Utilisation du schéma personnalisé importé: "
+              f"{len(linked_schema_info['tables'])}/{len(custom_schema['tables'])} tables")
+        # Ajouter au prompt les relations extraites du texte entre tables liées
+        # (sans modifier le schéma partagé, gardé en mémoire pour les autres requêtes)
+        # Les relations extraites du texte sont en minuscules
+        def relation_key(relation):
+            return tuple(str(relation.get(field, '')).lower() for field in ('table1', 'column1', 'table2', 'column2'))
+        known_relations = {relation_key(relation) for relation in custom_schema['relations']}
+        linked_tables = {table.lower() for table in linked_schema_info['tables']}
+        extra_relations = [relation for relation in extracted_schema_info['relations']
+                           if relation_key(relation) not in known_relations
+                           and relation['table1'] in linked_tables and relation['table2'] in linked_tables]
+        if extra_relations:
+            schema += "".join(build_relation_sql(relation) for relation in extra_relations)
+            print(f"Ajout de {len(extra_relations)} relations extraites du texte")
     elif extracted_schema_info['schema_sql']:
         schema = extracted_schema_info['schema_sql']
         print(f"Utilisation du schéma extrait du texte: {len(extracted_schema_info['tables'])} tables")
+        # Petit schéma propre à la requête: compilé à la volée pour la validation
+        compiled_schema = compile_schema(None, extracted_schema_info)
     else:
         # Schéma par défaut
         schema = """
@@ -1088,44 +4264,66 @@ def generate_sql_query(description):
         print("Utilisation du schéma par défaut")
 
     # Analyser et reformuler la requête pour mieux comprendre les intentions
-    understood_description = understand_user_intent(description)
+    understood_description = understand_user_intent(description, pipeline)
     print(f"Description originale: {description}")
     print(f"Description analysée: {understood_description}")
 
     # Traduire la description reformulée en anglais
-    english_description = translate_fr_to_en(understood_description)
+    english_description = run_pipeline_stage(
+        pipeline, 'translation', lambda: translate_fr_to_en(understood_description))
     print(f"Description traduite: {english_description}")
 
     # Préparer l'entrée pour le modèle
     input_text = f"Schema: {schema}\nQuestion: {english_description}\nSQL:"
 
-    try:
-        # Utiliser l'API HuggingFace
-        result = query_huggingface_api(MODEL_PATHS["text-to-sql"], input_text)
+    # Plusieurs candidates ne sont utiles que si elles peuvent être départagées par le schéma
+    candidate_count = pipeline['candidates'] if pipeline is not None else SQL_CANDIDATES_DEFAULT
+    if compiled_schema is None:
+        candidate_count = 1
 
-        if result:
-            # Extraire la requête SQL générée
-            if isinstance(result, list) and len(result) > 0:
-                if "generated_text" in result[0]:
-                    sql_query = result[0]["generated_text"]
-                else:
-                    sql_query = result[0].get("text", "SELECT * FROM users LIMIT 10; -- Requête générée par défaut")
-            else:
-                sql_query = str(result)
-        else:
+    try:
+        # Utiliser l'API HuggingFace via le micro-batching (les N meilleures séquences du faisceau en un seul appel)
+        parameters = None
+        if candidate_count > 1:
+            parameters = {'num_return_sequences': candidate_count, 'num_beams': candidate_count}
+        result = query_model_batched(MODEL_PATHS["text-to-sql"], input_text, parameters)
+
+        queries = extract_generated_queries(result) if result else []
+        if not queries:
             # Fallback simple si l'API échoue
-            sql_query = "SELECT * FROM users LIMIT 10; -- Requête générée par défaut"
+            queries = ["SELECT * FROM users LIMIT 10; -- Requête générée par défaut"]
+        sql_query = queries[0]
+
+        # Départager les candidates: validité, couverture de la question, coût estimé
+        if len(queries) > 1:
+            budget = pipeline['candidate_budget'] if pipeline is not None else SQL_CANDIDATE_BUDGET_MS / 1000
+            candidates = run_pipeline_stage(
+                pipeline, 'candidates',
+                lambda: rank_sql_candidates(queries, compiled_schema, description, budget))
+            sql_query = candidates[0]['query']
+            print(f"{len(candidates)} requêtes candidates, retenue: n°{candidates[0]['rank'] + 1}")
+            if candidates[0]['validation'] is not None:
+                run_pipeline_stage(pipeline, 'validation', lambda: candidates[0]['validation'])
 
         # Déterminer le type de requête
         sql_type = detect_sql_type(sql_query)
 
+        # Vérifier les tables et colonnes citées (aucune validation avec le schéma par défaut)
+        warnings = ""
+        if compiled_schema is not None:
+            validation = run_pipeline_stage(
+                pipeline, 'validation', lambda: validate_generated_sql(sql_query, compiled_schema))
+            if not validation['valid']:
+                print(f"Requête générée invalide: {validation['errors']}")
+            warnings = format_validation_warnings(validation)
+
         # Ajouter une explication
-        explanation = generate_explanation(sql_query)
+        explanation = run_pipeline_stage(pipeline, 'explanation', lambda: generate_explanation(sql_query))
 
         # Formater la requête pour une meilleure lisibilité
         formatted_query = sqlparse.format(sql_query, reindent=True, keyword_case='upper')
 
-        return formatted_query + explanation, sql_type, {}
+        return formatted_query + warnings + explanation, sql_type, {}
 
     except Exception as e:
         print(f"Erreur lors de la génération de la requête SQL: {str(e)}")
@@ -1453,18 +4651,17 @@ def process():
     """Route pour traiter les requêtes de génération SQL"""
     data = request.json
     text = data.get('text', '')
+    candidates, candidate_budget_ms = parse_candidate_options(data)
 
-    # Extraire le schéma de la base de données à partir du texte
-    schema_info = extract_schema_from_text(text)
-
-    # Analyser et reformuler la requête pour mieux comprendre les intentions
-    understood_text = understand_user_intent(text)
-
-    # Traduire la description en anglais pour le débogage
-    english_text = translate_fr_to_en(understood_text)
+    # Contexte partagé: chaque étape n'est exécutée qu'une seule fois pour cette requête
+    pipeline = create_pipeline_context(text, get_active_compiled_schema(), candidates, candidate_budget_ms)
 
-    # Générer la requête SQL
-    result, sql_type, advanced_options = generate_sql_query(text)
+    # Lancer les étapes indépendantes en parallèle; le graphe produit toutes les étapes de la réponse
+    stages = run_pipeline_dag(pipeline, build_sql_pipeline_stages(pipeline))
+    schema_info = stages['extracted_schema']
+    understood_text = stages['reformulation']
+    english_text = stages['translation']
+    result, sql_type, advanced_options = stages['sql']
 
     # Ajouter la requête à l'historique
     add_to_history(text, result, sql_type, advanced_options)
@@ -1473,11 +4670,7 @@ def process():
     has_advanced_options = any(advanced_options.values()) if advanced_options else False
 
     # Préparer les informations de schéma pour l'affichage
-    schema_display = {
-        'tables': list(schema_info['tables'].keys()),
-        'columns': {table: columns for table, columns in schema_info['tables'].items()},
-        'relations': [f"{r['table1']}.{r['column1']} = {r['table2']}.{r['column2']}" for r in schema_info['relations']]
-    }
+    schema_display = build_schema_display(schema_info)
 
     return jsonify({
         'result': result,
@@ -1489,7 +4682,246 @@ def process():
         'understood_text': understood_text,
         'translated_text': english_text,
         'schema_info': schema_display,
-        'has_schema': len(schema_info['tables']) > 0
+        'has_schema': len(schema_info['tables']) > 0,
+        'validation': pipeline['stages'].get('validation'),
+        'candidates': summarize_sql_candidates(pipeline['stages'].get('candidates')),
+        'stage_timings': pipeline['timings'],
+        'critical_path': pipeline['critical_path']
+    })
+
+# Fonction pour préparer les informations de schéma pour l'affichage
+def build_schema_display(schema_info):
+    """Construit la représentation du schéma attendue par le frontend"""
+    return {
+        'tables': list(schema_info['tables'].keys()),
+        'columns': {table: columns for table, columns in schema_info['tables'].items()},
+        'relations': [f"{r['table1']}.{r['column1']} = {r['table2']}.{r['column2']}" for r in schema_info['relations']]
+    }
+
+# Fonction pour formater un événement Server-Sent Events
+def format_sse_event(event, data):
+    """Formate un événement SSE dont les données sont encodées en JSON"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# Fonction pour produire les événements SSE d'une requête /process_stream
+def iter_pipeline_events(pipeline):
+    """Exécute le pipeline et produit un événement dès que chaque étape est disponible"""
+    stages = pipeline['stages']
+
+    try:
+        for stage_name in iter_pipeline_dag(pipeline, build_sql_pipeline_stages(pipeline)):
+            if stage_name == 'extracted_schema':
+                schema_info = stages['extracted_schema']
+                yield format_sse_event('schema', {
+                    'schema_info': build_schema_display(schema_info),
+                    'has_schema': len(schema_info['tables']) > 0
+                })
+            elif stage_name == 'intent':
+                intention, score = stages['intent']
+                yield format_sse_event('intent', {'intent': intention, 'score': score})
+            elif stage_name == 'reformulation':
+                yield format_sse_event('reformulation', {
+                    'original_text': pipeline['text'],
+                    'understood_text': stages['reformulation']
+                })
+            elif stage_name == 'translation':
+                yield format_sse_event('translation', {'translated_text': stages['translation']})
+            elif stage_name == 'sql':
+                result, sql_type, advanced_options = stages['sql']
+                explanation = stages.get('explanation', '')
+                query = result[:-len(explanation)] if explanation and result.endswith(explanation) else result
+                yield format_sse_event('sql', {
+                    'query': query,
+                    'detected_type': sql_type,
+                    'validation': stages.get('validation'),
+                    'candidates': summarize_sql_candidates(stages.get('candidates'))
+                })
+                yield format_sse_event('explanation', {'explanation': explanation})
+
+        result, sql_type, advanced_options = stages['sql']
+        yield format_sse_event('done', {
+            'result': result,
+            'detected_type': sql_type,
+            'advanced_options': advanced_options,
+            'stage_timings': pipeline['timings'],
+            'critical_path': pipeline['critical_path']
+        })
+    except Exception as e:
+        print(f"Erreur lors du traitement en flux: {str(e)}")
+        yield format_sse_event('error', {'message': str(e)})
+
+@app.route('/process_stream', methods=['POST'])
+def process_stream():
+    """Route pour traiter une requête en envoyant le résultat de chaque étape dès qu'il est prêt (SSE)"""
+    data = request.json
+    text = data.get('text', '')
+
+    candidates, candidate_budget_ms = parse_candidate_options(data)
+
+    # Le schéma personnalisé est lu avant l'envoi des en-têtes: la session n'est plus accessible ensuite
+    pipeline = create_pipeline_context(text, get_active_compiled_schema(), candidates, candidate_budget_ms)
+
+    return Response(iter_pipeline_events(pipeline), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Désactiver la mise en tampon des proxys (nginx)
+    })
+
+# Fonction pour lire les descriptions d'un lot (liste JSON ou lignes JSONL)
+def parse_batch_items(items):
+    """Retourne [{'text', 'id'}] à partir de chaînes ou d'objets {"text", "id"}; lève ValueError si invalide"""
+    parsed = []
+    for position, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'text': item}
+        if not isinstance(item, dict) or not isinstance(item.get('text'), str) or not item['text'].strip():
+            raise ValueError(f"Élément {position + 1}: une description non vide est attendue")
+        parsed.append({'text': item['text'], 'id': item.get('id')})
+
+    if len(parsed) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Lot trop grand: {len(parsed)} descriptions (maximum {BATCH_MAX_ITEMS})")
+    return parsed
+
+# Fonction pour lire un fichier JSONL de descriptions
+def parse_batch_lines(lines):
+    """Décode chaque ligne non vide (objet JSON ou chaîne JSON; texte brut sinon) avant parse_batch_items"""
+    items = []
+    for line in lines:
+        line = line.decode('utf-8') if isinstance(line, bytes) else line
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(line)
+    return parse_batch_items(items)
+
+# Pools de threads partagés par les lots: un pour les descriptions, un pour leurs étapes, pour qu'un gros lot
+# n'occupe pas les threads des étapes des requêtes /process
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='batch')
+batch_pipeline_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS * PIPELINE_STAGE_WIDTH,
+                                             thread_name_prefix='batch-pipeline')
+
+# Fonction pour traiter une description d'un lot avec le pipeline de /process
+def run_batch_item(text, compiled_schema, candidates, candidate_budget_ms):
+    """Exécute toutes les étapes du pipeline pour une description et retourne son résultat sérialisable"""
+    start = time.perf_counter()
+    pipeline = create_pipeline_context(text, compiled_schema, candidates, candidate_budget_ms)
+    pipeline['executor'] = batch_pipeline_executor
+    run_pipeline_dag(pipeline, build_sql_pipeline_stages(pipeline))
+
+    result, sql_type, advanced_options = pipeline['stages']['sql']
+    return {
+        'result': result,
+        'detected_type': sql_type,
+        'advanced_options': advanced_options,
+        'translated_text': pipeline['stages'].get('translation'),
+        'validation': pipeline['stages'].get('validation'),
+        'candidates': summarize_sql_candidates(pipeline['stages'].get('candidates')),
+        # Aucun appel aux modèles n'est sorti du cache pour cette description
+        'cache_hit': pipeline['cache_misses'] == 0 and pipeline['cache_hits'] > 0,
+        'cache_hits': pipeline['cache_hits'],
+        'cache_misses': pipeline['cache_misses'],
+        'stage_timings': pipeline['timings'],
+        'critical_path': pipeline['critical_path'],
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    }
+
+# Fonction pour traiter un lot et produire chaque résultat dès qu'il est prêt
+def iter_batch_results(items, compiled_schema=None, concurrency=BATCH_CONCURRENCY,
+                       candidates=SQL_CANDIDATES_DEFAULT, candidate_budget_ms=SQL_CANDIDATE_BUDGET_MS):
+    """Produit un dictionnaire par description (dans l'ordre de fin), puis un résumé du lot.
+
+    Les descriptions identiques (casse et espaces ignorés) ne sont traitées qu'une fois: leurs
+    doublons reçoivent le même résultat avec 'duplicate_of'. Au plus `concurrency` descriptions
+    sont en cours à la fois.
+    """
+    batch_start = time.perf_counter()
+
+    # Regrouper les positions des descriptions identiques
+    groups = OrderedDict()
+    for index, item in enumerate(items):
+        groups.setdefault(normalize_intent_text(item['text']), []).append(index)
+    pending = list(groups.values())
+    pending.reverse()
+
+    running = {}
+    errors = 0
+    try:
+        while pending or running:
+            while pending and len(running) < concurrency:
+                indices = pending.pop()
+                future = batch_executor.submit(run_batch_item, items[indices[0]]['text'], compiled_schema,
+                                               candidates, candidate_budget_ms)
+                running[future] = (indices, time.perf_counter())
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                indices, submitted_at = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Erreur lors du traitement d'une description du lot: {str(e)}")
+                    result = {'error': str(e), 'elapsed_ms': round((time.perf_counter() - submitted_at) * 1000, 2)}
+                    errors += 1
+
+                for position, index in enumerate(indices):
+                    line = {'index': index, 'id': items[index]['id'], 'text': items[index]['text']}
+                    line.update(result)
+                    if position > 0:
+                        line['duplicate_of'] = indices[0]
+                    yield line
+    finally:
+        # Client déconnecté: ne pas lancer les descriptions restantes
+        for future in running:
+            future.cancel()
+
+    elapsed = time.perf_counter() - batch_start
+    yield {
+        'done': True,
+        'items': len(items),
+        'unique_items': len(groups),
+        'errors': errors,
+        'elapsed_ms': round(elapsed * 1000, 2),
+        'items_per_second': round(len(items) / elapsed, 2) if elapsed > 0 else None
+    }
+
+@app.route('/process_batch', methods=['POST'])
+def process_batch():
+    """Route pour traiter un lot de descriptions; une ligne JSON par résultat est envoyée dès qu'il est prêt"""
+    try:
+        if 'file' in request.files:
+            # Fichier JSONL: une description (chaîne ou objet {"text", "id"}) par ligne
+            items = parse_batch_lines(request.files['file'].stream)
+            data = request.form
+        elif request.is_json:
+            data = request.json
+            items = parse_batch_items(data.get('items', data.get('texts', [])))
+        else:
+            items = parse_batch_lines(request.get_data().splitlines())
+            data = request.args
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if not items:
+        return jsonify({'success': False, 'error': "Aucune description à traiter"}), 400
+
+    candidates, candidate_budget_ms = parse_candidate_options(data)
+    try:
+        concurrency = min(max(int(data.get('concurrency', BATCH_CONCURRENCY)), 1), BATCH_MAX_WORKERS)
+    except (TypeError, ValueError):
+        concurrency = BATCH_CONCURRENCY
+
+    # Le schéma personnalisé est lu avant l'envoi des en-têtes: la session n'est plus accessible ensuite
+    compiled_schema = get_active_compiled_schema()
+
+    def generate():
+        for line in iter_batch_results(items, compiled_schema, concurrency, candidates, candidate_budget_ms):
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
 @app.route('/history', methods=['GET'])
@@ -1499,6 +4931,17 @@ def get_history():
         'history': session.get('query_history', [])
     })
 
+@app.route('/history', methods=['POST'])
+def add_history_entry():
+    """Route pour ajouter à l'historique une requête générée en flux (la session ne peut pas être modifiée pendant le flux)"""
+    data = request.json
+    add_to_history(data.get('description', ''), data.get('query', ''), data.get('type', 'UNKNOWN'),
+                   data.get('advanced_options'))
+
+    return jsonify({
+        'history': session.get('query_history', [])
+    })
+
 @app.route('/clear_history', methods=['POST'])
 def clear_history():
     """Route pour effacer l'historique des requêtes"""
@@ -1550,9 +4993,25 @@ def correct_query_route():
 
     return jsonify(correction_result)
 
+# Fonction pour adopter le schéma d'une tâche d'import terminée dans la session
+def build_upload_result(job):
+    """Enregistre le schéma de la tâche dans la session et retourne les champs de réponse correspondants"""
+    compiled_schema = get_compiled_schema(job['schema_id'])
+    if not compiled_schema:
+        return {'success': False, 'error': 'Schéma introuvable', 'message': 'Le schéma importé n\'est plus disponible'}
+
+    session['custom_schema_id'] = job['schema_id']
+    session.modified = True
+    return {
+        'message': 'Schéma importé avec succès',
+        'schema_info': compiled_schema['display'],
+        'has_schema': True,
+        'ingestion_job_id': job.get('ingestion_job_id')
+    }
+
 @app.route('/upload_schema', methods=['POST'])
 def upload_schema():
-    """Route pour uploader un fichier de schéma (SQL ou JSON)"""
+    """Route pour uploader un fichier de schéma (SQL, JSON ou CSV)"""
     try:
         # Vérifier si un fichier a été envoyé
         if 'file' not in request.files:
@@ -1592,8 +5051,7 @@ def upload_schema():
         # Sauvegarder le fichier
         try:
             filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            file_path, file_hash = save_uploaded_file(file, app.config['UPLOAD_FOLDER'], filename)
 
             # Vérifier que le fichier a bien été sauvegardé
             if not os.path.exists(file_path):
@@ -1612,66 +5070,20 @@ def upload_schema():
                 'message': f'Erreur lors de la sauvegarde du fichier: {str(e)}'
             })
 
-        # Extraire le schéma selon le type de fichier
-        schema_info = None
-        try:
-            if filename.lower().endswith('.sql'):
-                schema_info = extract_schema_from_sql_file(file_path)
-            elif filename.lower().endswith('.json'):
-                schema_info = extract_schema_from_json_file(file_path)
-            elif filename.lower().endswith('.txt') or filename.lower().endswith('.csv'):
-                # Pour les fichiers texte, essayer d'abord comme SQL puis comme JSON
-                schema_info = extract_schema_from_sql_file(file_path)
-                if not schema_info or not schema_info.get('tables'):
-                    schema_info = extract_schema_from_json_file(file_path)
-            else:
-                # Essayer de deviner le format en fonction du contenu
-                with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                    content = f.read(1000)  # Lire les 1000 premiers caractères
-                    if 'CREATE TABLE' in content or 'INSERT INTO' in content:
-                        schema_info = extract_schema_from_sql_file(file_path)
-                    elif '{' in content or '[' in content:
-                        schema_info = extract_schema_from_json_file(file_path)
-                    else:
-                        # Format non reconnu, créer un schéma par défaut
-                        table_name = os.path.splitext(filename)[0].replace('-', '_').replace(' ', '_').lower()
-                        schema_info = create_default_schema(table_name)
-        except Exception as e:
-            print(f"Erreur lors de l'extraction du schéma: {str(e)}")
-            import traceback
-            traceback.print_exc()
-
-            # Créer un schéma par défaut en cas d'erreur
-            table_name = os.path.splitext(filename)[0].replace('-', '_').replace(' ', '_').lower()
-            schema_info = create_default_schema(table_name)
-
-        # Vérifier si le schéma a été extrait avec succès
-        if not schema_info or not schema_info.get('tables'):
-            # Créer un schéma par défaut
-            table_name = os.path.splitext(filename)[0].replace('-', '_').replace(' ', '_').lower()
-            schema_info = create_default_schema(table_name)
-
-        # Stocker le schéma en session
-        try:
-            session['custom_schema'] = schema_info
-            session.modified = True
-        except Exception as e:
-            print(f"Erreur lors du stockage du schéma en session: {str(e)}")
-            # Continuer malgré l'erreur
-
-        # Préparer les informations de schéma pour l'affichage
-        schema_display = {
-            'tables': list(schema_info['tables'].keys()),
-            'columns': {table: columns for table, columns in schema_info['tables'].items()},
-            'relations': [f"{r['table1']}.{r['column1']} = {r['table2']}.{r['column2']}" for r in schema_info['relations']]
+        # Analyser le fichier en arrière-plan: la réponse n'attend pas la fin de l'analyse
+        job_id = start_upload_job(file_path, filename, file_hash)
+        response = {
+            'success': True,
+            'message': 'Import en cours',
+            'job_id': job_id
         }
 
-        return jsonify({
-            'success': True,
-            'message': 'Schéma importé avec succès',
-            'schema_info': schema_display,
-            'has_schema': True
-        })
+        # Fichier identique déjà analysé: le schéma est disponible immédiatement
+        job = get_background_job(job_id)
+        if job['status'] == 'completed':
+            response.update(build_upload_result(job))
+
+        return jsonify(response)
     except Exception as e:
         print(f"Erreur globale lors de l'upload du fichier: {str(e)}")
         import traceback
@@ -1682,36 +5094,124 @@ def upload_schema():
             'message': f'Erreur lors de l\'upload du fichier: {str(e)}'
         })
 
+@app.route('/execute', methods=['POST'])
+def execute():
+    """Route pour exécuter une requête SELECT sur les données du schéma importé"""
+    data = request.json or {}
+    query = data.get('query', '').strip()
+
+    if not query:
+        return jsonify({
+            'success': False,
+            'error': 'Requête vide',
+            'message': 'Aucune requête SQL à exécuter'
+        })
+
+    # Nombre de lignes demandé: entier borné entre 1 et EXECUTE_MAX_ROWS
+    try:
+        max_rows = data.get('max_rows')
+        max_rows = EXECUTE_MAX_ROWS if max_rows is None else min(max(int(max_rows), 1), EXECUTE_MAX_ROWS)
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'max_rows invalide',
+            'message': 'max_rows doit être un nombre entier'
+        }), 400
+
+    schema_id = session.get('custom_schema_id')
+    schema_info = load_schema(schema_id)
+    if not schema_info or not schema_info.get('tables'):
+        return jsonify({
+            'success': False,
+            'error': 'Aucun schéma personnalisé',
+            'message': 'Importez un fichier de schéma pour exécuter les requêtes'
+        })
+
+    # Données en cours de chargement: attendre au plus le budget d'exécution avant de répondre
+    if not os.path.exists(os.path.join(SANDBOX_FOLDER, f"{schema_id}.sqlite3")):
+        job_id, future = start_ingestion_job(schema_id, schema_info)
+        try:
+            future.result(timeout=EXECUTE_TIME_BUDGET)
+        except FutureTimeoutError:
+            return jsonify({
+                'success': False,
+                'error': 'Chargement en cours',
+                'message': 'Les données du fichier importé sont en cours de chargement, réessayez dans un instant',
+                'ingestion': get_background_job(job_id)
+            })
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'message': f"Erreur lors du chargement des données: {str(e)}"
+            })
+
+    try:
+        result = execute_sandbox_query(schema_id, schema_info, query, max_rows=max_rows)
+        return jsonify(dict(result, success=True))
+    except (ValueError, TimeoutError, sqlite3.Error) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': f"Erreur lors de l'exécution de la requête: {str(e)}"
+        })
+
+@app.route('/upload_status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    """Route pour suivre l'analyse d'un fichier importé; le schéma est adopté par la session une fois prêt"""
+    job = get_background_job(job_id)
+    if not job or job['kind'] != 'upload':
+        return jsonify({
+            'success': False,
+            'error': 'Tâche inconnue',
+            'message': 'Aucun import ne correspond à cet identifiant'
+        }), 404
+
+    response = {'success': True, 'job': job}
+    if job['status'] == 'completed':
+        response.update(build_upload_result(job))
+    elif job['status'] == 'failed':
+        response.update({
+            'success': False,
+            'error': job.get('error'),
+            'message': f"Erreur lors de l'analyse du fichier: {job.get('error')}"
+        })
+
+    return jsonify(response)
+
+@app.route('/ingestion_status/<job_id>', methods=['GET'])
+def ingestion_status(job_id):
+    """Route pour suivre le chargement des données d'un fichier importé"""
+    job = get_background_job(job_id)
+    if not job or job['kind'] != 'ingestion':
+        return jsonify({
+            'success': False,
+            'error': 'Tâche inconnue',
+            'message': 'Aucun chargement ne correspond à cet identifiant'
+        }), 404
+
+    return jsonify({'success': True, 'job': job})
+
 @app.route('/get_custom_schema', methods=['GET'])
 def get_custom_schema():
-    """Route pour récupérer le schéma personnalisé stocké en session"""
-    schema_info = session.get('custom_schema', {})
+    """Route pour récupérer le schéma personnalisé référencé par la session"""
+    compiled_schema = get_active_compiled_schema()
 
-    if not schema_info or not schema_info.get('tables'):
+    if not compiled_schema or not compiled_schema['schema'].get('tables'):
         return jsonify({
             'success': False,
             'error': 'Aucun schéma personnalisé',
             'message': 'Aucun schéma personnalisé n\'a été importé'
         })
 
-    # Préparer les informations de schéma pour l'affichage
-    schema_display = {
-        'tables': list(schema_info['tables'].keys()),
-        'columns': {table: columns for table, columns in schema_info['tables'].items()},
-        'relations': [f"{r['table1']}.{r['column1']} = {r['table2']}.{r['column2']}" for r in schema_info['relations']]
-    }
-
-    return jsonify({
-        'success': True,
-        'schema_info': schema_display,
-        'has_schema': True
-    })
+    # Réponse précalculée à la compilation du schéma
+    return Response(compiled_schema['display_response'], mimetype='application/json')
 
 @app.route('/clear_custom_schema', methods=['POST'])
 def clear_custom_schema():
-    """Route pour effacer le schéma personnalisé stocké en session"""
-    if 'custom_schema' in session:
-        del session['custom_schema']
+    """Route pour effacer le schéma personnalisé référencé par la session"""
+    if 'custom_schema_id' in session:
+        del session['custom_schema_id']
         session.modified = True
 
     return jsonify({
@@ -1719,12 +5219,23 @@ def clear_custom_schema():
         'message': 'Schéma personnalisé effacé avec succès'
     })
 
+@app.route('/api_stats', methods=['GET'])
+def api_stats():
+    """Route pour consulter les statistiques des appels aux modèles"""
+    return jsonify({
+        'http_pool': get_http_pool_stats(),
+        'response_cache': get_response_cache_stats(),
+        'intent_cache': dict(intent_cache_stats, entries=len(intent_cache)),
+        'circuit_breakers': get_circuit_breaker_stats(),
+        'micro_batching': get_micro_batching_stats()
+    })
+
 @app.route('/load_models', methods=['GET'])
 def load_models_route():
     """Route pour charger les modèles pré-entraînés"""
     try:
         # Charger les modèles
-        for model_type in MODEL_PATHS:
+        for model_type in LOCAL_MODEL_PATHS:
             load_model(model_type)
 
         return jsonify({
@@ -1743,6 +5254,11 @@ if __name__ == '__main__':
     print("Démarrage de l'application SQL Bot avec modèles pré-entraînés...")
     print("L'application utilisera l'API HuggingFace pour générer les requêtes SQL.")
 
+    # Charger les modèles disponibles localement (l'API reste utilisée pour les autres)
+    if os.path.isdir(LOCAL_MODELS_DIR):
+        for model_type in LOCAL_MODEL_PATHS:
+            load_model(model_type)
+
     # Vérifier si une clé API HuggingFace est disponible
     if HUGGINGFACE_API_KEY:
         print("Clé API HuggingFace détectée.")
@@ -0,0 +1,51 @@
+"""Micro-benchmark de la traduction de secours: boucle de str.replace (ancienne) vs expression compilée.
+
+Usage:
+    python benchmarks/bench_fallback_translate.py [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_sql_pretrained as app_module  # noqa: E402
+
+SHORT_DESCRIPTION = "Afficher le nom et le prix des produits de la catégorie informatique"
+LONG_DESCRIPTION = " ".join([
+    "Sélectionner les clients et leurs commandes dont le prix est supérieur à 100,",
+    "grouper par catégorie et trier par date, en ajoutant le nom de famille, le prénom,",
+    "l'adresse et le téléphone de chaque client actif ainsi que la quantité commandée",
+    "pour les vendeurs dont le statut n'est pas nul, puis limiter à 50 résultats.",
+] * 20)
+
+
+def legacy_translate(text):
+    """Ancienne implémentation: un str.replace sur tout le texte pour chaque entrée du dictionnaire"""
+    translated_text = text.lower()
+    for fr_word, en_word in app_module.FALLBACK_TRANSLATIONS.items():
+        translated_text = translated_text.replace(fr_word, en_word)
+    return "Generate SQL query: " + translated_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="nombre d'appels par mesure")
+    args = parser.parse_args()
+
+    for label, text in (("courte", SHORT_DESCRIPTION), ("longue", LONG_DESCRIPTION)):
+        legacy = min(timeit.repeat(lambda: legacy_translate(text), number=args.repeat, repeat=5)) / args.repeat
+        compiled = min(timeit.repeat(lambda: app_module.fallback_translate_fr_to_en(text),
+                                     number=args.repeat, repeat=5)) / args.repeat
+        print(f"Description {label} ({len(text)} caractères): "
+              f"{legacy * 1e6:9.1f} µs -> {compiled * 1e6:8.1f} µs (x{legacy / compiled:.1f})")
+
+    # Les remplacements de sous-chaînes de l'ancienne implémentation corrompent les mots
+    example = "Afficher les vendeurs et le détail de la commande"
+    print(f"\nAncienne : {legacy_translate(example)}")
+    print(f"Nouvelle : {app_module.fallback_translate_fr_to_en(example)}")
+
+
+if __name__ == "__main__":
+    main()
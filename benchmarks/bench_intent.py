@@ -0,0 +1,106 @@
+"""Compare la détection d'intention par paires NLI (ancienne approche) et par zero-shot (un seul appel).
+
+Usage:
+    python benchmarks/bench_intent.py            # taille des requêtes uniquement
+    python benchmarks/bench_intent.py --live 5   # + latence réelle de l'API (5 répétitions)
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_sql_pretrained as app_module  # noqa: E402
+
+# Descriptions représentatives des requêtes envoyées à /process
+DESCRIPTIONS = [
+    "Afficher tous les utilisateurs",
+    "Afficher les commandes des clients de Paris triées par date",
+    "Compter le nombre de produits par catégorie dont le prix est supérieur à 100",
+    "Supprimer les utilisateurs inactifs depuis plus d'un an",
+    "Ajouter un nouveau produit avec le nom clavier et le prix 49.90",
+    "Mettre à jour le statut des commandes livrées avant le 1er janvier",
+    "Lister les clients avec le montant total de leurs commandes, en joignant les tables clients et commandes",
+]
+
+
+def legacy_payload(text):
+    """Corps de requête de l'ancienne approche: une paire texte/hypothèse par intention"""
+    pairs = [{"text": text, "hypothesis": app_module.INTENT_HYPOTHESIS_TEMPLATE.format(label)}
+             for label in app_module.INTENT_LABELS]
+    return {"inputs": pairs, "options": {"wait_for_model": True, "use_cache": True}}
+
+
+def zero_shot_payload(text):
+    """Corps de requête de la classification zero-shot: le texte une fois, les intentions en paramètre"""
+    return {
+        "inputs": text,
+        "parameters": {
+            "candidate_labels": app_module.INTENT_LABELS,
+            "hypothesis_template": app_module.INTENT_HYPOTHESIS_TEMPLATE,
+            "multi_label": False,
+        },
+        "options": {"wait_for_model": True, "use_cache": True},
+    }
+
+
+def payload_size(payload):
+    return len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+def measure_latency(payload, repeats):
+    """Envoie la requête directement (sans cache local) et retourne les durées en ms"""
+    url = f"{app_module.HUGGINGFACE_API_BASE_URL}/models/{app_module.UNDERSTANDING_MODEL}"
+    headers = {"Content-Type": "application/json"}
+    if app_module.HUGGINGFACE_API_KEY:
+        headers["Authorization"] = f"Bearer {app_module.HUGGINGFACE_API_KEY}"
+
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        app_module.get_http_client().post(
+            url, headers=headers, json=payload,
+            timeout=(app_module.HTTP_CONNECT_TIMEOUT, app_module.HTTP_READ_TIMEOUT),
+        )
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--live", type=int, default=0, metavar="N",
+                        help="mesurer la latence réelle de l'API avec N répétitions par description")
+    args = parser.parse_args()
+
+    results = []
+    for text in DESCRIPTIONS:
+        legacy = legacy_payload(text)
+        zero_shot = zero_shot_payload(text)
+        row = {
+            "description": text,
+            "legacy_bytes": payload_size(legacy),
+            "zero_shot_bytes": payload_size(zero_shot),
+        }
+        if args.live:
+            row["legacy_ms_p50"] = round(statistics.median(measure_latency(legacy, args.live)), 1)
+            row["zero_shot_ms_p50"] = round(statistics.median(measure_latency(zero_shot, args.live)), 1)
+        results.append(row)
+
+    total_legacy = sum(row["legacy_bytes"] for row in results)
+    total_zero_shot = sum(row["zero_shot_bytes"] for row in results)
+
+    for row in results:
+        line = f"{row['legacy_bytes']:>6} o -> {row['zero_shot_bytes']:>5} o"
+        if args.live:
+            line += f" | {row['legacy_ms_p50']:>8} ms -> {row['zero_shot_ms_p50']:>8} ms"
+        print(f"{line}  {row['description'][:60]}")
+
+    print(f"\nTotal: {total_legacy} o -> {total_zero_shot} o "
+          f"({100 * (1 - total_zero_shot / total_legacy):.1f} % de moins)")
+
+
+if __name__ == "__main__":
+    main()
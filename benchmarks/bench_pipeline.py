@@ -0,0 +1,477 @@
+"""Latence de bout en bout (p50/p95/p99), débit et durée par étape de /process, /correct_query, /upload_schema et /extract_fields.
+
+Les appels aux modèles passent par le serveur d'inférence simulé (mock_hf_server.py) : les mesures ne
+dépendent ni du réseau ni de l'API publique. Les fichiers (cache, schémas, imports) sont écrits dans un
+répertoire temporaire. Les résultats sont écrits en JSON pour comparer deux commits.
+
+Usage:
+    python benchmarks/bench_pipeline.py                                   # client de test Flask
+    python benchmarks/bench_pipeline.py --mode server --concurrency 8     # vrai serveur HTTP (un thread par requête)
+    python benchmarks/bench_pipeline.py --mode workers --workers 4        # 4 processus serveur, requêtes en tourniquet
+    python benchmarks/bench_pipeline.py --url http://127.0.0.1:5000       # serveur déjà lancé (HF_API_BASE_URL à régler)
+    python benchmarks/bench_pipeline.py --output apres.json --compare avant.json
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app_sql_pretrained as app_module  # noqa: E402
+import mock_hf_server  # noqa: E402
+
+# Corpus fixe: les mêmes entrées d'un commit à l'autre
+DESCRIPTIONS = [
+    "Afficher tous les clients",
+    "Afficher les commandes des clients de Paris triées par date",
+    "Compter le nombre de produits par catégorie dont le prix est supérieur à 100",
+    "Lister les clients avec le montant total de leurs commandes",
+    "Afficher les factures impayées du mois dernier",
+    "Quels sont les cinq fournisseurs qui livrent le plus de produits ?",
+    "Supprimer les commandes annulées avant 2023",
+    "Mettre à jour la ville du client numéro 42",
+    "Ajouter un nouveau produit avec le nom clavier et le prix 49.90",
+    "Afficher le chiffre d'affaires par ville et par année",
+]
+QUERIES_TO_CORRECT = [
+    "SELEC nom FROM clients",
+    "SELECT * FORM commandes WHERE montant > 100",
+    "SELECT nom, COUNT(* FROM produits GROUP BY nom",
+    "UPDATE clients SET ville = 'Lyon' WHER id = 42",
+    "SELECT c.nom, SUM(o.montant) FROM clients c JOIN commandes o ON c.id = o.client_id GROUP BY c.nom",
+]
+QUERIES_WITH_FIELDS = [
+    "SELECT ville, COUNT(*) AS total FROM clients GROUP BY ville",
+    "SELECT c.nom, SUM(o.montant) FROM clients c JOIN commandes o ON c.id = o.client_id GROUP BY c.nom",
+    "SELECT categorie, AVG(prix) AS prix_moyen, MAX(prix) FROM produits GROUP BY categorie",
+]
+TABLE_NAMES = ["clients", "commandes", "produits", "factures", "fournisseurs", "livraisons", "categories",
+               "employes", "paiements", "stocks"]
+
+UPLOAD_POLL_INTERVAL = 0.02  # Secondes entre deux interrogations de /upload_status
+SERVER_START_TIMEOUT = 60  # Secondes d'attente du démarrage du serveur HTTP
+
+
+def write_schema_file(path, tables, rows_per_table):
+    """Écrit un export SQL de `tables` tables reliées à clients, avec `rows_per_table` lignes chacune"""
+    with open(path, "w", encoding="utf-8") as f:
+        for index in range(tables):
+            name = TABLE_NAMES[index % len(TABLE_NAMES)]
+            if index >= len(TABLE_NAMES):
+                name += f"_{index}"
+            foreign_key = ",\n  FOREIGN KEY (client_id) REFERENCES clients(id)" if index else ""
+            f.write(f"CREATE TABLE {name} (\n  id INT PRIMARY KEY,\n  client_id INT,\n  nom VARCHAR(100),\n"
+                    f"  ville VARCHAR(100),\n  montant DECIMAL(10,2),\n  date_creation DATETIME{foreign_key}\n);\n")
+            if rows_per_table:
+                values = ",\n".join(f"({i}, {i % 50}, 'nom {i}', 'ville {i % 20}', {i}.5, '2024-01-01 10:00:00')"
+                                    for i in range(rows_per_table))
+                f.write(f"INSERT INTO {name} (id, client_id, nom, ville, montant, date_creation) VALUES\n{values};\n")
+
+
+def percentile(values, q):
+    """Percentile q (0-100) par interpolation linéaire"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values):
+    """p50/p95/p99, moyenne et maximum (ms, arrondis)"""
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "mean": round(sum(values) / len(values), 2),
+        "max": round(max(values), 2),
+    }
+
+
+class TestClientDriver:
+    """Envoie les requêtes avec le client de test Flask (sans réseau)"""
+
+    def __init__(self):
+        self.client = app_module.app.test_client()
+        self.active_schema = None
+
+    def post(self, path, json_body=None, file_path=None):
+        if file_path:
+            with open(file_path, "rb") as f:
+                response = self.client.post(path, data={"file": (f, os.path.basename(file_path))},
+                                            content_type="multipart/form-data")
+        else:
+            response = self.client.post(path, json=json_body)
+        return response.status_code, response.get_json(silent=True)
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpDriver:
+    """Envoie les requêtes à un ou plusieurs serveurs HTTP (une session, donc un cookie de session, par thread).
+
+    Avec plusieurs adresses, chaque requête va au serveur suivant (tourniquet), comme derrière un répartiteur
+    de charge sans affinité de session: l'import et son suivi arrivent sur des processus différents.
+    """
+    drivers_created = itertools.count()
+
+    def __init__(self, base_urls):
+        if isinstance(base_urls, str):
+            base_urls = [base_urls]
+        urls = [url.rstrip("/") for url in base_urls]
+        # Chaque driver commence sur un serveur différent
+        offset = next(HttpDriver.drivers_created) % len(urls)
+        self.base_urls = itertools.cycle(urls[offset:] + urls[:offset])
+        self.session = requests.Session()
+        self.active_schema = None
+
+    def post(self, path, json_body=None, file_path=None):
+        base_url = next(self.base_urls)
+        if file_path:
+            with open(file_path, "rb") as f:
+                response = self.session.post(base_url + path, files={"file": (os.path.basename(file_path), f)})
+        else:
+            response = self.session.post(base_url + path, json=json_body)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+    def get(self, path):
+        response = self.session.get(next(self.base_urls) + path)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+
+def upload_and_wait(driver, file_path):
+    """Importe un fichier et attend que son schéma soit prêt (la session l'adopte à ce moment)"""
+    status, body = driver.post("/upload_schema", file_path=file_path)
+    if status != 200 or not body or not body.get("job_id"):
+        return False
+    job_id = body["job_id"]
+    while True:
+        status, body = driver.get(f"/upload_status/{job_id}")
+        job = (body or {}).get("job", {})
+        if status != 200 or job.get("status") == "failed":
+            return False
+        if job.get("status") == "completed":
+            return True
+        time.sleep(UPLOAD_POLL_INTERVAL)
+
+
+def run_scenario(name, tasks, make_driver, concurrency):
+    """Exécute les tâches (driver -> durées par étape ou None; lève une exception en cas d'échec)"""
+    local = threading.local()
+    latencies, stage_timings, errors = [], {}, []
+    lock = threading.Lock()
+
+    def run(task):
+        if not hasattr(local, "driver"):
+            local.driver = make_driver()
+        start = time.perf_counter()
+        try:
+            stages = task(local.driver)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            for stage, duration in (stages or {}).items():
+                stage_timings.setdefault(stage, []).append(duration)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, tasks))
+    wall = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "requests": len(tasks),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "latency_ms": summarize(latencies),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall > 0 else None,
+        "stages_ms": {stage: summarize(values) for stage, values in sorted(stage_timings.items())},
+    }
+
+
+def process_task(text, schema_file=None):
+    """Tâche /process (après adoption du schéma importé par la session du driver)"""
+    def task(driver):
+        if schema_file and driver.active_schema != schema_file:
+            if not upload_and_wait(driver, schema_file):
+                raise RuntimeError(f"Import impossible: {schema_file}")
+            driver.active_schema = schema_file
+        status, body = driver.post("/process", {"text": text})
+        if status != 200 or not body:
+            raise RuntimeError(f"/process: HTTP {status}")
+        return body.get("stage_timings")
+    return task
+
+
+def simple_task(path, payload):
+    """Tâche POST JSON sans durées par étape (/correct_query, /extract_fields)"""
+    def task(driver):
+        status, _ = driver.post(path, payload)
+        if status != 200:
+            raise RuntimeError(f"{path}: HTTP {status}")
+    return task
+
+
+def upload_task(file_path):
+    """Tâche d'import: de l'envoi du fichier à la disponibilité du schéma"""
+    def task(driver):
+        if not upload_and_wait(driver, file_path):
+            raise RuntimeError(f"Import impossible: {file_path}")
+    return task
+
+
+def run_benchmarks(args, make_driver, workdir):
+    """Construit les scénarios et retourne la liste de leurs résultats"""
+    results = []
+    iterations = range(args.iterations)
+
+    def scenario(name, tasks, warmup=None):
+        for task in warmup or tasks[:1]:
+            task(make_driver())  # Échauffement, non mesuré
+        result = run_scenario(name, tasks, make_driver, args.concurrency)
+        results.append(result)
+        latency = result["latency_ms"] or {}
+        print(f"{name:<32} {result['requests']:>5} req  p50 {latency.get('p50', '-'):>9} ms  "
+              f"p95 {latency.get('p95', '-'):>9} ms  p99 {latency.get('p99', '-'):>9} ms  "
+              f"{result['throughput_rps']:>8} req/s  erreurs {result['errors']}", file=sys.stderr)
+
+    scenario("process", [process_task(text) for _ in iterations for text in DESCRIPTIONS])
+    scenario("correct_query", [simple_task("/correct_query", {"query": query})
+                               for _ in iterations for query in QUERIES_TO_CORRECT])
+    scenario("extract_fields", [simple_task("/extract_fields", {"query": query})
+                                for _ in iterations for query in QUERIES_WITH_FIELDS])
+
+    for tables in args.schema_tables:
+        # Un nom de fichier par import: chaque import est réellement analysé (pas de déduplication)
+        files = []
+        for index in range(args.iterations + 1):
+            path = os.path.join(workdir, f"schema_{tables}_{index}.sql")
+            write_schema_file(path, tables, args.rows_per_table)
+            files.append(path)
+        scenario(f"upload_schema[{tables} tables]", [upload_task(path) for path in files[1:]],
+                 warmup=[upload_task(files[0])])
+        scenario(f"process[{tables} tables]",
+                 [process_task(text, files[0]) for _ in iterations for text in DESCRIPTIONS])
+
+    return results
+
+
+def start_http_server(args, mock_url, workdir):
+    """Lance l'application dans un processus séparé (serveur multi-thread) et retourne (processus, adresse)"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    command = [sys.executable, os.path.abspath(__file__), "--serve", str(port), "--hf-url", mock_url,
+               "--storage", workdir]
+    if args.no_cache:
+        command.append("--no-cache")
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url + "/api_stats", timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Le serveur HTTP n'a pas démarré")
+
+
+def start_http_servers(args, mock_url, workdir, count):
+    """Lance `count` processus serveur qui partagent le même stockage; retourne (processus, adresses)"""
+    processes, urls = [], []
+    try:
+        for _ in range(count):
+            process, base_url = start_http_server(args, mock_url, workdir)
+            processes.append(process)
+            urls.append(base_url)
+    except Exception:
+        stop_http_servers(processes)
+        raise
+    return processes, urls
+
+
+def stop_http_servers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+
+def configure_app(hf_url, storage, no_cache):
+    """Dirige l'application vers le serveur simulé et un répertoire de stockage temporaire"""
+    app_module.HUGGINGFACE_API_BASE_URL = hf_url
+    app_module.CACHE_FOLDER = os.path.join(storage, "cache")
+    app_module.HF_CACHE_DB_PATH = os.path.join(app_module.CACHE_FOLDER, "hf_responses.sqlite3")
+    app_module.SCHEMA_STORE_PATH = os.path.join(app_module.CACHE_FOLDER, "schemas.sqlite3")
+    app_module.SANDBOX_FOLDER = os.path.join(app_module.CACHE_FOLDER, "sandboxes")
+    app_module.UPLOAD_FOLDER = os.path.join(storage, "uploads")
+    app_module.app.config["UPLOAD_FOLDER"] = app_module.UPLOAD_FOLDER
+    os.makedirs(app_module.UPLOAD_FOLDER, exist_ok=True)
+    if no_cache:
+        # Toute réponse mise en cache est considérée comme expirée, et aucune intention n'est conservée
+        app_module.HF_CACHE_TTL = -1
+        app_module.HF_CACHE_DISK_TTL = -1
+        app_module.INTENT_CACHE_MAX_ENTRIES = 0
+
+
+def serve(args):
+    """Point d'entrée du processus serveur lancé par --mode server"""
+    from werkzeug.serving import make_server
+
+    configure_app(args.hf_url, args.storage, args.no_cache)
+    make_server("127.0.0.1", args.serve, app_module.app, threaded=True).serve_forever()
+
+
+def git_commit():
+    """Commit mesuré (None hors d'un dépôt git)"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(previous, current):
+    """Affiche l'évolution de p50 et p95 par scénario (ratio > 1 = plus lent qu'avant)"""
+    before = {result["scenario"]: result for result in previous["results"]}
+    print(f"\nComparaison avec {previous['meta'].get('commit')} :", file=sys.stderr)
+    for result in current["results"]:
+        old = before.get(result["scenario"])
+        if not old or not old["latency_ms"] or not result["latency_ms"]:
+            continue
+        line = f"  {result['scenario']:<32}"
+        for key in ("p50", "p95"):
+            old_value, new_value = old["latency_ms"][key], result["latency_ms"][key]
+            ratio = new_value / old_value if old_value else float("inf")
+            line += f"  {key} {old_value:>9} -> {new_value:>9} ms (x{ratio:.2f})"
+        print(line, file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("client", "server", "workers"), default="client",
+                        help="client de test Flask, serveur HTTP dans un processus séparé, "
+                             "ou --workers processus serveur interrogés en tourniquet")
+    parser.add_argument("--workers", type=int, default=4, help="processus serveur du mode workers")
+    parser.add_argument("--url", help="adresse d'un serveur déjà lancé (remplace --mode)")
+    parser.add_argument("--concurrency", type=int, default=4, help="requêtes envoyées en même temps")
+    parser.add_argument("--iterations", type=int, default=3, help="passages sur le corpus par scénario")
+    parser.add_argument("--schema-tables", type=int, nargs="+", default=[10, 100, 1000],
+                        help="nombres de tables des schémas importés")
+    parser.add_argument("--rows-per-table", type=int, default=100, help="lignes INSERT par table")
+    parser.add_argument("--latency", default="fixed:20", help="latence des modèles simulés (voir mock_hf_server.py)")
+    parser.add_argument("--loading-rate", type=float, default=0.0, help="part de réponses 503 des modèles simulés")
+    parser.add_argument("--no-cache", action="store_true", help="ne pas réutiliser les réponses des modèles en cache")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--compare", help="fichier JSON d'une exécution précédente")
+    # Options internes du processus serveur
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--hf-url", help=argparse.SUPPRESS)
+    parser.add_argument("--storage", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    real_stdout = sys.stdout
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    mock_server, mock_url = mock_hf_server.start_mock_server({
+        "latency": args.latency, "loading_rate": args.loading_rate, "loading_estimated_time": 0.1, "seed": 0,
+    })
+    server_processes = []
+    try:
+        if args.url:
+            mode = "external"
+            process_count = None
+            make_driver = lambda: HttpDriver(args.url)  # noqa: E731
+        elif args.mode in ("server", "workers"):
+            mode = args.mode
+            process_count = max(args.workers, 1) if mode == "workers" else 1
+            server_processes, base_urls = start_http_servers(args, mock_url, workdir, process_count)
+            make_driver = lambda: HttpDriver(base_urls)  # noqa: E731
+        else:
+            mode = "client"
+            process_count = 1
+            configure_app(mock_url, workdir, args.no_cache)
+            make_driver = TestClientDriver
+
+        if process_count:
+            print(f"Mesures sur {process_count} processus serveur", file=sys.stderr)
+
+        # Les messages de l'application (y compris ceux des chargements en arrière-plan) sont ignorés
+        sys.stdout = open(os.devnull, "w")
+        results = run_benchmarks(args, make_driver, workdir)
+    finally:
+        stop_http_servers(server_processes)
+        mock_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "mode": mode,
+            # Processus serveur (inconnu pour un serveur déjà lancé)
+            "server_processes": process_count,
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "iterations": args.iterations,
+            "model_latency": args.latency,
+            "loading_rate": args.loading_rate,
+            "response_cache": not args.no_cache,
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        real_stdout.write(output + "\n")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Débit (Mo/s) de l'extraction de schéma SQL: regex sur le fichier entier (ancienne) vs flux vs processus parallèles.
+
+Usage:
+    python benchmarks/bench_sql_parse.py                       # export synthétique de 64 Mo
+    python benchmarks/bench_sql_parse.py --size 256 --workers 1 2 4 8
+    python benchmarks/bench_sql_parse.py --file dump.sql
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_sql_pretrained as app_module  # noqa: E402
+
+TABLE_TEMPLATE = """--
+-- Table structure for table `{name}`
+--
+
+CREATE TABLE `{name}` (
+  `id` int(11) NOT NULL,
+  `client_id` int(11) NOT NULL,
+  `libelle` varchar(255) NOT NULL COMMENT 'libellé; affiché',
+  `montant` decimal(10,2) DEFAULT '0.00',
+  `created_at` datetime DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+ALTER TABLE `{name}`
+  ADD CONSTRAINT `fk_{name}` FOREIGN KEY (`client_id`) REFERENCES `clients` (`id`);
+
+"""
+
+
+def write_synthetic_dump(path, size_mb, tables=20, rows_per_insert=500):
+    """Écrit un export de type phpMyAdmin: quelques tables et de gros INSERT étendus"""
+    target = size_mb * 1024 * 1024
+    row = "({i}, {i}, 'Commande n°{i} -- l''article; \\'spécial\\'', '{i}.99', '2024-01-01 10:00:00')"
+    with open(path, "w", encoding="utf-8") as f:
+        for index in range(tables):
+            f.write(TABLE_TEMPLATE.format(name=f"table_{index}"))
+        index = 0
+        while f.tell() < target:
+            values = ",\n".join(row.format(i=i) for i in range(index, index + rows_per_insert))
+            f.write(f"INSERT INTO `table_{index % tables}` (`id`, `client_id`, `libelle`, `montant`, "
+                    f"`created_at`) VALUES\n{values};\n")
+            index += rows_per_insert
+
+
+def legacy_extract(file_path):
+    """Ancienne implémentation (méthodes 1 et 2): lecture complète puis regex DOTALL sur tout le texte"""
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        sql_content = f.read()
+    tables = {}
+    pattern = r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?[`"\[]?(\w+)[`"\]]?\s*\((.*?)\);'
+    for table_name, table_content in re.findall(pattern, sql_content, re.IGNORECASE | re.DOTALL):
+        tables[table_name.lower()] = [column.lower() for column, _ in
+                                      re.findall(r'[`"\[]?(\w+)[`"\]]?\s+([A-Za-z0-9_\(\)]+)', table_content)]
+    if not tables:
+        pattern = r'CREATE TABLE `(\w+)`\s*\(([\s\S]*?)\)\s*ENGINE'
+        for table_name, table_content in re.findall(pattern, sql_content):
+            tables[table_name.lower()] = [column.lower() for column, _ in
+                                          re.findall(r'`(\w+)`\s+([^,\n]+)', table_content)]
+    return tables
+
+
+def measure(label, function, size_bytes):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f} s  {size_bytes / 1024 / 1024 / elapsed:8.1f} Mo/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", help="export SQL à analyser (sinon un export synthétique est généré)")
+    parser.add_argument("--size", type=int, default=64, help="taille de l'export synthétique (Mo)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1],
+                        help="nombres de processus à mesurer en mode parallèle")
+    parser.add_argument("--skip-legacy", action="store_true", help="ne pas mesurer l'ancienne implémentation")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = args.file
+        if not file_path:
+            file_path = os.path.join(temp_dir, "dump.sql")
+            write_synthetic_dump(file_path, args.size)
+        size_bytes = os.path.getsize(file_path)
+        print(f"{file_path}: {size_bytes / 1024 / 1024:.1f} Mo, {os.cpu_count()} cœurs\n")
+
+        if not args.skip_legacy:
+            measure("regex (ancienne)", lambda: legacy_extract(file_path), size_bytes)
+        reference = measure("flux séquentiel", lambda: app_module.extract_schema_from_sql_file(
+            file_path, parallel=False), size_bytes)
+
+        for workers in sorted(set(args.workers)):
+            app_module.SQL_PARSE_WORKERS = workers
+            if app_module.sql_parse_pool is not None:
+                app_module.sql_parse_pool.shutdown()
+                app_module.sql_parse_pool = None
+            # Démarrer les processus avant la mesure (coût payé une seule fois par le serveur)
+            app_module.get_sql_parse_pool().submit(len, "").result()
+            shard_size = max(1024 * 1024, size_bytes // (workers * 4))
+            result = measure(f"mmap + {workers} processus", lambda: app_module.finalize_sql_schema(
+                app_module.parse_sql_file_parallel(file_path, shard_size=shard_size), file_path), size_bytes)
+            if result != reference:
+                print("  ! schéma différent de l'analyse séquentielle")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""Serveur local qui imite l'API d'inférence HuggingFace pour les tests de charge reproductibles.
+
+Il répond à POST /models/<chemin du modèle> pour tous les modèles utilisés par app_sql_pretrained.py.
+Les réponses sont synthétisées de façon déterministe ou rejouées depuis une cassette enregistrée.
+Le serveur peut aussi ajouter une latence tirée d'une distribution, des erreurs 503 « loading » et une limite de débit.
+
+Usage:
+    python mock_hf_server.py --port 8765 --latency lognormal:120:0.4 --loading-rate 0.02 --rate-limit 50
+    python mock_hf_server.py --record cassette.jsonl      # relaie vers l'API publique et enregistre
+    python mock_hf_server.py --replay cassette.jsonl --strict
+    HF_API_BASE_URL=http://127.0.0.1:8765 python app_sql_pretrained.py
+
+Distributions de latence (millisecondes): none, fixed:MS, uniform:MIN:MAX, normal:MOYENNE:ÉCART,
+lognormal:MÉDIANE:SIGMA. --model-latency MODELE=DISTRIBUTION remplace la distribution pour un modèle.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+
+import requests
+from flask import Flask, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import app_sql_pretrained as app_module
+
+# Configuration par défaut du serveur (remplacée par les options de la ligne de commande)
+MOCK_DEFAULTS = {
+    'latency': 'none',  # Distribution de latence par défaut
+    'model_latency': {},  # modèle -> distribution propre à ce modèle
+    'loading_rate': 0.0,  # Probabilité de répondre 503 « loading » à une requête
+    'loading_estimated_time': 2.0,  # Valeur de estimated_time des réponses 503 (secondes)
+    'cold_start': 0.0,  # Durée (secondes) pendant laquelle un modèle répond 503 après sa première requête
+    'rate_limit': 0.0,  # Requêtes par seconde acceptées, tous modèles confondus (0 = pas de limite)
+    'burst': 10,  # Requêtes acceptées d'un coup avant que la limite de débit ne s'applique
+    'replay': None,  # Cassette JSONL dont les réponses sont rejouées
+    'record': None,  # Cassette JSONL où enregistrer les réponses de l'API réelle
+    'upstream': app_module.HUGGINGFACE_PUBLIC_API_BASE_URL,  # API relayée en mode enregistrement
+    'strict': False,  # En rejeu, refuser les requêtes absentes de la cassette au lieu de les synthétiser
+    'recorded_latency': False,  # En rejeu, attendre la durée enregistrée plutôt que la distribution
+    'seed': None,  # Graine du générateur aléatoire (latences, erreurs injectées)
+}
+
+# Tous les modèles appelés par l'application
+KNOWN_MODELS = {
+    app_module.TRANSLATION_MODEL,
+    app_module.UNDERSTANDING_MODEL,
+    app_module.REFORMULATION_MODEL,
+    app_module.SCHEMA_EXTRACTION_MODEL,
+    app_module.LANGUAGE_UNDERSTANDING_MODEL,
+    app_module.MODEL_PATHS["text-to-sql"],
+    app_module.MODEL_PATHS["sql-correction"],
+}
+
+
+def parse_latency_spec(spec):
+    """Retourne une fonction (rng) -> latence en secondes pour une distribution « nom:paramètres »"""
+    name, _, args = spec.partition(":")
+    try:
+        values = [float(value) for value in args.split(":")] if args else []
+    except ValueError:
+        raise ValueError(f"Paramètres invalides pour la latence: {spec}")
+
+    expected = {'none': 0, 'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+    if name not in expected or len(values) != expected[name]:
+        raise ValueError(f"Distribution de latence inconnue: {spec}")
+
+    if name == 'none':
+        return lambda rng: 0.0
+    if name == 'fixed':
+        return lambda rng: values[0] / 1000
+    if name == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if name == 'normal':
+        return lambda rng: max(rng.gauss(values[0], values[1]), 0.0) / 1000
+    # lognormal: médiane en millisecondes et écart-type du logarithme
+    return lambda rng: rng.lognormvariate(math.log(values[0]), values[1]) / 1000
+
+
+def synthesize_one(model_path, text, parameters):
+    """Réponse déterministe d'un modèle pour une entrée, au format de l'API"""
+    text = text if isinstance(text, str) else json.dumps(text, ensure_ascii=False)
+
+    if model_path == app_module.TRANSLATION_MODEL:
+        translated = app_module.fallback_translate_fr_to_en(text)
+        return {'translation_text': translated[len("Generate SQL query: "):]}
+
+    if model_path == app_module.UNDERSTANDING_MODEL:
+        # Scores pseudo-aléatoires mais stables pour un même texte
+        labels = list(parameters.get('candidate_labels', [])) if parameters else []
+        weights = [int(hashlib.sha256(f"{text}|{label}".encode('utf-8')).hexdigest()[:8], 16) + 1
+                   for label in labels]
+        total = sum(weights) or 1
+        ranked = sorted(zip(labels, weights), key=lambda pair: -pair[1])
+        return {'sequence': text, 'labels': [label for label, _ in ranked],
+                'scores': [round(weight / total, 4) for _, weight in ranked]}
+
+    if model_path == app_module.REFORMULATION_MODEL:
+        match = re.search(r'Requête(?: originale)?: (.*)', text)
+        return {'summary_text': (match.group(1) if match else text.splitlines()[0]).strip()}
+
+    if model_path == app_module.SCHEMA_EXTRACTION_MODEL:
+        return {'generated_text': "Tables: [], Relations: []"}
+
+    if model_path == app_module.LANGUAGE_UNDERSTANDING_MODEL:
+        match = re.search(r'SQL clair: (.*)', text)
+        return {'generated_text': (match.group(1) if match else text.splitlines()[0]).strip()}
+
+    if model_path == app_module.MODEL_PATHS["sql-correction"]:
+        return {'generated_text': text[len("correct: "):] if text.startswith("correct: ") else text}
+
+    # Texte → SQL: une requête sur la première table du schéma du prompt
+    match = re.search(r'CREATE TABLE\s+["`\[]?(\w+)', text, re.IGNORECASE)
+    table = match.group(1) if match else "users"
+    return {'generated_text': f"SELECT * FROM {table} LIMIT 10"}
+
+
+def synthesize_sequences(model_path, text, parameters):
+    """Les N séquences d'une entrée (une seule sans num_return_sequences)"""
+    count = int(parameters.get('num_return_sequences', 1))
+    first = synthesize_one(model_path, text, parameters)
+    if count <= 1 or 'generated_text' not in first:
+        return [first]
+
+    # Variantes de la meilleure séquence, comme les faisceaux suivants d'une recherche en faisceau
+    query = first['generated_text'].replace(" LIMIT 10", "")
+    table = query.rsplit(" ", 1)[-1]
+    variants = [first['generated_text'], query, f"SELECT COUNT(*) FROM {table}", f"SELECT * FROM {table} LIMIT 1"]
+    return [{'generated_text': variants[index % len(variants)] + ("" if index < len(variants) else f" -- {index}")}
+            for index in range(count)]
+
+
+def synthesize_response(model_path, inputs, parameters):
+    """Réponse complète: une liste par entrée pour un lot, N séquences si num_return_sequences est demandé"""
+    parameters = parameters or {}
+
+    if model_path == app_module.UNDERSTANDING_MODEL:
+        return synthesize_one(model_path, inputs, parameters)
+
+    if isinstance(inputs, list):
+        # Lot: une réponse par entrée, ou la liste des N séquences de chaque entrée
+        if int(parameters.get('num_return_sequences', 1)) > 1:
+            return [synthesize_sequences(model_path, text, parameters) for text in inputs]
+        return [synthesize_one(model_path, text, parameters) for text in inputs]
+
+    return synthesize_sequences(model_path, inputs, parameters)
+
+
+def cassette_key(model_path, inputs, parameters):
+    """Clé d'une requête dans la cassette (la même que celle du cache de l'application pour l'API publique)"""
+    return app_module.make_cache_key(model_path, inputs, parameters, app_module.HUGGINGFACE_PUBLIC_API_BASE_URL)
+
+
+def load_cassette(path):
+    """Charge les réponses enregistrées {clé: entrée}; la dernière entrée d'une même clé l'emporte"""
+    entries = {}
+    with open(path, encoding='utf-8') as cassette:
+        for line in cassette:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry['key']] = entry
+    return entries
+
+
+class TokenBucket:
+    """Limite de débit: `rate` jetons par seconde, au plus `burst` jetons accumulés"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Retourne 0 si la requête est acceptée, sinon le délai (secondes) avant le prochain jeton"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+def create_mock_app(config=None):
+    """Construit l'application Flask du serveur simulé pour une configuration (voir MOCK_DEFAULTS)"""
+    config = dict(MOCK_DEFAULTS, **(config or {}))
+    rng = random.Random(config['seed'])
+    rng_lock = threading.Lock()
+    default_latency = parse_latency_spec(config['latency'])
+    model_latency = {model: parse_latency_spec(spec) for model, spec in config['model_latency'].items()}
+    bucket = TokenBucket(config['rate_limit'], config['burst']) if config['rate_limit'] > 0 else None
+    cassette = load_cassette(config['replay']) if config['replay'] else {}
+    record_lock = threading.Lock()
+    first_request_at = {}
+    stats = {'requests': 0, 'by_model': {}, 'by_status': {}, 'replayed': 0, 'synthesized': 0, 'recorded': 0}
+    stats_lock = threading.Lock()
+
+    mock_app = Flask(__name__)
+
+    def count(model_path, status):
+        with stats_lock:
+            stats['requests'] += 1
+            stats['by_model'][model_path] = stats['by_model'].get(model_path, 0) + 1
+            stats['by_status'][str(status)] = stats['by_status'].get(str(status), 0) + 1
+
+    def record(key, model_path, data, status, response, latency):
+        entry = {'key': key, 'model': model_path, 'inputs': data.get('inputs'),
+                 'parameters': data.get('parameters'), 'status': status, 'response': response,
+                 'latency_ms': round(latency * 1000, 1)}
+        with record_lock, open(config['record'], 'a', encoding='utf-8') as cassette_file:
+            cassette_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    @mock_app.route('/models/<path:model_path>', methods=['POST'])
+    def model_inference(model_path):
+        data = request.get_json(silent=True) or {}
+        inputs, parameters = data.get('inputs'), data.get('parameters')
+
+        if bucket is not None:
+            wait_time = bucket.take()
+            if wait_time:
+                count(model_path, 429)
+                response = jsonify({'error': "Rate limit reached. Please retry later."})
+                response.headers['Retry-After'] = str(math.ceil(wait_time))
+                return response, 429
+
+        # Modèle en cours de chargement: au démarrage (cold_start) ou au hasard (loading_rate)
+        with rng_lock:
+            first_request_at.setdefault(model_path, time.monotonic())
+            loading = (time.monotonic() - first_request_at[model_path] < config['cold_start']
+                       or rng.random() < config['loading_rate'])
+            latency = model_latency.get(model_path, default_latency)(rng)
+        if loading:
+            count(model_path, 503)
+            return jsonify({'error': f"Model {model_path} is currently loading",
+                            'estimated_time': config['loading_estimated_time']}), 503
+
+        key = cassette_key(model_path, inputs, parameters)
+
+        if config['record']:
+            # Relayer vers l'API réelle et enregistrer sa réponse
+            start = time.perf_counter()
+            upstream = requests.post(f"{config['upstream'].rstrip('/')}/models/{model_path}", json=data,
+                                     headers={name: value for name, value in request.headers.items()
+                                              if name.lower() in ('authorization', 'content-type')},
+                                     timeout=(app_module.HTTP_CONNECT_TIMEOUT, app_module.HTTP_READ_TIMEOUT))
+            try:
+                body = upstream.json()
+            except ValueError:
+                body = {'error': upstream.text}
+            if upstream.status_code == 200:
+                record(key, model_path, data, upstream.status_code, body, time.perf_counter() - start)
+                with stats_lock:
+                    stats['recorded'] += 1
+            count(model_path, upstream.status_code)
+            return jsonify(body), upstream.status_code
+
+        entry = cassette.get(key)
+        if entry is not None:
+            if config['recorded_latency']:
+                latency = entry.get('latency_ms', 0) / 1000
+            time.sleep(latency)
+            with stats_lock:
+                stats['replayed'] += 1
+            count(model_path, entry.get('status', 200))
+            return jsonify(entry['response']), entry.get('status', 200)
+
+        if config['strict'] and config['replay']:
+            count(model_path, 404)
+            return jsonify({'error': f"Requête absente de la cassette pour {model_path}"}), 404
+
+        if model_path not in KNOWN_MODELS:
+            count(model_path, 404)
+            return jsonify({'error': f"Model {model_path} does not exist"}), 404
+
+        time.sleep(latency)
+        with stats_lock:
+            stats['synthesized'] += 1
+        count(model_path, 200)
+        return jsonify(synthesize_response(model_path, inputs, parameters))
+
+    @mock_app.route('/__stats', methods=['GET'])
+    def mock_stats():
+        with stats_lock:
+            return jsonify(json.loads(json.dumps(stats)))
+
+    return mock_app
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Gestionnaire de requêtes sans journal d'accès (serveur démarré par les benchmarks)"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_mock_server(config=None, host="127.0.0.1", port=0, quiet=True):
+    """Démarre le serveur dans un thread et retourne (serveur, adresse de base); port 0 = port libre"""
+    server = make_server(host, port, create_mock_app(config), threaded=True,
+                         request_handler=QuietRequestHandler if quiet else None)
+    thread = threading.Thread(target=server.serve_forever, name="mock-hf-server", daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default=MOCK_DEFAULTS['latency'], help="distribution de latence par défaut")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODELE=DISTRIBUTION",
+                        help="distribution de latence d'un modèle (option répétable)")
+    parser.add_argument("--loading-rate", type=float, default=MOCK_DEFAULTS['loading_rate'],
+                        help="probabilité d'une réponse 503 « loading »")
+    parser.add_argument("--loading-estimated-time", type=float, default=MOCK_DEFAULTS['loading_estimated_time'])
+    parser.add_argument("--cold-start", type=float, default=MOCK_DEFAULTS['cold_start'],
+                        help="secondes de 503 après la première requête de chaque modèle")
+    parser.add_argument("--rate-limit", type=float, default=MOCK_DEFAULTS['rate_limit'],
+                        help="requêtes par seconde acceptées (429 au-delà)")
+    parser.add_argument("--burst", type=int, default=MOCK_DEFAULTS['burst'])
+    parser.add_argument("--replay", help="cassette JSONL à rejouer")
+    parser.add_argument("--record", help="cassette JSONL où enregistrer les réponses de l'API réelle")
+    parser.add_argument("--upstream", default=MOCK_DEFAULTS['upstream'], help="API relayée avec --record")
+    parser.add_argument("--strict", action="store_true", help="refuser les requêtes absentes de la cassette")
+    parser.add_argument("--recorded-latency", action="store_true", help="rejouer la latence enregistrée")
+    parser.add_argument("--seed", type=int, help="graine des tirages aléatoires")
+    args = parser.parse_args()
+
+    try:
+        model_latency = dict(item.split("=", 1) for item in args.model_latency)
+        config = {
+            'latency': args.latency, 'model_latency': model_latency, 'loading_rate': args.loading_rate,
+            'loading_estimated_time': args.loading_estimated_time, 'cold_start': args.cold_start,
+            'rate_limit': args.rate_limit, 'burst': args.burst, 'replay': args.replay, 'record': args.record,
+            'upstream': args.upstream, 'strict': args.strict, 'recorded_latency': args.recorded_latency,
+            'seed': args.seed,
+        }
+        mock_app = create_mock_app(config)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"Serveur d'inférence simulé sur http://{args.host}:{args.port} "
+          f"(HF_API_BASE_URL=http://{args.host}:{args.port})")
+    make_server(args.host, args.port, mock_app, threaded=True).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Génère les requêtes SQL d'un lot de descriptions hors ligne, avec le pipeline de /process.
+
+Le fichier d'entrée est une liste JSON ou un fichier JSONL (une chaîne ou un objet {"text", "id"} par ligne).
+Chaque résultat est écrit sur une ligne JSON dès qu'il est prêt, suivi d'une ligne de résumé.
+
+Usage:
+    python process_batch.py questions.jsonl > resultats.jsonl
+    python process_batch.py questions.json --schema base.sql --concurrency 8 --output resultats.jsonl
+    cat questions.jsonl | python process_batch.py -
+"""
+import argparse
+import json
+import os
+import sys
+
+import app_sql_pretrained as app_module
+
+
+def read_items(path):
+    """Lit les descriptions du fichier (ou de l'entrée standard si path vaut « - »)"""
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with stream:
+        content = stream.read()
+
+    if content.lstrip().startswith("["):
+        return app_module.parse_batch_items(json.loads(content))
+    return app_module.parse_batch_lines(content.splitlines())
+
+
+def load_schema_file(path):
+    """Analyse un fichier de schéma (.sql, .json, .csv) et retourne son schéma compilé"""
+    schema_info = app_module.extract_schema_from_uploaded_file(path, os.path.basename(path))
+    schema_id = app_module.register_schema(schema_info)
+    return app_module.get_compiled_schema(schema_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="fichier JSON ou JSONL de descriptions (« - » pour l'entrée standard)")
+    parser.add_argument("--schema", help="fichier de schéma utilisé comme schéma personnalisé")
+    parser.add_argument("--output", help="fichier JSONL de sortie (sortie standard par défaut)")
+    parser.add_argument("--concurrency", type=int, default=app_module.BATCH_CONCURRENCY,
+                        help="descriptions traitées en même temps")
+    parser.add_argument("--candidates", type=int, default=app_module.SQL_CANDIDATES_DEFAULT,
+                        help="requêtes candidates demandées au modèle par description")
+    parser.add_argument("--candidate-budget-ms", type=int, default=app_module.SQL_CANDIDATE_BUDGET_MS,
+                        help="temps de vérification des candidates (millisecondes)")
+    args = parser.parse_args()
+
+    try:
+        items = read_items(args.input)
+    except ValueError as e:
+        parser.error(str(e))
+    compiled_schema = load_schema_file(args.schema) if args.schema else None
+    candidates, candidate_budget_ms = app_module.parse_candidate_options({
+        "candidates": args.candidates, "candidate_budget_ms": args.candidate_budget_ms,
+    })
+    concurrency = min(max(args.concurrency, 1), app_module.BATCH_MAX_WORKERS)
+
+    # Les messages du pipeline vont sur la sortie d'erreur pour ne pas mélanger les lignes JSONL
+    real_stdout = sys.stdout
+    output = open(args.output, "w", encoding="utf-8") if args.output else real_stdout
+    sys.stdout = sys.stderr
+    try:
+        for line in app_module.iter_batch_results(items, compiled_schema, concurrency,
+                                                  candidates, candidate_budget_ms):
+            output.write(json.dumps(line, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        sys.stdout = real_stdout
+        if output is not real_stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -253,9 +253,252 @@ document.addEventListener("DOMContentLoaded", function () {
       return;
     }
 
-    processRequest(text);
+    processRequestStream(text);
   });
 
+  // Fonction pour afficher le schéma, l'analyse et la traduction si disponibles
+  function renderPipelineDetails(data) {
+    if (data.has_schema || data.understood_text || data.translated_text) {
+      // Créer ou récupérer le conteneur de traduction
+      let translationContainer = document.getElementById(
+        "translation-container"
+      );
+      if (!translationContainer) {
+        translationContainer = document.createElement("div");
+        translationContainer.id = "translation-container";
+        translationContainer.className = "translation-container";
+
+        // Insérer avant la zone de résultat
+        resultBox.parentNode.insertBefore(translationContainer, resultBox);
+      }
+
+      // Préparer le contenu HTML
+      let contentHTML = "";
+
+      // Ajouter les informations de schéma si disponibles
+      if (data.has_schema) {
+        contentHTML += `
+          <div class="schema-info">
+            <h4>Schéma détecté:</h4>
+            <div class="schema-content">
+        `;
+
+        // Ajouter les tables
+        if (data.schema_info.tables && data.schema_info.tables.length > 0) {
+          contentHTML += `<div class="schema-tables">`;
+          data.schema_info.tables.forEach((table) => {
+            contentHTML += `<div class="schema-table">
+              <span class="table-name">${table}</span>
+              <span class="table-columns">(`;
+
+            // Ajouter les colonnes de la table
+            if (
+              data.schema_info.columns[table] &&
+              data.schema_info.columns[table].length > 0
+            ) {
+              contentHTML += data.schema_info.columns[table].join(", ");
+            } else {
+              contentHTML += "id, name";
+            }
+
+            contentHTML += `)</span>
+            </div>`;
+          });
+          contentHTML += `</div>`;
+        }
+
+        // Ajouter les relations
+        if (
+          data.schema_info.relations &&
+          data.schema_info.relations.length > 0
+        ) {
+          contentHTML += `<div class="schema-relations">
+            <span class="relations-title">Relations:</span>
+            <ul>`;
+
+          data.schema_info.relations.forEach((relation) => {
+            contentHTML += `<li>${relation}</li>`;
+          });
+
+          contentHTML += `</ul>
+          </div>`;
+        }
+
+        contentHTML += `
+            </div>
+          </div>
+        `;
+      }
+
+      // Ajouter l'analyse des intentions si disponible
+      if (
+        data.understood_text &&
+        data.understood_text !== data.original_text
+      ) {
+        contentHTML += `
+          <div class="understanding-info">
+            <h4>Analyse des intentions:</h4>
+            <div class="understanding-text">${data.understood_text}</div>
+          </div>
+        `;
+      }
+
+      // Ajouter la traduction si disponible
+      if (data.translated_text) {
+        contentHTML += `
+          <div class="translation-info">
+            <h4>Traduction utilisée:</h4>
+            <div class="translation-text">${data.translated_text}</div>
+          </div>
+        `;
+      }
+
+      // Afficher le contenu
+      translationContainer.innerHTML = contentHTML;
+    }
+  }
+
+  // Fonction pour préparer la section de graphiques après une génération
+  function updateChartSection(result, detectedType) {
+    // Stocker le résultat SQL pour une utilisation ultérieure avec les graphiques
+    sqlResult = result;
+
+    // Afficher la section de graphiques uniquement pour les requêtes SELECT
+    if (detectedType === "SELECT") {
+      // Les données du graphique précédent ne correspondent plus à la nouvelle requête
+      chartDataInput.value = "";
+      extractFieldsFromSQL(sqlResult);
+      chartSection.style.display = "block";
+    } else {
+      // Masquer la section de graphiques pour les autres types de requêtes
+      chartSection.style.display = "none";
+    }
+  }
+
+  // Fonction pour envoyer la requête au serveur en recevant chaque étape dès qu'elle est prête (SSE)
+  function processRequestStream(text) {
+    // Navigateurs sans lecture de flux: utiliser la route classique
+    if (!window.ReadableStream || !window.TextDecoder) {
+      processRequest(text);
+      return;
+    }
+
+    resultBox.textContent = "Traitement en cours...";
+
+    // Détails accumulés au fil des événements, réaffichés à chaque étape
+    const details = { original_text: text };
+    let query = "";
+
+    const handlers = {
+      schema: (data) => {
+        details.has_schema = data.has_schema;
+        details.schema_info = data.schema_info;
+        renderPipelineDetails(details);
+      },
+      intent: (data) => {
+        if (data.intent) {
+          resultBox.textContent = `Traitement en cours... (${data.intent})`;
+        }
+      },
+      reformulation: (data) => {
+        details.understood_text = data.understood_text;
+        renderPipelineDetails(details);
+      },
+      translation: (data) => {
+        details.translated_text = data.translated_text;
+        renderPipelineDetails(details);
+      },
+      sql: (data) => {
+        query = data.query;
+        resultBox.textContent = query;
+        if (data.detected_type) {
+          detectedTypeSpan.innerHTML = `Type détecté : <strong>${data.detected_type}</strong>`;
+        }
+      },
+      explanation: (data) => {
+        resultBox.textContent = query + data.explanation;
+      },
+      done: (data) => {
+        resultBox.textContent = data.result;
+        updateChartSection(data.result, data.detected_type);
+
+        // La session ne peut pas être modifiée pendant le flux: enregistrer l'historique ensuite
+        fetch("/history", {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+          },
+          body: JSON.stringify({
+            description: text,
+            query: data.result,
+            type: data.detected_type,
+            advanced_options: data.advanced_options,
+          }),
+        })
+          .then((response) => response.json())
+          .then((historyData) => updateHistoryList(historyData.history));
+      },
+      error: (data) => {
+        resultBox.textContent = `Erreur: ${data.message}`;
+      },
+    };
+
+    // Analyser un bloc SSE ("event: ...\ndata: ...")
+    function dispatchEvent(block) {
+      let eventName = "message";
+      let dataText = "";
+      block.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) {
+          eventName = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+          dataText += line.slice(5).trim();
+        }
+      });
+      if (handlers[eventName] && dataText) {
+        handlers[eventName](JSON.parse(dataText));
+      }
+    }
+
+    fetch("/process_stream", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ text }),
+    })
+      .then((response) => {
+        if (!response.ok || !response.body) {
+          throw new Error("Erreur réseau");
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+
+        function read() {
+          return reader.read().then(({ done, value }) => {
+            if (done) {
+              return;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            // Les événements sont séparés par une ligne vide
+            let separatorIndex;
+            while ((separatorIndex = buffer.indexOf("\n\n")) !== -1) {
+              dispatchEvent(buffer.slice(0, separatorIndex));
+              buffer = buffer.slice(separatorIndex + 2);
+            }
+            return read();
+          });
+        }
+
+        return read();
+      })
+      .catch((error) => {
+        resultBox.textContent = `Erreur: ${error.message}`;
+      });
+  }
+
   // Fonction pour envoyer la requête au serveur
   function processRequest(text) {
     // Afficher un indicateur de chargement
@@ -298,116 +541,10 @@ document.addEventListener("DOMContentLoaded", function () {
         }
 
         // Afficher le schéma, l'analyse et la traduction si disponibles
-        if (data.has_schema || data.understood_text || data.translated_text) {
-          // Créer ou récupérer le conteneur de traduction
-          let translationContainer = document.getElementById(
-            "translation-container"
-          );
-          if (!translationContainer) {
-            translationContainer = document.createElement("div");
-            translationContainer.id = "translation-container";
-            translationContainer.className = "translation-container";
-
-            // Insérer avant la zone de résultat
-            resultBox.parentNode.insertBefore(translationContainer, resultBox);
-          }
-
-          // Préparer le contenu HTML
-          let contentHTML = "";
-
-          // Ajouter les informations de schéma si disponibles
-          if (data.has_schema) {
-            contentHTML += `
-              <div class="schema-info">
-                <h4>Schéma détecté:</h4>
-                <div class="schema-content">
-            `;
-
-            // Ajouter les tables
-            if (data.schema_info.tables && data.schema_info.tables.length > 0) {
-              contentHTML += `<div class="schema-tables">`;
-              data.schema_info.tables.forEach((table) => {
-                contentHTML += `<div class="schema-table">
-                  <span class="table-name">${table}</span>
-                  <span class="table-columns">(`;
-
-                // Ajouter les colonnes de la table
-                if (
-                  data.schema_info.columns[table] &&
-                  data.schema_info.columns[table].length > 0
-                ) {
-                  contentHTML += data.schema_info.columns[table].join(", ");
-                } else {
-                  contentHTML += "id, name";
-                }
-
-                contentHTML += `)</span>
-                </div>`;
-              });
-              contentHTML += `</div>`;
-            }
-
-            // Ajouter les relations
-            if (
-              data.schema_info.relations &&
-              data.schema_info.relations.length > 0
-            ) {
-              contentHTML += `<div class="schema-relations">
-                <span class="relations-title">Relations:</span>
-                <ul>`;
-
-              data.schema_info.relations.forEach((relation) => {
-                contentHTML += `<li>${relation}</li>`;
-              });
-
-              contentHTML += `</ul>
-              </div>`;
-            }
-
-            contentHTML += `
-                </div>
-              </div>
-            `;
-          }
-
-          // Ajouter l'analyse des intentions si disponible
-          if (
-            data.understood_text &&
-            data.understood_text !== data.original_text
-          ) {
-            contentHTML += `
-              <div class="understanding-info">
-                <h4>Analyse des intentions:</h4>
-                <div class="understanding-text">${data.understood_text}</div>
-              </div>
-            `;
-          }
-
-          // Ajouter la traduction si disponible
-          if (data.translated_text) {
-            contentHTML += `
-              <div class="translation-info">
-                <h4>Traduction utilisée:</h4>
-                <div class="translation-text">${data.translated_text}</div>
-              </div>
-            `;
-          }
+        renderPipelineDetails(data);
 
-          // Afficher le contenu
-          translationContainer.innerHTML = contentHTML;
-        }
-
-        // Stocker le résultat SQL pour une utilisation ultérieure avec les graphiques
-        sqlResult = data.result;
-
-        // Afficher la section de graphiques uniquement pour les requêtes SELECT
-        if (data.detected_type === "SELECT") {
-          extractFieldsFromSQL(sqlResult);
-          chartSection.style.display = "block";
-        } else {
-          // Masquer la section de graphiques pour les autres types de requêtes
-          chartSection.style.display = "none";
-        }
+        // Stocker le résultat SQL et afficher la section de graphiques si nécessaire
+        updateChartSection(data.result, data.detected_type);
 
         // Mettre à jour l'historique
         if (data.history) {
@@ -638,8 +775,8 @@ document.addEventListener("DOMContentLoaded", function () {
   generateChartBtn.addEventListener("click", function () {
     // Vérifier si nous avons des données pour le graphique
     if (!chartDataInput.value.trim()) {
-      // Si pas de données, générer des données d'exemple basées sur les champs
-      generateSampleChartData();
+      // Si pas de données, exécuter la requête sur le schéma importé (données d'exemple à défaut)
+      loadQueryResultChartData();
     } else {
       // Sinon, utiliser les données existantes
       createChart();
@@ -651,6 +788,74 @@ document.addEventListener("DOMContentLoaded", function () {
     createChart();
   });
 
+  // Fonction pour exécuter la requête générée et utiliser son résultat comme données du graphique
+  function loadQueryResultChartData() {
+    if (!sqlResult) {
+      generateSampleChartData();
+      return;
+    }
+
+    fetch("/execute", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ query: sqlResult }),
+    })
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error("Erreur réseau");
+        }
+        return response.json();
+      })
+      .then((data) => {
+        if (!data.success) {
+          // Pas de schéma importé ou requête non exécutable: garder le graphique d'exemple
+          console.warn("Exécution impossible:", data.message);
+          generateSampleChartData();
+          return;
+        }
+
+        if (data.rows.length === 0) {
+          alert("La requête ne retourne aucune ligne.");
+          return;
+        }
+
+        // Choisir les axes parmi les colonnes retournées si les champs actuels n'en font pas partie
+        const firstNumber = data.column_types.indexOf("number");
+        const firstText = data.column_types.indexOf("text");
+        if (!data.columns.includes(chartLabelsInput.value)) {
+          chartLabelsInput.value = data.columns[firstText >= 0 ? firstText : 0];
+        }
+        if (!data.columns.includes(chartValuesInput.value)) {
+          chartValuesInput.value =
+            data.columns[firstNumber >= 0 ? firstNumber : data.columns.length - 1];
+        }
+        updateFieldSelectors(data.columns);
+
+        // Convertir les lignes en objets {colonne: valeur}
+        const rows = data.rows.map((row) => {
+          const item = {};
+          data.columns.forEach((column, index) => {
+            item[column] = row[index];
+          });
+          return item;
+        });
+
+        chartDataInput.value = JSON.stringify(rows, null, 2);
+        if (data.truncated) {
+          console.info(
+            `Résultat tronqué: seules les ${data.row_count} premières lignes sont affichées.`
+          );
+        }
+        createChart();
+      })
+      .catch((error) => {
+        console.error("Erreur lors de l'exécution de la requête:", error);
+        generateSampleChartData();
+      });
+  }
+
   // Fonction pour générer des données d'exemple pour le graphique
   function generateSampleChartData() {
     const labels = chartLabelsInput.value.trim();
@@ -1304,6 +1509,15 @@ document.addEventListener("DOMContentLoaded", function () {
         body: formData,
       })
         .then((response) => response.json())
+        .then((data) => {
+          if (data.success && !data.has_schema) {
+            // Analyse en cours côté serveur: suivre la tâche
+            uploadResult.className = "upload-result";
+            uploadResult.textContent = data.message;
+            return pollUploadStatus(data.job_id);
+          }
+          return data;
+        })
         .then((data) => {
           if (data.success) {
             // Afficher le message de succès
@@ -1325,6 +1539,31 @@ document.addEventListener("DOMContentLoaded", function () {
         });
     });
 
+    // Interroger /upload_status jusqu'à la fin de l'analyse, en affichant la progression
+    function pollUploadStatus(jobId) {
+      return new Promise((resolve, reject) => {
+        function poll() {
+          fetch(`/upload_status/${jobId}`)
+            .then((response) => response.json())
+            .then((data) => {
+              const job = data.job;
+              if (!data.success || !job || job.status === "completed") {
+                resolve(data);
+                return;
+              }
+
+              const percent = job.bytes_total
+                ? Math.round((100 * job.bytes_read) / job.bytes_total)
+                : 0;
+              uploadResult.textContent = `Analyse du fichier en cours... ${percent} % (${job.elapsed} s)`;
+              setTimeout(poll, 500);
+            })
+            .catch(reject);
+        }
+        poll();
+      });
+    }
+
     // Charger le schéma existant au chargement de la page
     fetch("/get_custom_schema")
       .then((response) => response.json())
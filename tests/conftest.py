@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Les tests importent app_sql_pretrained depuis la racine du dépôt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_sql_pretrained as app_module  # noqa: E402
+
+
+@pytest.fixture
+def isolated_cache(tmp_path, monkeypatch):
+    """Dirige le cache des réponses vers un répertoire temporaire vide"""
+    cache_folder = tmp_path / "cache"
+    monkeypatch.setattr(app_module, "CACHE_FOLDER", str(cache_folder))
+    monkeypatch.setattr(app_module, "HF_CACHE_DB_PATH", str(cache_folder / "hf_responses.sqlite3"))
+    app_module.response_cache.clear()
+    yield cache_folder
+    app_module.response_cache.clear()
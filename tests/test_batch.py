@@ -0,0 +1,51 @@
+"""Lecture des lots de descriptions (parse_batch_lines) et découpage des réponses groupées"""
+import pytest
+
+import app_sql_pretrained as app_module
+
+
+def test_parse_batch_lines_accepts_objects_strings_and_raw_text():
+    lines = [b'{"text": "liste des clients", "id": 7}\n', '"total des ventes"\n', '   \n', 'texte brut\r\n']
+
+    assert app_module.parse_batch_lines(lines) == [
+        {'text': 'liste des clients', 'id': 7},
+        {'text': 'total des ventes', 'id': None},
+        {'text': 'texte brut', 'id': None}
+    ]
+
+
+def test_parse_batch_lines_decodes_utf8_bytes():
+    assert app_module.parse_batch_lines(['{"text": "élèves"}'.encode('utf-8')]) == [{'text': 'élèves', 'id': None}]
+
+
+@pytest.mark.parametrize("line", ['{"text": ""}', '{"id": 1}', '{"text": 3}', '42', '["a"]'])
+def test_parse_batch_lines_rejects_invalid_items(line):
+    with pytest.raises(ValueError, match="Élément 2"):
+        app_module.parse_batch_lines(['"ok"', line])
+
+
+def test_parse_batch_lines_limits_batch_size(monkeypatch):
+    monkeypatch.setattr(app_module, 'BATCH_MAX_ITEMS', 2)
+
+    assert len(app_module.parse_batch_lines(['a', 'b'])) == 2
+    with pytest.raises(ValueError, match="Lot trop grand"):
+        app_module.parse_batch_lines(['a', 'b', 'c'])
+
+
+def test_split_batched_response_one_answer_per_input():
+    result = [{'translation_text': 'a'}, [{'translation_text': 'b'}]]
+    assert app_module.split_batched_response(result, 2) == [[{'translation_text': 'a'}], [{'translation_text': 'b'}]]
+
+
+def test_split_batched_response_groups_flat_sequences():
+    flat = [{'generated_text': text} for text in ('a1', 'a2', 'b1', 'b2', 'c1', 'c2')]
+
+    assert app_module.split_batched_response(flat, 3, sequences=2) == [flat[0:2], flat[2:4], flat[4:6]]
+    # Déjà groupées par entrée
+    grouped = [flat[0:2], flat[2:4], flat[4:6]]
+    assert app_module.split_batched_response(grouped, 3, sequences=2) == grouped
+
+
+@pytest.mark.parametrize("result", [None, {'error': 'Model is loading'}, [{'generated_text': 'a'}]])
+def test_split_batched_response_unexpected_shapes(result):
+    assert app_module.split_batched_response(result, 2, sequences=2) == [None, None]
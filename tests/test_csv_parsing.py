@@ -0,0 +1,81 @@
+"""Analyse des fichiers CSV (sniff_csv_format, infer_csv_column_type, extract_schema_from_csv_file)"""
+import pytest
+
+import app_sql_pretrained as app_module
+
+
+@pytest.mark.parametrize("delimiter", [',', ';', '\t', '|'])
+def test_delimiter_and_header_are_detected(tmp_path, delimiter):
+    rows = [["Id", "Montant TTC", "Date vente", "Client"], ["1", "10.5", "02/01/2024", "Ana"],
+            ["2", "3", "03/02/2024", "Léo"], ["3", "7.25", "04/03/2024", "Zoé"]]
+    path = tmp_path / "ventes-2024.csv"
+    path.write_text("\n".join(delimiter.join(row) for row in rows) + "\n", encoding='utf-8')
+
+    schema = app_module.extract_schema_from_csv_file(str(path))
+
+    assert schema['tables'] == {'ventes_2024': ['id', 'montant_ttc', 'date_vente', 'client']}
+    assert schema['column_types']['ventes_2024'] == {
+        'id': 'INTEGER', 'montant_ttc': 'REAL', 'date_vente': 'DATE', 'client': 'TEXT'}
+    assert schema['column_stats']['ventes_2024']['rows'] == 3
+
+
+def test_file_without_header_gets_numbered_columns(tmp_path):
+    path = tmp_path / "mesures.csv"
+    path.write_text("1,2.5\n2,3.5\n3,4.5\n")
+
+    schema = app_module.extract_schema_from_csv_file(str(path))
+
+    assert schema['tables'] == {'mesures': ['column_1', 'column_2']}
+    assert schema['column_types']['mesures'] == {'column_1': 'INTEGER', 'column_2': 'REAL'}
+    assert schema['column_stats']['mesures']['rows'] == 3
+
+
+def test_column_type_tolerates_a_few_outliers():
+    values = [str(index) for index in range(99)] + ['n/a']
+    assert app_module.infer_csv_column_type(values) == ('INTEGER', 0.99, {'int': 99, 'float': 99})
+
+    values = [str(index) for index in range(90)] + ['texte'] * 10
+    column_type, confidence, _ = app_module.infer_csv_column_type(values)
+    assert (column_type, confidence) == ('TEXT', 0.1)
+
+
+def test_column_type_of_dates_booleans_and_empty_columns():
+    assert app_module.infer_csv_column_type(['2024-01-02 10:00', '2024-01-03 11:30'])[0] == 'TIMESTAMP'
+    assert app_module.infer_csv_column_type(['oui', 'non', 'Oui', ''])[0] == 'BOOLEAN'
+    assert app_module.infer_csv_column_type(['', '  ']) == (None, 0.0, {})
+
+
+def test_column_names_are_normalized_and_unique():
+    assert app_module.normalize_csv_columns(['Nom', 'nom', '', '2024', 'Prix (€)']) == \
+        ['nom', 'nom_2', 'column_3', 'column_2024', 'prix']
+
+
+def test_reservoir_sample_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'CSV_SAMPLE_SIZE', 10)
+    path = tmp_path / "journal.csv"
+    path.write_text("id,message\n" + "".join(f"{index},ligne {index}\n" for index in range(500)))
+
+    progress = []
+    schema = app_module.extract_schema_from_csv_file(str(path), on_progress=progress.append)
+
+    stats = schema['column_stats']['journal']
+    assert (stats['rows'], stats['sampled_rows']) == (500, 10)
+    assert progress[-1] == path.stat().st_size
+
+
+def test_quoted_fields_with_delimiters_and_newlines(tmp_path):
+    path = tmp_path / "notes.csv"
+    path.write_text('id,texte\n1,"a, b"\n2,"ligne\nsuivante"\n3,"dit ""bonjour"""\n')
+
+    schema = app_module.extract_schema_from_csv_file(str(path))
+
+    assert schema['tables'] == {'notes': ['id', 'texte']}
+    assert schema['column_stats']['notes']['rows'] == 3
+
+
+def test_empty_file_gets_default_schema(tmp_path):
+    path = tmp_path / "vide.csv"
+    path.write_text("")
+
+    schema = app_module.extract_schema_from_csv_file(str(path))
+    assert schema['tables'] == {'vide': ['id', 'name', 'description', 'created_at']}
@@ -0,0 +1,84 @@
+"""Lecture des tuples des INSERT (iter_insert_rows) et chargement dans la base d'exécution"""
+import io
+import sqlite3
+
+import pytest
+
+import app_sql_pretrained as app_module
+
+DUMP = (
+    "-- Data for table users\n"
+    "INSERT INTO `users` (`id`, `name`, `bio`) VALUES\n"
+    "(1, 'Ana', 'a;b (entre parenthèses)'),\n"
+    "(2, 'L\\'équipe', \"double \"\"guillemet\"\"\"),\n"
+    "(3, 'Zoé', NULL);\n"
+    "CREATE TABLE logs (id INT, message TEXT);\n"
+    "INSERT INTO logs VALUES (10, 'x'), (11, 'y') ON DUPLICATE KEY UPDATE message = VALUES(message);\n"
+    "INSERT IGNORE INTO logs VALUES (12, -1.5e3), (13, TRUE)\n"
+)
+
+EXPECTED_ROWS = [
+    ('users', ('id', 'name', 'bio'), [1, 'Ana', 'a;b (entre parenthèses)']),
+    ('users', ('id', 'name', 'bio'), [2, "L'équipe", 'double "guillemet"']),
+    ('users', ('id', 'name', 'bio'), [3, 'Zoé', None]),
+    ('logs', None, [10, 'x']),
+    ('logs', None, [11, 'y']),
+    ('logs', None, [12, -1500.0]),
+    ('logs', None, [13, 1]),
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 17, 4096])
+def test_rows_do_not_depend_on_chunk_size(chunk_size):
+    rows = list(app_module.iter_insert_rows(io.BytesIO(DUMP.encode('utf-8')), chunk_size=chunk_size))
+    assert rows == EXPECTED_ROWS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4096])
+def test_unparsable_tuple_is_skipped_alone(chunk_size):
+    dump = b"INSERT INTO t (a, b) VALUES (1, 'x'), (CONCAT('a', 'b'), 2), (3, NOW()), (4, 'z');\n" \
+           b"INSERT INTO u VALUES (5);"
+    skipped = []
+
+    rows = list(app_module.iter_insert_rows(io.BytesIO(dump), chunk_size=chunk_size, on_skip=skipped.append))
+
+    assert rows == [('t', ('a', 'b'), [1, 'x']), ('t', ('a', 'b'), [3, 'NOW()']),
+                    ('t', ('a', 'b'), [4, 'z']), ('u', None, [5])]
+    assert skipped == ['t']
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4096])
+def test_unparsable_last_tuple_skips_rest_of_statement(chunk_size):
+    dump = b"INSERT INTO t VALUES (1), (CONCAT('a;', ')')) ON DUPLICATE KEY UPDATE a = 1;\nINSERT INTO t VALUES (2);"
+    skipped = []
+
+    rows = list(app_module.iter_insert_rows(io.BytesIO(dump), chunk_size=chunk_size, on_skip=skipped.append))
+
+    assert rows == [('t', None, [1]), ('t', None, [2])]
+    assert skipped == ['t']
+
+
+def test_find_sql_tuple_end():
+    buffer = "(CONCAT('a', ')'), 2), (3)"
+    assert app_module.find_sql_tuple_end(buffer, 0) == (buffer.index(', (3)') + 1, True)
+    assert app_module.find_sql_tuple_end("  (f(1)) ;", 0) == (len("  (f(1))"), False)
+    assert app_module.find_sql_tuple_end("(f('a", 0) is None  # chaîne coupée: attendre la suite
+    assert app_module.find_sql_tuple_end("(f(1))", 0) is None  # séparateur pas encore lu
+    assert app_module.find_sql_tuple_end("(f(1)), ", 0) is None  # tuple suivant pas encore lu
+
+
+def test_bulk_load_sql_inserts(tmp_path):
+    path = tmp_path / "shop.sql"
+    path.write_text(DUMP + ";\nINSERT INTO unknown VALUES (1);\nINSERT INTO users (id, name) VALUES (4, 'Eve', 'x');\n",
+                    encoding='utf-8')
+    schema_info = {'tables': {'users': ['id', 'name', 'bio'], 'logs': ['id', 'message']}}
+
+    db = sqlite3.connect(":memory:", isolation_level=None)
+    for statement in app_module.build_sandbox_ddl(schema_info):
+        db.execute(statement)
+    stats = app_module.bulk_load_sql_inserts(db, schema_info, str(path))
+
+    assert stats['rows_loaded'] == 7
+    assert stats['rows_skipped'] == 2  # table inconnue, nombre de valeurs incorrect
+    assert stats['tables'] == {'users': 3, 'logs': 4}
+    assert db.execute("SELECT name FROM users ORDER BY id").fetchall() == [('Ana',), ("L'équipe",), ('Zoé',)]
@@ -0,0 +1,103 @@
+"""Analyse en flux des fichiers JSON (JsonStreamReader, iter_json_events, extract_schema_from_json_file)"""
+import io
+import json
+
+import pytest
+
+import app_sql_pretrained as app_module
+
+SHOP_DOCUMENT = {
+    "users": [
+        {"id": 1, "name": "Ana", "created_at": "2024-01-02", "score": 1.5, "vip": True},
+        {"id": 2, "name": "Léo", "created_at": "2024-02-03", "score": 2, "tags": ["a"]}
+    ],
+    "orders": [
+        {"user_id": 1, "id": 10, "paid_at": "2024-01-02T10:00:00Z", "total": None}
+    ],
+    "settings": {"currency": "EUR"}
+}
+
+
+def read_events(document, chunk_size):
+    reader = app_module.JsonStreamReader(io.BytesIO(document.encode('utf-8')), chunk_size=chunk_size)
+    return list(app_module.iter_json_events(reader))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_events_do_not_depend_on_chunk_size(chunk_size):
+    events = read_events(json.dumps(SHOP_DOCUMENT, ensure_ascii=False), chunk_size)
+
+    assert events == [
+        ('record', 'users', SHOP_DOCUMENT['users'][0]),
+        ('record', 'users', SHOP_DOCUMENT['users'][1]),
+        ('record', 'orders', SHOP_DOCUMENT['orders'][0]),
+        ('value', 'settings', {"currency": "EUR"})
+    ]
+
+
+def test_numbers_split_across_chunks():
+    events = read_events('[{"a": 12345.678}, {"a": -1e10}]', 1)
+    assert [value['a'] for _, _, value in events] == [12345.678, -1e10]
+
+
+def test_root_array_and_empty_documents():
+    assert read_events(' [ {"id": 1} ] ', 2) == [('record', None, {"id": 1})]
+    assert read_events('[]', 1) == []
+    assert read_events('{}', 1) == []
+
+
+def test_invalid_document_raises_value_error():
+    with pytest.raises(ValueError):
+        read_events('[{"id": 1} {"id": 2}]', 4)
+
+
+def test_extract_schema_from_json_file(tmp_path):
+    path = tmp_path / "shop.json"
+    path.write_text(json.dumps(SHOP_DOCUMENT), encoding='utf-8')
+
+    schema = app_module.extract_schema_from_json_file(str(path))
+
+    assert schema['tables'] == {
+        'users': ['id', 'name', 'created_at', 'score', 'vip', 'tags'],
+        'orders': ['id', 'user_id', 'paid_at', 'total'],
+        'settings': ['currency']
+    }
+    assert schema['column_types']['users'] == {
+        'id': 'INTEGER', 'name': 'TEXT', 'created_at': 'DATE', 'score': 'REAL', 'vip': 'BOOLEAN', 'tags': 'JSON'}
+    assert schema['column_types']['orders']['paid_at'] == 'TIMESTAMP'
+    assert 'total' not in schema['column_types']['orders']  # toujours nulle
+    assert schema['column_stats']['users']['columns']['tags']['null_ratio'] == 0.5
+
+
+def test_relations_from_table_id_columns(tmp_path):
+    path = tmp_path / "shop.json"
+    path.write_text(json.dumps({"customer": [{"id": 1}], "invoice": [{"id": 1, "customer_id": 1}]}))
+
+    schema = app_module.extract_schema_from_json_file(str(path))
+    assert schema['relations'] == [
+        {'table1': 'invoice', 'column1': 'customer_id', 'table2': 'customer', 'column2': 'id'}]
+
+
+def test_reservoir_sample_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'JSON_SAMPLE_SIZE', 5)
+    path = tmp_path / "events.json"
+    path.write_text(json.dumps([{"id": index, "label": f"e{index}"} for index in range(200)]))
+
+    accumulator = app_module.new_json_schema_accumulator()
+    with open(path, 'rb') as f:
+        for event in app_module.iter_json_events(app_module.JsonStreamReader(f, chunk_size=64)):
+            app_module.accumulate_json_event(accumulator, event)
+
+    profile = accumulator['profiles'][None]
+    assert profile['rows'] == 200
+    assert len(profile['sample']) == 5
+    assert profile['type_counts'][('id', int)] == 200
+
+
+def test_truncated_file_keeps_decoded_records(tmp_path):
+    path = tmp_path / "logs.json"
+    path.write_text('[{"id": 1, "message": "a"}, {"id": 2, "message": "b"}, {"id": 3, "mes')
+
+    schema = app_module.extract_schema_from_json_file(str(path))
+    assert schema['tables'] == {'logs': ['id', 'message']}
+    assert schema['column_stats']['logs']['rows'] == 2
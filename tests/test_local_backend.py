@@ -0,0 +1,98 @@
+"""Inférence locale: un petit modèle seq2seq aléatoire chargé par load_model répond au format de l'API"""
+import json
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+tokenizers = pytest.importorskip("tokenizers")
+
+import app_sql_pretrained as app_module  # noqa: E402
+
+VOCABULARY = ["<pad>", "</s>", "<unk>", "select", "from", "users", "where", "age", "liste", "des",
+              "utilisateurs", "*", ">", "18"]
+
+
+def save_tiny_seq2seq(model_dir):
+    """Enregistre un modèle T5 minuscule aux poids aléatoires et son tokenizer dans model_dir"""
+    word_level = tokenizers.Tokenizer(tokenizers.models.WordLevel(
+        {word: index for index, word in enumerate(VOCABULARY)}, unk_token="<unk>"))
+    word_level.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=word_level, pad_token="<pad>", eos_token="</s>", unk_token="<unk>")
+    tokenizer.save_pretrained(model_dir)
+
+    torch.manual_seed(0)
+    config = transformers.T5Config(
+        vocab_size=len(VOCABULARY), d_model=16, d_kv=8, d_ff=32, num_layers=1, num_decoder_layers=1,
+        num_heads=2, pad_token_id=0, eos_token_id=1, decoder_start_token_id=0)
+    transformers.T5ForConditionalGeneration(config).save_pretrained(model_dir)
+
+
+@pytest.fixture
+def local_models(tmp_path, monkeypatch, isolated_cache):
+    """Place un petit modèle dans LOCAL_MODELS_DIR pour la traduction et le text-to-sql"""
+    models_dir = tmp_path / "local_models"
+    for model_type in ("translation", "text-to-sql"):
+        save_tiny_seq2seq(str(models_dir / app_module.LOCAL_MODEL_PATHS[model_type]))
+
+    monkeypatch.setattr(app_module, "LOCAL_MODELS_DIR", str(models_dir))
+    monkeypatch.setattr(app_module, "models", {})
+    monkeypatch.setattr(app_module, "tokenizers", {})
+    monkeypatch.setattr(app_module, "pipelines", {})
+    monkeypatch.setattr(app_module, "local_generation_locks", {})
+    return models_dir
+
+
+def query_local(model_type, inputs, parameters):
+    model_path = app_module.LOCAL_MODEL_PATHS[model_type]
+    return app_module.query_huggingface_api(model_path, inputs, parameters=parameters, use_local_cache=False)
+
+
+def test_load_model_routes_queries_to_local_pipeline(local_models):
+    for model_type in ("translation", "text-to-sql"):
+        assert app_module.load_model(model_type) is not None
+        assert app_module.LOCAL_MODEL_PATHS[model_type] in app_module.pipelines
+
+    # Un second appel réutilise le modèle déjà chargé
+    assert app_module.load_model("translation") is app_module.models["translation"]
+
+
+@pytest.mark.parametrize("model_type, output_key", [
+    ("translation", "translation_text"),
+    ("text-to-sql", "generated_text"),
+])
+def test_local_generation_matches_api_format(local_models, output_key, model_type):
+    app_module.load_model(model_type)
+    parameters = {"max_new_tokens": 4}
+
+    single = query_local(model_type, "liste des utilisateurs", parameters)
+    assert isinstance(single, list) and len(single) == 1
+    assert set(single[0]) == {output_key}
+    assert isinstance(single[0][output_key], str)
+
+    batch = query_local(model_type, ["liste des utilisateurs", "select * from users", "age > 18"], parameters)
+    assert len(batch) == 3
+    assert all(set(item) == {output_key} for item in batch)
+
+    # La réponse est sérialisable comme celle de l'API (elle est stockée dans le cache disque)
+    json.dumps(batch)
+
+
+def test_num_return_sequences_groups_candidates_per_input(local_models):
+    app_module.load_model("text-to-sql")
+    parameters = {"max_new_tokens": 4, "num_return_sequences": 3}
+
+    grouped = query_local("text-to-sql", ["liste des utilisateurs", "age > 18"], parameters)
+    assert len(grouped) == 2
+    for candidates in grouped:
+        assert len(candidates) == 3
+        assert all(set(candidate) == {"generated_text"} for candidate in candidates)
+
+    # Une entrée seule retourne directement ses candidats
+    single = query_local("text-to-sql", "liste des utilisateurs", parameters)
+    assert len(single) == 3
+    assert all(set(candidate) == {"generated_text"} for candidate in single)
+
+    # Le découpage par entrée accepte ce format
+    assert app_module.split_batched_response(grouped, 2, sequences=3) == grouped
@@ -0,0 +1,80 @@
+"""Analyse en flux des exports SQL (extract_schema_from_sql_file, iter_sql_statements)"""
+import io
+
+import pytest
+
+import app_sql_pretrained as app_module
+
+SHOP_DUMP = """-- Table structure for table `users`
+CREATE TABLE `users` (
+  `id` int(11) NOT NULL,
+  `name` varchar(50) DEFAULT 'a;b', -- commentaire; avec point-virgule
+  `email` varchar(100),
+  PRIMARY KEY (`id`)
+);
+/* bloc ; commentaire */
+CREATE TABLE orders (
+  id INT,
+  user_id INT REFERENCES users(id),
+  total DECIMAL(10, 2)
+);
+INSERT INTO users (id, name, email) VALUES (1, 'x;y', 'a@b.c'), (2, 'it''s', NULL);
+ALTER TABLE orders ADD COLUMN created_at DATETIME;
+"""
+
+
+@pytest.fixture
+def shop_dump(tmp_path):
+    path = tmp_path / "shop.sql"
+    path.write_text(SHOP_DUMP, encoding="utf-8")
+    return str(path)
+
+
+def test_extract_schema_from_sql_file(shop_dump):
+    schema = app_module.extract_schema_from_sql_file(shop_dump, parallel=False)
+
+    assert schema['tables'] == {'users': ['id', 'name', 'email'], 'orders': ['id', 'user_id', 'total', 'created_at']}
+    assert schema['column_types']['orders']['created_at'] == 'DATETIME'
+    assert schema['relations'] == [{'table1': 'orders', 'column1': 'user_id', 'table2': 'users', 'column2': 'id'}]
+    assert 'CREATE TABLE users' in schema['schema_sql']
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64])
+def test_statements_do_not_depend_on_chunk_size(chunk_size):
+    expected = list(app_module.iter_sql_statements(io.BytesIO(SHOP_DUMP.encode('utf-8'))))
+    statements = list(app_module.iter_sql_statements(io.BytesIO(SHOP_DUMP.encode('utf-8')), chunk_size=chunk_size))
+
+    assert statements == expected
+    assert len(statements) == 4
+    assert statements[2].startswith("INSERT INTO users")
+
+
+def test_multibyte_characters_split_across_chunks():
+    dump = "CREATE TABLE café (prénom TEXT, société TEXT);".encode('utf-8')
+    statements = list(app_module.iter_sql_statements(io.BytesIO(dump), chunk_size=1))
+    assert statements == ["CREATE TABLE café (prénom TEXT, société TEXT)"]
+
+
+def test_leading_comments_are_reported_and_stripped():
+    comments = []
+    statements = list(app_module.iter_sql_statements(
+        io.BytesIO(b"-- Dumping data for table `logs`\nINSERT INTO logs VALUES (1);"), on_comment=comments.append))
+
+    assert statements == ["INSERT INTO logs VALUES (1)"]
+    assert comments == [" Dumping data for table `logs`"]
+
+
+def test_long_statements_are_truncated():
+    dump = b"INSERT INTO t VALUES " + b",".join(b"(%d)" % i for i in range(1000)) + b";SELECT 1;"
+    statements = list(app_module.iter_sql_statements(io.BytesIO(dump), chunk_size=16, max_statement_chars=40))
+
+    assert len(statements[0]) == 40
+    assert statements[1] == "SELECT 1"
+
+
+def test_insert_only_dump_falls_back_to_insert_columns(tmp_path):
+    path = tmp_path / "data.sql"
+    path.write_text("INSERT INTO logs (id, message) VALUES (1, 'a');\n-- Data for table events\n")
+
+    schema = app_module.extract_schema_from_sql_file(str(path), parallel=False)
+    assert schema['tables'] == {'logs': ['id', 'message'], 'events': ['id', 'name']}
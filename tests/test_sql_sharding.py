@@ -0,0 +1,64 @@
+"""Découpage des gros exports SQL en plages analysées en parallèle (parse_sql_file_parallel)"""
+import io
+import mmap
+
+import pytest
+
+import app_sql_pretrained as app_module
+
+# Le littéral contient ";" en fin de ligne suivi d'une instruction en début de ligne: une coupure candidate
+LITERAL_DUMP = (
+    "CREATE TABLE users (id INT, bio TEXT);\n"
+    "INSERT INTO users VALUES (1, 'première ligne;\nCREATE TABLE intrus (x INT);\nfin');\n"
+    "/* commentaire;\nDROP TABLE users;\n*/\n"
+    "CREATE TABLE orders (id INT, user_id INT);\n"
+)
+
+
+@pytest.fixture
+def literal_dump(tmp_path):
+    path = tmp_path / "literal.sql"
+    path.write_bytes(LITERAL_DUMP.encode('utf-8'))
+    return str(path)
+
+
+def read_ranges(path, shard_size):
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return app_module.find_sql_shard_ranges(mapped, shard_size), len(mapped)
+
+
+def test_shard_ranges_cover_the_file_without_overlap(literal_dump):
+    ranges, size = read_ranges(literal_dump, 1)
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == size
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    # Le motif seul coupe aussi dans le littéral et dans le commentaire
+    assert len(ranges) == 5
+
+
+def test_range_ending_inside_a_literal_is_incomplete(literal_dump):
+    ranges, _ = read_ranges(literal_dump, 1)
+
+    complete = [app_module.parse_sql_file_range(literal_dump, start, end)[1] for start, end in ranges]
+    # Plages 2 et 4: coupées dans le littéral et dans le commentaire; la plage 3 commence dans le littéral
+    assert complete == [True, False, False, False, True]
+
+
+def test_unterminated_statement_is_reported():
+    unterminated = []
+    statements = list(app_module.iter_sql_statements(
+        io.BytesIO(b"CREATE TABLE a (x INT);\nINSERT INTO a VALUES ('ouvert"), on_unterminated=unterminated.append))
+
+    assert statements[-1] == "INSERT INTO a VALUES ('ouvert"
+    assert unterminated == [statements[-1]]
+
+
+@pytest.mark.parametrize("shard_size", [1, 40, 60, 100])
+def test_parallel_parse_ignores_boundaries_inside_literals(literal_dump, shard_size):
+    sequential = app_module.extract_schema_from_sql_file(literal_dump, parallel=False)
+    accumulator = app_module.parse_sql_file_parallel(literal_dump, shard_size=shard_size)
+    parallel = app_module.finalize_sql_schema(accumulator, literal_dump)
+
+    assert 'intrus' not in parallel['tables']
+    assert parallel == sequential
+    assert list(parallel['tables']) == ['users', 'orders']
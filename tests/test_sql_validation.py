@@ -0,0 +1,89 @@
+"""Validation des requêtes générées (arbre BK des identifiants, validate_generated_sql)"""
+import random
+import string
+
+import pytest
+
+import app_sql_pretrained as app_module
+
+SCHEMA = {
+    'tables': {'users': ['id', 'name', 'email'], 'orders': ['id', 'user_id', 'total', 'created_at']},
+    'relations': [{'table1': 'orders', 'column1': 'user_id', 'table2': 'users', 'column2': 'id'}]
+}
+
+
+@pytest.fixture(scope='module')
+def compiled_schema():
+    return app_module.compile_schema('test', SCHEMA)
+
+
+def validate(query, compiled_schema):
+    result = app_module.validate_generated_sql(query, compiled_schema)
+    result.pop('elapsed_us')
+    return result
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("users", "users", 0), ("users", "user", 1), ("nmae", "name", 2), ("", "abc", 3), ("kitten", "sitting", 3)])
+def test_levenshtein_distance(a, b, distance):
+    assert app_module.levenshtein_distance(a, b) == distance
+    assert app_module.levenshtein_distance(b, a) == distance
+
+
+def test_levenshtein_distance_stops_beyond_max_distance():
+    assert app_module.levenshtein_distance("abcdefgh", "a", max_distance=2) == 3
+    assert app_module.levenshtein_distance("abcdef", "uvwxyz", max_distance=2) == 3
+    assert app_module.levenshtein_distance("abcdef", "abcxef", max_distance=2) == 1
+
+
+def test_bk_tree_matches_linear_search():
+    rng = random.Random(0)
+    words = sorted({''.join(rng.choice(string.ascii_lowercase[:6]) for _ in range(rng.randint(2, 8)))
+                    for _ in range(300)})
+    tree = app_module.build_bk_tree(words)
+
+    for _ in range(200):
+        query = ''.join(rng.choice(string.ascii_lowercase[:6]) for _ in range(rng.randint(1, 9)))
+        max_distance = rng.randint(0, 3)
+        distances = [(app_module.levenshtein_distance(query, word), word) for word in words]
+        best_distance, best_word = min(distances)
+        expected = best_word if best_distance <= max_distance else None
+        assert app_module.find_nearest_identifier(tree, query, max_distance) == expected
+
+
+def test_bk_tree_edge_cases():
+    assert app_module.find_nearest_identifier(None, "users", 2) is None
+    tree = app_module.build_bk_tree(["users", "users", "orders"])
+    assert app_module.find_nearest_identifier(tree, "users", 0) == "users"
+    assert app_module.find_nearest_identifier(tree, "zzzzzz", 2) is None
+
+
+def test_valid_queries(compiled_schema):
+    for query in [
+        "SELECT u.name, o.total FROM users u JOIN orders o ON o.user_id = u.id",
+        "WITH recent AS (SELECT id FROM orders) SELECT id FROM recent",
+        "SELECT COUNT(*) AS n FROM users ORDER BY n",
+        "SELECT `name` FROM `users` WHERE email = \"a@b.c\"",
+        "SELECT x.id FROM (SELECT id FROM users) x",
+    ]:
+        assert validate(query, compiled_schema)['valid'], query
+
+
+def test_unknown_identifiers_get_suggestions(compiled_schema):
+    result = validate("SELECT nmae FROM userz WHERE emial = 1", compiled_schema)
+
+    assert not result['valid']
+    assert [(error['type'], error['identifier'], error['suggestion']) for error in result['errors']] == [
+        ('table', 'userz', 'users'), ('column', 'nmae', 'name'), ('column', 'emial', 'email')]
+
+
+def test_qualified_column_suggestion_keeps_alias(compiled_schema):
+    result = validate("SELECT o.totl FROM orders o", compiled_schema)
+    assert result['errors'] == [{'type': 'column', 'identifier': 'o.totl', 'table': 'orders', 'suggestion': 'o.total'}]
+
+
+def test_column_of_a_table_missing_from_the_query(compiled_schema):
+    result = validate("SELECT name FROM orders", compiled_schema)
+
+    assert not result['valid']
+    assert result['errors'][0]['found_in'] == ['users']